@@ -77,6 +77,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Transactions take SQLite's write lock when they begin, so concurrent approvals queue
+            # up behind each other (for up to `timeout` seconds) instead of failing with
+            # "database is locked" when both try to write
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -137,6 +144,85 @@ SIMPLE_JWT = {
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),
 }
 
+# Exchange rates for converting foreign-currency expenses into the company currency.
+# Swap PROVIDER for 'expenses.fx.FileRateProvider' with OPTIONS {'path': ...} to run offline.
+FX_RATES = {
+    'PROVIDER': 'expenses.fx.ExchangeRateApiProvider',
+    'OPTIONS': {'timeout': 5},
+    'TTL_SECONDS': 60 * 60,
+    # How long to keep serving the last-known-good table before asking the provider again
+    'RETRY_SECONDS': 60,
+    # A stored daily rate this many days before the expense date still counts (weekends, holidays)
+    'HISTORY_LOOKBACK_DAYS': 7,
+}
+
+# Receipt OCR runs in a process pool per web worker. MAX_WORKERS defaults to the
+# number of cores and MAX_PENDING to four jobs per pool process.
+OCR_JOBS = {
+    'MAX_WORKERS': None,
+    'MAX_PENDING': None,
+    # scan-receipt/batch/: most pages per request, and how long to wait for a free slot
+    'BATCH_MAX_PAGES': 200,
+    'BATCH_WAIT_SECONDS': 30,
+}
+
+# Stages applied to receipts before Tesseract, in order; see ocr/preprocessing.py for the
+# parameters that can be overridden here. Measure changes with `manage.py bench_ocr`.
+OCR_PREPROCESSING = {
+    'STAGES': ['exif_transpose', 'downscale', 'grayscale', 'crop', 'binarize'],
+    'TARGET_DPI': 300,
+}
+
+# Expense receipts are stored by content hash with JPEG derivatives (longest side in pixels)
+# written once at upload; see expenses/storage.py. Backfill with `manage.py rebuild_receipt_storage`.
+RECEIPT_STORAGE = {
+    'DERIVATIVES': {'thumbnail': 240, 'preview': 1280},
+    'JPEG_QUALITY': 80,
+}
+
+# Each worker caches its companies' compiled approval flows (expenses/flows.py). Changes made
+# in the same process take effect immediately; other workers pick them up within TTL_SECONDS.
+APPROVAL_FLOW_CACHE = {
+    'TTL_SECONDS': 60,
+}
+
+# Bulk expense import (claims/import/ and `manage.py import_expenses`): rows written per
+# transaction, most rows the endpoint accepts, and most row errors listed in a report.
+EXPENSE_IMPORT = {
+    'CHUNK_SIZE': 1000,
+    'MAX_ROWS': 100_000,
+    'MAX_REPORTED_ERRORS': 1000,
+}
+
+# Streaming expense export (claims/export/): rows fetched from the database and written out
+# per chunk, which bounds the export's memory use however many rows it has.
+EXPENSE_EXPORT = {
+    'CHUNK_SIZE': 2000,
+}
+
+# Full-text search (claims/search/). SqliteFtsBackend keeps an FTS5 index, created by a migration
+# on SQLite; on other databases use expenses.search.BasicSearchBackend (unindexed) until they
+# get a native backend. Searches use at most MAX_TERMS words.
+EXPENSE_SEARCH = {
+    'BACKEND': 'expenses.search.SqliteFtsBackend',
+    'MAX_TERMS': 10,
+}
+
+# Uploads to the OCR endpoints are streamed to files in SPOOL_DIR (default: the system temp
+# dir) rather than memory. Requests and files over the byte limits get 413, and so do images
+# or PDF pages that would decode to more than MAX_PIXELS.
+OCR_UPLOADS = {
+    'SPOOL_DIR': None,
+    'MAX_FILE_BYTES': 64 * 1024 * 1024,
+    'MAX_REQUEST_BYTES': 256 * 1024 * 1024,
+    'MAX_PIXELS': 80_000_000,
+}
+
+# OCR results are cached by image SHA-256: this many per process in memory, all of them in OCRResult
+OCR_CACHE = {
+    'MEMORY_ENTRIES': 512,
+}
+
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
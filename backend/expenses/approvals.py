@@ -0,0 +1,237 @@
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Expense, ApprovalStep, PendingApprovalCount
+from . import budgets, flows, rollups, rules, visibility
+
+
+def next_pending_step(expense):
+    if expense.status != 'PENDING':
+        return None
+    return ApprovalStep.objects.filter(expense=expense, status='PENDING').order_by('step_number', 'id').first()
+
+
+def adjust_pending_count(user_id, delta):
+    counter, created = PendingApprovalCount.objects.get_or_create(user_id=user_id, defaults={'count': delta})
+    if not created:
+        PendingApprovalCount.objects.filter(pk=counter.pk).update(count=F('count') + delta)
+
+
+def adjust_pending_counts(deltas):
+    """
+    Applies {user_id: delta} to the pending counters in a fixed number of queries.
+    """
+    deltas = {user_id: delta for user_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    PendingApprovalCount.objects.bulk_create(
+        [PendingApprovalCount(user_id=user_id, count=0) for user_id in deltas], ignore_conflicts=True
+    )
+    PendingApprovalCount.objects.filter(user_id__in=deltas).update(
+        count=F('count') + Case(*[When(user_id=user_id, then=Value(delta)) for user_id, delta in deltas.items()])
+    )
+
+
+def set_current_step(expense, step):
+    """
+    Points the expense at `step` (or nothing) and moves the pending counters along with it.
+    """
+    approver_id = step.approver_id if step else None
+    if expense.current_approver_id != approver_id:
+        if expense.current_approver_id:
+            adjust_pending_count(expense.current_approver_id, -1)
+        if approver_id:
+            adjust_pending_count(approver_id, 1)
+    if expense.current_step_id != (step.pk if step else None) or expense.current_approver_id != approver_id:
+        expense.current_step = step
+        expense.current_approver_id = approver_id
+        Expense.objects.filter(pk=expense.pk).update(current_step=step, current_approver_id=approver_id)
+
+
+def advance(expense):
+    """
+    Re-points the expense at its lowest pending step; clears it once the expense is decided.
+    """
+    set_current_step(expense, next_pending_step(expense))
+    return expense.current_step
+
+
+@transaction.atomic
+def act(user, expenses, new_status, comments=''):
+    """
+    Approves or rejects (`new_status`) `user`'s pending step on each of `expenses` in a fixed
+    number of queries. Returns {expense_id: expense status afterwards}; expenses that are
+    already decided, or without a pending step of the user, are left out.
+
+    The still-pending expenses are row-locked first, so approvals, rejections and overrides of
+    one expense run one after another: each sees the steps and status the previous one left.
+    """
+    # Locked in primary key order so concurrent bulk actions can't deadlock each other
+    locked = list(
+        Expense.objects.select_for_update()
+        .filter(pk__in=expenses.values('pk'), status='PENDING')
+        .order_by('pk')
+        .values_list('pk', flat=True)
+    )
+    pending_steps = ApprovalStep.objects.filter(expense_id__in=locked, approver=user, status='PENDING').values_list(
+        'pk', 'expense_id', 'step_number'
+    )
+    acted = {}
+    for step_id, expense_id, step_number in pending_steps:
+        if expense_id not in acted or step_number < acted[expense_id][1]:
+            acted[expense_id] = (step_id, step_number)
+    if not acted:
+        return {}
+    step_ids = [step_id for step_id, _ in acted.values()]
+    before = {
+        row[0]: row[1:]
+        for row in Expense.objects.filter(pk__in=acted).values_list(
+            'id', 'status', 'current_approver_id', 'employee__company_id', 'date', 'category', 'converted_amount',
+            'approval_count', 'approver_count', 'employee__manager_id',
+        )
+    }
+
+    ApprovalStep.objects.filter(pk__in=step_ids).update(status=new_status, comments=comments, acted_at=timezone.now())
+    if new_status == 'REJECTED':
+        Expense.objects.filter(pk__in=acted).update(status='REJECTED')
+        # Pending steps after the rejecting one are dropped; ones already acted on stay as history
+        acted_step = ApprovalStep.objects.filter(pk__in=step_ids, expense=OuterRef('expense'))
+        ApprovalStep.objects.filter(
+            expense_id__in=acted, status='PENDING', step_number__gt=Subquery(acted_step.values('step_number')[:1])
+        ).delete()
+    else:
+        Expense.objects.filter(pk__in=acted).update(approval_count=F('approval_count') + 1)
+        met = [
+            expense_id for expense_id, (_, _, company_id, _, _, _, approval_count, approver_count, _) in before.items()
+            if rules.any_rule_met(
+                flows.get_compiled_flow(company_id).rules, approval_count + 1, approver_count, user.pk
+            )
+        ]
+        if met:
+            # An ApprovalRule was met, so the remaining steps aren't waited for
+            ApprovalStep.objects.filter(expense_id__in=met, status='PENDING').delete()
+        # Approved outright once nothing is left to wait for
+        waiting = ApprovalStep.objects.filter(expense=OuterRef('pk'), status='PENDING')
+        Expense.objects.filter(pk__in=acted).filter(~Exists(waiting)).update(status='APPROVED')
+
+    first_pending = ApprovalStep.objects.filter(
+        expense=OuterRef('pk'), expense__status='PENDING', status='PENDING'
+    ).order_by('step_number', 'id')
+    Expense.objects.filter(pk__in=acted).update(
+        current_step=Subquery(first_pending.values('id')[:1]),
+        current_approver=Subquery(first_pending.values('approver_id')[:1]),
+    )
+    after = {
+        expense_id: (status, approver_id)
+        for expense_id, status, approver_id in Expense.objects.filter(pk__in=acted).values_list(
+            'id', 'status', 'current_approver_id'
+        )
+    }
+
+    pending_deltas, rollup_deltas, budget_changes = {}, {}, []
+    for expense_id, (status_before, approver_before, company_id, date, category, amount, _, _, manager_id) in before.items():
+        status_after, approver_after = after[expense_id]
+        if approver_before != approver_after:
+            if approver_before:
+                pending_deltas[approver_before] = pending_deltas.get(approver_before, 0) - 1
+            if approver_after:
+                pending_deltas[approver_after] = pending_deltas.get(approver_after, 0) + 1
+        if company_id is not None and status_before != status_after:
+            for status, sign in ((status_before, -1), (status_after, 1)):
+                key = (company_id, date.replace(day=1), category, status)
+                count, total = rollup_deltas.get(key, (0, 0))
+                rollup_deltas[key] = (count + sign, total + sign * amount)
+                budget_changes.append((company_id, date.replace(day=1), category, manager_id, status, amount, sign))
+    adjust_pending_counts(pending_deltas)
+    rollups.adjust_many(rollup_deltas)
+    budgets.record_many(budget_changes)
+    visibility.sync_expenses(list(acted))
+    return {expense_id: status for expense_id, (status, _) in after.items()}
+
+
+def approval_plan(manager_id, admin_id, flow_steps=None):
+    """
+    [(approver_id, step_number)] for an expense whose employee's approving manager is
+    `manager_id` (None when they have none): one step per role in the company's default
+    flow, else Manager -> Admin, and nobody gets two steps.
+    """
+    if flow_steps is None:
+        flow_steps = [(None, 'MANAGER'), (None, 'ADMIN')]
+    plan = []
+    for step_number, role in flow_steps:
+        approver_id = manager_id if role == 'MANAGER' else admin_id if role == 'ADMIN' else None
+        if approver_id is None or any(planned_id == approver_id for planned_id, _ in plan):
+            continue
+        # Without a flow the fallback steps are simply numbered in order
+        plan.append((approver_id, step_number if step_number is not None else len(plan) + 1))
+    return plan
+
+
+def expected_pointers():
+    """
+    {expense_id: (current_step_id, current_approver_id)} recomputed from ApprovalStep for every
+    expense that should be waiting on someone.
+    """
+    first_pending = ApprovalStep.objects.filter(expense=OuterRef('pk'), status='PENDING').order_by('step_number', 'id')
+    rows = (
+        Expense.objects.filter(status='PENDING')
+        .annotate(
+            expected_step=Subquery(first_pending.values('id')[:1]),
+            expected_approver=Subquery(first_pending.values('approver_id')[:1]),
+        )
+        .filter(expected_step__isnull=False)
+        .values_list('id', 'expected_step', 'expected_approver')
+    )
+    return {expense_id: (step_id, approver_id) for expense_id, step_id, approver_id in rows.iterator(chunk_size=2000)}
+
+
+def stored_pointers():
+    rows = Expense.objects.filter(current_step__isnull=False).values_list('id', 'current_step_id', 'current_approver_id')
+    return {expense_id: (step_id, approver_id) for expense_id, step_id, approver_id in rows.iterator(chunk_size=2000)}
+
+
+def count_by_approver(pointers):
+    counts = {}
+    for _, approver_id in pointers.values():
+        counts[approver_id] = counts.get(approver_id, 0) + 1
+    return counts
+
+
+def stored_counts():
+    return dict(PendingApprovalCount.objects.exclude(count=0).values_list('user_id', 'count'))
+
+
+def drifted_approval_counts():
+    """
+    {expense_id: (approved steps, stored approval_count)} for every expense whose counter is off.
+    """
+    approved = (
+        ApprovalStep.objects.filter(expense=OuterRef('pk'), status='APPROVED')
+        .order_by().values('expense').annotate(count=Count('id')).values('count')
+    )
+    rows = (
+        Expense.objects.annotate(expected=Coalesce(Subquery(approved), 0))
+        .exclude(expected=F('approval_count'))
+        .values_list('id', 'expected', 'approval_count')
+    )
+    return {expense_id: (expected, stored) for expense_id, expected, stored in rows.iterator(chunk_size=2000)}
+
+
+@transaction.atomic
+def rebuild_approval_queues():
+    expected = expected_pointers()
+    stored = stored_pointers()
+    drifted = [expense_id for expense_id in expected.keys() | stored.keys() if expected.get(expense_id) != stored.get(expense_id)]
+    for expense_id in drifted:
+        step_id, approver_id = expected.get(expense_id, (None, None))
+        Expense.objects.filter(pk=expense_id).update(current_step_id=step_id, current_approver_id=approver_id)
+
+    for expense_id, (expected_count, _) in drifted_approval_counts().items():
+        Expense.objects.filter(pk=expense_id).update(approval_count=expected_count)
+
+    PendingApprovalCount.objects.all().delete()
+    PendingApprovalCount.objects.bulk_create(
+        [PendingApprovalCount(user_id=user_id, count=count) for user_id, count in count_by_approver(expected).items()],
+        batch_size=1000,
+    )
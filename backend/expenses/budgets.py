@@ -0,0 +1,233 @@
+"""
+Monthly budgets and what has been spent against them. Each BudgetUsage row holds the pending
+and approved converted_amount of one budget's expenses in one month, and is adjusted wherever
+an expense is created, decided, reconverted, moved to another team or deleted (the same places
+that adjust ExpenseRollup). Checking a new claim therefore reads one row per budget it falls
+under instead of summing the month's expenses.
+
+Budgets are read from the database on every write rather than from the flow cache
+(expenses.flows): a worker still caching the old budgets would leave the usage wrong for good.
+"""
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from rest_framework.exceptions import APIException
+from .models import Budget, BudgetUsage, Expense
+import decimal
+
+CENTS = decimal.Decimal('0.01')
+# Expenses in these statuses count against their budgets; rejecting one gives its amount back
+COUNTED = ('PENDING', 'APPROVED')
+
+
+class BudgetExceeded(APIException):
+    status_code = 400
+    default_detail = 'This claim would go over a budget.'
+    default_code = 'budget_exceeded'
+
+
+def for_companies(company_ids):
+    """
+    {company_id: [Budget]} for the companies that have any.
+    """
+    budgets = {}
+    for budget in Budget.objects.filter(company_id__in=company_ids).order_by('pk'):
+        budgets.setdefault(budget.company_id, []).append(budget)
+    return budgets
+
+
+def covers(budget, category, manager_id):
+    return (not budget.category or budget.category == category) and (
+        budget.manager_id is None or budget.manager_id == manager_id
+    )
+
+
+def snapshot(expense):
+    """
+    What an expense counts towards: (company_id, month, category, manager_id, status, amount).
+    Take one before mutating an expense and hand it to record_changed afterwards.
+    """
+    return (
+        expense.employee.company_id, expense.date.replace(day=1), expense.category,
+        expense.employee.manager_id, expense.status, expense.converted_amount,
+    )
+
+
+def check(company, company_budgets, category, manager_id, date, amount):
+    """
+    Checks a claim about to be submitted against the budgets covering it. Raises BudgetExceeded
+    when it would take a blocking budget over its monthly limit; otherwise returns whether it
+    goes over a non-blocking one. The usage rows stay locked until the claim is saved, so two
+    concurrent claims can't both squeeze under the same limit.
+    """
+    covering = [budget for budget in company_budgets if covers(budget, category, manager_id)]
+    if not covering:
+        return False
+    month = date.replace(day=1)
+    # Created up front so there is a row to lock on a budget's first claim of the month
+    BudgetUsage.objects.bulk_create([BudgetUsage(budget=budget, month=month) for budget in covering], ignore_conflicts=True)
+    used = {
+        budget_id: pending + approved
+        for budget_id, pending, approved in BudgetUsage.objects.select_for_update()
+        .filter(budget__in=covering, month=month)
+        .values_list('budget_id', 'pending_amount', 'approved_amount')
+    }
+    exceeded = [budget for budget in covering if used[budget.pk] + amount > budget.monthly_amount]
+    for budget in exceeded:
+        if budget.blocking:
+            raise BudgetExceeded({'error': (
+                f'This claim would take the "{budget.name}" budget to {used[budget.pk] + amount:.2f} '
+                f'{company.currency} for {month:%B %Y}, over its limit of {budget.monthly_amount:.2f}.'
+            )})
+    return bool(exceeded)
+
+
+def record_many(changes, budgets=None):
+    """
+    Applies [(company_id, month, category, manager_id, status, amount, sign)] to the usage of
+    every budget covering each change, in a fixed number of queries. `budgets` ({company_id:
+    [Budget]}) saves loading them again when the caller already has.
+    """
+    changes = [change for change in changes if change[0] is not None and change[4] in COUNTED and change[5]]
+    if not changes:
+        return
+    if budgets is None:
+        budgets = for_companies({change[0] for change in changes})
+    deltas = {}
+    for company_id, month, category, manager_id, status, amount, sign in changes:
+        for budget in budgets.get(company_id, ()):
+            if covers(budget, category, manager_id):
+                pending, approved = deltas.get((budget.pk, month), (0, 0))
+                if status == 'PENDING':
+                    pending += sign * amount
+                else:
+                    approved += sign * amount
+                deltas[(budget.pk, month)] = (pending, approved)
+    adjust_many(deltas)
+
+
+def adjust_many(deltas):
+    """
+    Applies {(budget_id, month): (pending amount, approved amount)} in a fixed number of queries.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+    BudgetUsage.objects.bulk_create(
+        [BudgetUsage(budget_id=budget_id, month=month) for budget_id, month in deltas], ignore_conflicts=True
+    )
+    keys = Q()
+    for budget_id, month in deltas:
+        keys |= Q(budget_id=budget_id, month=month)
+    by_pk = {
+        pk: deltas[(budget_id, month)]
+        for pk, budget_id, month in BudgetUsage.objects.filter(keys).values_list('pk', 'budget_id', 'month')
+    }
+    amount = DecimalField(max_digits=16, decimal_places=2)
+    BudgetUsage.objects.filter(pk__in=by_pk).update(
+        pending_amount=F('pending_amount') + Case(
+            *[When(pk=pk, then=Value(pending)) for pk, (pending, _) in by_pk.items()], output_field=amount,
+        ),
+        approved_amount=F('approved_amount') + Case(
+            *[When(pk=pk, then=Value(approved)) for pk, (_, approved) in by_pk.items()], output_field=amount,
+        ),
+    )
+
+
+def record_created(expense, budgets=None):
+    record_changed(None, expense, budgets)
+
+
+def record_deleted(expense):
+    record_changed(snapshot(expense), None)
+
+
+def record_changed(before, expense, budgets=None):
+    after = snapshot(expense) if expense else None
+    if before == after:
+        return
+    changes = []
+    if before:
+        changes.append((*before, -1))
+    if after:
+        changes.append((*after, 1))
+    record_many(changes, budgets)
+
+
+def sync_team_manager(employee, previous_manager_id):
+    """
+    Moves an employee's expenses from their previous manager's team budgets to their new
+    manager's, after the employee changed teams.
+    """
+    if employee.manager_id == previous_manager_id or employee.company_id is None:
+        return
+    budgets = for_companies([employee.company_id])
+    team_managers = {budget.manager_id for budget in budgets.get(employee.company_id, ()) if budget.manager_id}
+    if not team_managers & {previous_manager_id, employee.manager_id}:
+        return
+    rows = (
+        Expense.objects.filter(employee=employee, status__in=COUNTED)
+        .annotate(month=TruncMonth('date'))
+        .values_list('month', 'category', 'status')
+        .annotate(total=Sum('converted_amount'))
+        .order_by()
+    )
+    changes = []
+    for month, category, status, total in rows:
+        # SQLite sums decimals as floats
+        total = decimal.Decimal(total).quantize(CENTS)
+        changes.append((employee.company_id, month, category, previous_manager_id, status, total, -1))
+        changes.append((employee.company_id, month, category, employee.manager_id, status, total, 1))
+    record_many(changes, budgets)
+
+
+def compute_usage(budgets=None):
+    """
+    Recomputes {(budget_id, month): (pending amount, approved amount)} from the Expense table,
+    for `budgets` or every budget.
+    """
+    usage = {}
+    for budget in Budget.objects.all() if budgets is None else budgets:
+        expenses = Expense.objects.filter(employee__company_id=budget.company_id, status__in=COUNTED)
+        if budget.category:
+            expenses = expenses.filter(category=budget.category)
+        if budget.manager_id:
+            expenses = expenses.filter(employee__manager_id=budget.manager_id)
+        rows = (
+            expenses.annotate(month=TruncMonth('date'))
+            .values_list('month', 'status')
+            .annotate(total=Sum('converted_amount'))
+            .order_by()
+        )
+        for month, status, total in rows:
+            pending, approved = usage.get((budget.pk, month), (0, 0))
+            if status == 'PENDING':
+                pending += total
+            else:
+                approved += total
+            usage[(budget.pk, month)] = (pending, approved)
+    # SQLite sums decimals as floats, which drift in the last digits over large months
+    return {
+        key: (decimal.Decimal(pending).quantize(CENTS), decimal.Decimal(approved).quantize(CENTS))
+        for key, (pending, approved) in usage.items()
+    }
+
+
+def stored_usage():
+    rows = BudgetUsage.objects.exclude(pending_amount=0, approved_amount=0).values_list(
+        'budget_id', 'month', 'pending_amount', 'approved_amount'
+    )
+    return {(budget_id, month): (pending, approved) for budget_id, month, pending, approved in rows}
+
+
+@transaction.atomic
+def rebuild_usage(budgets=None):
+    """
+    Recomputes the usage rows of `budgets`, or of every budget.
+    """
+    usage = BudgetUsage.objects.all() if budgets is None else BudgetUsage.objects.filter(budget__in=budgets)
+    usage.delete()
+    BudgetUsage.objects.bulk_create([
+        BudgetUsage(budget_id=budget_id, month=month, pending_amount=pending, approved_amount=approved)
+        for (budget_id, month), (pending, approved) in compute_usage(budgets).items()
+    ])
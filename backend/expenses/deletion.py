@@ -0,0 +1,38 @@
+"""
+Deleting users together with the expenses they own. The cascade on Expense.employee would drop
+the rows past the counters derived from them, so the rollups, budget usage, pending approval
+counts and search index are adjusted first, as ExpenseViewSet.perform_destroy does for one
+expense, and expenses that were waiting on the user move on to their next pending step.
+"""
+from django.db import transaction
+from .models import Expense
+from . import approvals, budgets, rollups, search
+
+
+@transaction.atomic
+def delete_user(user):
+    owned = list(
+        Expense.objects.select_for_update().filter(employee=user).values_list(
+            'pk', 'date', 'category', 'status', 'converted_amount', 'current_approver_id',
+        )
+    )
+    buckets, budget_changes, pending = {}, [], {}
+    for _, date, category, status, amount, approver_id in owned:
+        month = date.replace(day=1)
+        if user.company_id is not None:
+            key = (user.company_id, month, category, status)
+            count, total = buckets.get(key, (0, 0))
+            buckets[key] = (count - 1, total - amount)
+        budget_changes.append((user.company_id, month, category, user.manager_id, status, amount, -1))
+        if approver_id:
+            pending[approver_id] = pending.get(approver_id, 0) - 1
+    rollups.adjust_many(buckets)
+    budgets.record_many(budget_changes)
+    approvals.adjust_pending_counts(pending)
+    search.remove([pk for pk, *_ in owned])
+
+    # Their steps go with them; the expenses they held up wait on whoever is next instead
+    waiting = list(Expense.objects.filter(current_approver=user).exclude(employee=user).values_list('pk', flat=True))
+    user.delete()
+    for expense in Expense.objects.filter(pk__in=waiting).order_by('pk'):
+        approvals.advance(expense)
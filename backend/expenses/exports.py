@@ -0,0 +1,212 @@
+"""
+Streaming CSV/XLSX export of expenses (claims/export/). Rows are read with values_list()
+.iterator(), so no model instances are built, and written out a chunk at a time: memory
+use stays the same whether an export has a thousand rows or millions.
+
+XLSX files are written as a zip stream with one inline-string worksheet per EXCEL_MAX_ROWS
+rows, so no spreadsheet library is needed and nothing is held back until the end.
+"""
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from xml.sax.saxutils import escape
+import csv
+import decimal
+import itertools
+import re
+import zipfile
+
+# (header, field) of each exported column
+COLUMNS = [
+    ('id', 'id'),
+    ('date', 'date'),
+    ('employee', 'employee__username'),
+    ('category', 'category'),
+    ('description', 'description'),
+    ('amount', 'amount'),
+    ('currency', 'currency'),
+    ('converted_amount', 'converted_amount'),
+    ('company_currency', 'employee__company__currency'),
+    ('status', 'status'),
+    ('current_approver', 'current_approver__username'),
+    ('created_at', 'created_at'),
+]
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# Rows per worksheet, leaving room for the header row
+EXCEL_MAX_ROWS = 1_048_575
+
+
+def export_response(expenses, file_format):
+    """
+    A StreamingHttpResponse with `expenses` (a queryset, already filtered and ordered) as a
+    CSV or XLSX attachment.
+    """
+    rows = expenses.values_list(*[field for _, field in COLUMNS]).iterator(
+        chunk_size=settings.EXPENSE_EXPORT['CHUNK_SIZE']
+    )
+    content = csv_chunks(rows) if file_format == 'csv' else xlsx_chunks(rows)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[file_format])
+    filename = f'expenses-{timezone.localdate():%Y-%m-%d}.{file_format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def chunks(rows):
+    size = settings.EXPENSE_EXPORT['CHUNK_SIZE']
+    while chunk := list(itertools.islice(rows, size)):
+        yield chunk
+
+
+# Text starting with one of these is read as a formula when a CSV file is opened in Excel,
+# LibreOffice or Sheets. XLSX cells are written as inline strings, which are never evaluated.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def neutralize(value):
+    """
+    CSV values that a spreadsheet would evaluate get a leading apostrophe so they stay text;
+    descriptions and usernames come straight from users.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class Echo:
+    # A file-like object whose write() hands back what it was given, for csv.writer
+    def write(self, value):
+        return value
+
+
+def csv_chunks(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow([header for header, _ in COLUMNS])
+    for chunk in chunks(rows):
+        yield ''.join(writer.writerow([neutralize(value) for value in row]) for row in chunk)
+
+
+class ZipStream:
+    """
+    The unseekable file zipfile writes to; whatever it has written so far is taken with drain().
+    """
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+# Control characters other than tab, newline and carriage return aren't allowed in XML
+ILLEGAL_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def xlsx_cell(value):
+    if value is None:
+        return '<c/>'
+    if isinstance(value, (int, decimal.Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(ILLEGAL_XML.sub("", text))}</t></is></c>'
+
+
+def xlsx_row(values):
+    return '<row>' + ''.join(xlsx_cell(value) for value in values) + '</row>'
+
+
+SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_END = '</sheetData></worksheet>'
+
+
+def xlsx_chunks(rows):
+    stream = ZipStream()
+    archive = zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_DEFLATED)
+    header = xlsx_row([header for header, _ in COLUMNS])
+    sheet_count = 0
+    rows = iter(rows)
+    while True:
+        sheet_rows = itertools.islice(rows, EXCEL_MAX_ROWS)
+        first = next(sheet_rows, None)
+        # Always write one sheet, even for an empty export
+        if first is None and sheet_count:
+            break
+        sheet_count += 1
+        with archive.open(f'xl/worksheets/sheet{sheet_count}.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((SHEET_START + header).encode())
+            if first is not None:
+                sheet.write(xlsx_row(first).encode())
+            for chunk in chunks(sheet_rows):
+                sheet.write(''.join(xlsx_row(row) for row in chunk).encode())
+                yield stream.drain()
+            sheet.write(SHEET_END.encode())
+        if first is None:
+            break
+
+    for name, xml in xlsx_package(sheet_count).items():
+        archive.writestr(name, xml)
+    archive.close()
+    yield stream.drain()
+
+
+def xlsx_package(sheet_count):
+    """
+    The parts of the workbook other than its worksheets.
+    """
+    sheets = range(1, sheet_count + 1)
+    xml = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    return {
+        '[Content_Types].xml': (
+            xml + '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{n}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for n in sheets
+            )
+            + '</Types>'
+        ),
+        '_rels/.rels': (
+            xml + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/></Relationships>'
+        ),
+        'xl/workbook.xml': (
+            xml + '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(
+                f'<sheet name="{"Expenses" if n == 1 else f"Expenses {n}"}" sheetId="{n}" r:id="rId{n}"/>'
+                for n in sheets
+            )
+            + '</sheets></workbook>'
+        ),
+        'xl/_rels/workbook.xml.rels': (
+            xml + '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{n}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{n}.xml"/>'
+                for n in sheets
+            )
+            + '</Relationships>'
+        ),
+    }
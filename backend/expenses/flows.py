@@ -0,0 +1,97 @@
+"""
+Per-process cache of each company's approval flow, compiled into what creating and approving
+an expense needs: the default flow's (step_number, role) list, the admin who takes ADMIN steps,
+the users whose MANAGER steps count and the ApprovalRules. Plans come out of it without a query. Entries are dropped
+by the signals in expenses/signals.py when flows, flow steps, rules or users are saved; other worker
+processes don't see those signals, and neither do queryset update()s, so entries also expire
+after APPROVAL_FLOW_CACHE['TTL_SECONDS'].
+"""
+from django.conf import settings
+from users.models import User
+from .models import ApprovalFlow, ApprovalFlowStep, ApprovalRule
+from . import approvals
+import threading
+import time
+
+
+class CompiledFlow:
+    def __init__(self, flow_id, flow_steps, admin_id, approving_managers, rules=()):
+        self.flow_id = flow_id
+        self.flow_steps = flow_steps
+        self.admin_id = admin_id
+        self.approving_managers = approving_managers
+        # (percentage_required, specific_approver_id, hybrid) per ApprovalRule, see expenses.rules
+        self.rules = rules
+        self.compiled_at = time.monotonic()
+        self._plans = {}
+
+    def plan(self, manager_id):
+        """
+        [(approver_id, step_number)] for an expense of an employee with this manager.
+        """
+        if manager_id not in self._plans:
+            approving_manager_id = manager_id if manager_id in self.approving_managers else None
+            self._plans[manager_id] = approvals.approval_plan(approving_manager_id, self.admin_id, self.flow_steps)
+        return self._plans[manager_id]
+
+    def refers_to(self, user_id):
+        return (
+            user_id == self.admin_id or user_id in self.approving_managers
+            or any(specific_approver_id == user_id for _, specific_approver_id, _ in self.rules)
+        )
+
+
+def compile_flow(company_id):
+    flow_id = (
+        ApprovalFlow.objects.filter(company_id=company_id, is_default=True).order_by('pk').values_list('pk', flat=True).first()
+    )
+    flow_steps = None
+    if flow_id is not None:
+        flow_steps = list(
+            ApprovalFlowStep.objects.filter(approval_flow_id=flow_id)
+            .order_by('step_number', 'pk')
+            .values_list('step_number', 'approver_role')
+        )
+    admin_id = User.objects.filter(company_id=company_id, role='ADMIN').order_by('pk').values_list('pk', flat=True).first()
+    approving_managers = frozenset(
+        User.objects.filter(company_id=company_id, is_manager_approver=True).values_list('pk', flat=True)
+    )
+    rules = tuple(
+        ApprovalRule.objects.filter(company_id=company_id)
+        .order_by('pk')
+        .values_list('percentage_required', 'specific_approver_id', 'hybrid')
+    )
+    return CompiledFlow(flow_id, flow_steps, admin_id, approving_managers, rules)
+
+
+_flows = {}
+_flows_lock = threading.Lock()
+# Bumped by every invalidation, so a flow compiled while one happened isn't stored
+_generation = 0
+
+
+def get_compiled_flow(company_id):
+    with _flows_lock:
+        compiled = _flows.get(company_id)
+        generation = _generation
+    if compiled is None or time.monotonic() - compiled.compiled_at > settings.APPROVAL_FLOW_CACHE['TTL_SECONDS']:
+        compiled = compile_flow(company_id)
+        with _flows_lock:
+            if generation == _generation:
+                _flows[company_id] = compiled
+    return compiled
+
+
+def invalidate(company_id=None, user_id=None):
+    """
+    Drops the flow of `company_id`, every flow that refers to `user_id`, or with neither, all of them.
+    """
+    global _generation
+    with _flows_lock:
+        _generation += 1
+        if company_id is None and user_id is None:
+            _flows.clear()
+            return
+        for key, compiled in list(_flows.items()):
+            if key == company_id or (user_id is not None and compiled.refers_to(user_id)):
+                del _flows[key]
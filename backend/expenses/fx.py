@@ -0,0 +1,306 @@
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import APIException, ValidationError
+from django.db import transaction
+from django.db.models import Min, Max
+from .models import Expense, FxRateTable, DailyFxRate
+from . import budgets, rollups
+import bisect
+import datetime
+import decimal
+import json
+import logging
+import requests
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CENTS = decimal.Decimal('0.01')
+
+
+class FxProviderError(Exception):
+    pass
+
+
+class ExchangeRateUnavailable(APIException):
+    status_code = 503
+    default_detail = 'Exchange rates are unavailable right now, please try again later.'
+    default_code = 'exchange_rate_unavailable'
+
+
+class RateProvider:
+    """
+    Fetches the full rate table for a base currency as {quote_currency: Decimal}.
+    Raise FxProviderError on any failure.
+    """
+    def fetch_rates(self, base):
+        raise NotImplementedError
+
+
+class ExchangeRateApiProvider(RateProvider):
+    url = 'https://api.exchangerate-api.com/v4/latest/{base}'
+
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+
+    def fetch_rates(self, base):
+        try:
+            response = requests.get(self.url.format(base=base), timeout=self.timeout)
+            response.raise_for_status()
+            rates = response.json().get('rates', {})
+        except (requests.RequestException, ValueError) as e:
+            raise FxProviderError(f'Could not fetch {base} rates: {e}') from e
+        return {quote: decimal.Decimal(str(rate)) for quote, rate in rates.items()}
+
+
+class FileRateProvider(RateProvider):
+    """
+    Reads rates from a local JSON file shaped like {"EUR": {"USD": "1.08", ...}, ...}.
+    For offline development and tests.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def fetch_rates(self, base):
+        try:
+            with open(self.path) as f:
+                tables = json.load(f)
+        except (OSError, ValueError) as e:
+            raise FxProviderError(f'Could not read {self.path}: {e}') from e
+        if base not in tables:
+            raise FxProviderError(f'No {base} rates in {self.path}')
+        return {quote: decimal.Decimal(str(rate)) for quote, rate in tables[base].items()}
+
+
+class RateCache:
+    """
+    In-process TTL cache of rate tables keyed by base currency.
+
+    Refreshes are single-flight per base currency, so concurrent requests wait for one
+    provider call instead of stampeding it. Every successful fetch is persisted to
+    FxRateTable, which is served as the last-known-good table when the provider fails.
+    """
+    def __init__(self, provider, ttl, retry_after):
+        self.provider = provider
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self._tables = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def get_rates(self, base):
+        rates = self._cached(base)
+        if rates is not None:
+            return rates
+        with self._lock_for(base):
+            # Another thread may have refreshed while we waited for the lock
+            rates = self._cached(base)
+            if rates is not None:
+                return rates
+            return self._refresh(base)
+
+    def clear(self):
+        with self._guard:
+            self._tables.clear()
+
+    def _cached(self, base):
+        entry = self._tables.get(base)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _lock_for(self, base):
+        with self._guard:
+            return self._locks.setdefault(base, threading.Lock())
+
+    def _store(self, base, rates, ttl):
+        self._tables[base] = (time.monotonic() + ttl, rates)
+        return rates
+
+    def _refresh(self, base):
+        stored = FxRateTable.objects.filter(base_currency=base).first()
+        # A table persisted recently by another worker process is as good as a fresh fetch
+        if stored and (timezone.now() - stored.fetched_at).total_seconds() < self.ttl:
+            age = (timezone.now() - stored.fetched_at).total_seconds()
+            return self._store(base, self._decode(stored.rates), self.ttl - age)
+
+        try:
+            rates = self.provider.fetch_rates(base)
+        except FxProviderError as e:
+            if stored is None:
+                raise ExchangeRateUnavailable() from e
+            logger.warning('%s; serving %s rates from %s', e, base, stored.fetched_at)
+            return self._store(base, self._decode(stored.rates), self.retry_after)
+
+        FxRateTable.objects.update_or_create(
+            base_currency=base,
+            defaults={'rates': {quote: str(rate) for quote, rate in rates.items()}, 'fetched_at': timezone.now()},
+        )
+        return self._store(base, rates, self.ttl)
+
+    @staticmethod
+    def _decode(rates):
+        return {quote: decimal.Decimal(rate) for quote, rate in rates.items()}
+
+
+_rate_cache = None
+_rate_cache_lock = threading.Lock()
+
+
+def get_rate_cache():
+    global _rate_cache
+    with _rate_cache_lock:
+        if _rate_cache is None:
+            config = settings.FX_RATES
+            provider = import_string(config['PROVIDER'])(**config.get('OPTIONS', {}))
+            _rate_cache = RateCache(provider, config['TTL_SECONDS'], config['RETRY_SECONDS'])
+        return _rate_cache
+
+
+def get_rate(base, quote):
+    if base == quote:
+        return decimal.Decimal('1')
+    rate = get_rate_cache().get_rates(base).get(quote)
+    if rate is None:
+        raise ValidationError({'currency': [f'No exchange rate from {base} to {quote}.']})
+    return rate
+
+
+def quantize(amount):
+    return amount.quantize(CENTS, rounding=decimal.ROUND_HALF_UP)
+
+
+def history_lookback():
+    return datetime.timedelta(days=settings.FX_RATES['HISTORY_LOOKBACK_DAYS'])
+
+
+def historical_rate(base, quote, on):
+    """
+    The stored daily rate in effect on `on`, or None if nothing recent enough was loaded.
+    """
+    if base == quote:
+        return decimal.Decimal('1')
+    return (
+        DailyFxRate.objects.filter(base_currency=base, quote_currency=quote, date__lte=on, date__gte=on - history_lookback())
+        .order_by('-date')
+        .values_list('rate', flat=True)
+        .first()
+    )
+
+
+def convert(amount, base, quote, on=None):
+    """
+    Converts at the stored daily rate for the expense date when one is loaded, else at the live rate.
+    """
+    rate = historical_rate(base, quote, on) if on else None
+    if rate is None:
+        rate = get_rate(base, quote)
+    return quantize(amount * rate)
+
+
+class RateMatrix:
+    """
+    Daily rates for a set of currency pairs held in memory, so a whole batch of
+    expenses converts without a query per row. Rates on missing days fall back to
+    the latest earlier day within the lookback window.
+    """
+    def __init__(self, rows, lookback):
+        self.lookback = lookback
+        self._dates = {}
+        self._rates = {}
+        # rows must arrive ordered by (base, quote, date)
+        for base, quote, date, rate in rows:
+            self._dates.setdefault((base, quote), []).append(date)
+            self._rates.setdefault((base, quote), []).append(rate)
+
+    @classmethod
+    def load(cls, pairs, date_from, date_to):
+        lookback = history_lookback()
+        pairs = {(base, quote) for base, quote in pairs if base != quote}
+        if not pairs:
+            return cls([], lookback)
+        rows = (
+            DailyFxRate.objects.filter(
+                base_currency__in={base for base, _ in pairs},
+                quote_currency__in={quote for _, quote in pairs},
+                date__gte=date_from - lookback,
+                date__lte=date_to,
+            )
+            .order_by('base_currency', 'quote_currency', 'date')
+            .values_list('base_currency', 'quote_currency', 'date', 'rate')
+        )
+        return cls(rows.iterator(chunk_size=5000), lookback)
+
+    def rate(self, base, quote, on):
+        if base == quote:
+            return decimal.Decimal('1')
+        dates = self._dates.get((base, quote))
+        if not dates:
+            return None
+        index = bisect.bisect_right(dates, on) - 1
+        if index < 0 or on - dates[index] > self.lookback:
+            return None
+        return self._rates[(base, quote)][index]
+
+    def convert(self, amount, base, quote, on):
+        rate = self.rate(base, quote, on)
+        return None if rate is None else quantize(amount * rate)
+
+
+def load_rate_matrix(expenses):
+    """
+    Loads every daily rate a queryset of expenses needs for conversion into its company currency.
+    """
+    bounds = expenses.aggregate(date_from=Min('date'), date_to=Max('date'))
+    if bounds['date_from'] is None:
+        return RateMatrix([], history_lookback())
+    pairs = expenses.values_list('currency', 'employee__company__currency').distinct().order_by()
+    return RateMatrix.load(pairs, bounds['date_from'], bounds['date_to'])
+
+
+@transaction.atomic
+def convert_expenses(expenses, chunk_size=1000):
+    """
+    Recomputes converted_amount for a queryset of expenses at the daily rate of each expense date,
+    in one pass over an in-memory RateMatrix. Rollups and budget usage are adjusted by the resulting deltas.
+    Returns (number of expenses updated, ids skipped for lack of a rate).
+    """
+    matrix = load_rate_matrix(expenses)
+    rows = expenses.values_list(
+        'id', 'amount', 'currency', 'date', 'converted_amount', 'category', 'status',
+        'employee__company_id', 'employee__company__currency', 'employee__manager_id',
+    ).order_by()
+
+    updated, missing, batch, deltas, budget_deltas = 0, [], [], {}, {}
+
+    def flush():
+        Expense.objects.bulk_update(batch, ['converted_amount'])
+        batch.clear()
+
+    for expense_id, amount, currency, date, old_amount, category, status, company_id, company_currency, manager_id in rows.iterator(chunk_size=chunk_size):
+        new_amount = matrix.convert(amount, currency, company_currency, date)
+        if new_amount is None:
+            missing.append(expense_id)
+            continue
+        if new_amount == old_amount:
+            continue
+        batch.append(Expense(id=expense_id, converted_amount=new_amount))
+        bucket = (company_id, date.replace(day=1), category, status)
+        deltas[bucket] = deltas.get(bucket, 0) + new_amount - old_amount
+        budget_key = (company_id, date.replace(day=1), category, manager_id, status)
+        budget_deltas[budget_key] = budget_deltas.get(budget_key, 0) + new_amount - old_amount
+        updated += 1
+        if len(batch) >= chunk_size:
+            flush()
+    if batch:
+        flush()
+
+    for (company_id, month, category, status), delta in deltas.items():
+        if company_id is not None:
+            rollups.adjust(
+                {'company_id': company_id, 'month': month, 'category': category, 'status': status}, 0, delta
+            )
+    budgets.record_many([(*key, delta, 1) for key, delta in budget_deltas.items()])
+    return updated, missing
@@ -0,0 +1,194 @@
+"""
+Bulk import of expenses from CSV or JSON rows. Every row is validated first, then all of
+them are converted from one FX snapshot: the stored daily rates for the dates in the file,
+loaded in a single query, and the live rate table of each currency, fetched at most once.
+Valid rows are written in chunks, one transaction per chunk, with bulk_create for the
+expenses, their approval steps and their viewer rows; pending counters and rollups are
+adjusted in a few queries per chunk.
+
+Imported expenses end up exactly as if each had been POSTed to claims/ by its employee, except
+that budgets count them but never refuse or flag them.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from rest_framework import serializers
+from rest_framework.exceptions import APIException
+from users.models import User
+from .models import Expense, ApprovalStep, ExpenseViewer
+from .serializers import ExpenseImportRowSerializer
+from . import approvals, budgets, flows, fx, rollups, search, visibility
+import csv
+import io
+import json
+
+
+class ImportFileError(Exception):
+    pass
+
+
+def read_rows(file, name):
+    """
+    Rows of a binary CSV (with a header line) or JSON (a list of objects) file.
+    """
+    if name.lower().endswith('.json'):
+        try:
+            rows = json.load(file)
+        except ValueError as e:
+            raise ImportFileError(f'Not valid JSON: {e}') from None
+        if isinstance(rows, dict):
+            rows = rows.get('rows')
+        if not isinstance(rows, list):
+            raise ImportFileError('A JSON import must be a list of rows.')
+        return rows
+    return csv.DictReader(decoded_lines(file))
+
+
+def decoded_lines(file):
+    """
+    The lines of a binary UTF-8 file, each decoded on its own so that a bad byte fails the row it
+    is in. Latin-1 maps bytes one to one and line breaks never occur inside a UTF-8 character, so
+    the file can be split before it is decoded.
+    """
+    for line in io.TextIOWrapper(file, encoding='latin-1', newline=''):
+        yield line.encode('latin-1').decode('utf-8-sig')
+
+
+class ExpenseImporter:
+    def __init__(self, company, default_employee=None, chunk_size=None):
+        self.company = company
+        self.default_employee = default_employee
+        self.chunk_size = chunk_size or settings.EXPENSE_IMPORT['CHUNK_SIZE']
+        # One serializer for every row: building its fields is most of the cost of a fresh one
+        self.row_serializer = ExpenseImportRowSerializer()
+
+        # Rows name their employee by username or id
+        self.employees = {}
+        for user in User.objects.filter(company=company):
+            self.employees[user.username] = user
+            self.employees[str(user.pk)] = user
+        self.flow = flows.get_compiled_flow(company.pk)
+        self.live_rates = {}
+
+    def run(self, rows, max_rows=None, commit=True):
+        """
+        Imports `rows` (dicts) and reports {'rows', 'imported', 'failed', 'errors'}, where errors
+        lists {'row': 1-based row number, 'errors': {field: [messages]}} for rows left out.
+        """
+        result = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': []}
+        valid = []
+        # CSV files are decoded and split as they are read, so a bad byte or quote surfaces here
+        try:
+            for number, row in enumerate(rows, start=1):
+                if max_rows and number > max_rows:
+                    raise ImportFileError(f'Imports are limited to {max_rows} rows; use manage.py import_expenses for larger files.')
+                result['rows'] = number
+                try:
+                    valid.append((number, self.validate(row)))
+                except serializers.ValidationError as e:
+                    self.fail(result, number, serializers.as_serializer_error(e))
+        except (UnicodeDecodeError, csv.Error) as e:
+            raise ImportFileError(f'Row {result["rows"] + 1} could not be read: {e}') from None
+
+        matrix = self.load_rate_matrix(data for _, data in valid)
+        converted = []
+        for number, data in valid:
+            try:
+                data['converted_amount'] = self.convert(matrix, data)
+            except serializers.ValidationError as e:
+                self.fail(result, number, serializers.as_serializer_error(e))
+                continue
+            except APIException as e:
+                # The live rate provider is down and nothing usable is cached
+                self.fail(result, number, {'currency': [str(e.detail)]})
+                continue
+            converted.append(data)
+
+        if commit:
+            for start in range(0, len(converted), self.chunk_size):
+                self.write(converted[start:start + self.chunk_size])
+            result['imported'] = len(converted)
+        return result
+
+    def fail(self, result, number, errors):
+        result['failed'] += 1
+        # Keep the report a sensible size when a whole file is wrong
+        if len(result['errors']) < settings.EXPENSE_IMPORT['MAX_REPORTED_ERRORS']:
+            result['errors'].append({'row': number, 'errors': errors})
+
+    def validate(self, row):
+        data = self.row_serializer.run_validation(row)
+        key = data.pop('employee', '') or ''
+        employee = self.employees.get(str(key).strip()) if key else self.default_employee
+        if employee is None:
+            raise serializers.ValidationError({'employee': [f'No user "{key}" in this company.' if key else 'This field is required.']})
+        data['employee'] = employee
+        return data
+
+    def load_rate_matrix(self, rows):
+        pairs, dates = set(), []
+        for data in rows:
+            pairs.add((data['currency'], self.company.currency))
+            dates.append(data['date'])
+        if not dates:
+            return fx.RateMatrix([], fx.history_lookback())
+        return fx.RateMatrix.load(pairs, min(dates), max(dates))
+
+    def convert(self, matrix, data):
+        # Same rule as a single claim: the stored rate for the expense date, else the live rate
+        rate = matrix.rate(data['currency'], self.company.currency, data['date'])
+        if rate is None:
+            if data['currency'] not in self.live_rates:
+                try:
+                    self.live_rates[data['currency']] = fx.get_rate(data['currency'], self.company.currency)
+                except APIException as e:
+                    self.live_rates[data['currency']] = e
+            rate = self.live_rates[data['currency']]
+            if isinstance(rate, APIException):
+                raise rate
+        return fx.quantize(data['amount'] * rate)
+
+    @transaction.atomic
+    def write(self, chunk):
+        expenses = Expense.objects.bulk_create(
+            [
+                Expense(
+                    approval_flow_history_id=self.flow.flow_id,
+                    approver_count=len(self.flow.plan(data['employee'].manager_id)),
+                    **data,
+                )
+                for data in chunk
+            ],
+            batch_size=self.chunk_size,
+        )
+
+        steps, viewers, pending, buckets, budget_changes = [], [], {}, {}, []
+        for expense in expenses:
+            plan = self.flow.plan(expense.employee.manager_id)
+            steps.extend(
+                ApprovalStep(expense_id=expense.pk, approver_id=approver_id, step_number=step_number)
+                for approver_id, step_number in plan
+            )
+            # Every step starts out pending and the expense waits on the first one
+            approver_ids = {approver_id for approver_id, _ in plan}
+            if plan:
+                first_approver_id = min(plan, key=lambda step: step[1])[0]
+                pending[first_approver_id] = pending.get(first_approver_id, 0) + 1
+            viewers.extend(visibility.new_viewers(expense.pk, expense.employee.manager_id, approver_ids))
+            bucket = (self.company.pk, expense.date.replace(day=1), expense.category, 'PENDING')
+            count, total = buckets.get(bucket, (0, 0))
+            buckets[bucket] = (count + 1, total + expense.converted_amount)
+            budget_changes.append((*budgets.snapshot(expense), 1))
+        ApprovalStep.objects.bulk_create(steps, batch_size=self.chunk_size)
+        ExpenseViewer.objects.bulk_create(viewers, batch_size=self.chunk_size)
+
+        # One UPDATE for the whole chunk instead of a CASE per expense
+        first_pending = ApprovalStep.objects.filter(expense=OuterRef('pk'), status='PENDING').order_by('step_number', 'id')
+        Expense.objects.filter(pk__in=[expense.pk for expense in expenses]).update(
+            current_step=Subquery(first_pending.values('id')[:1]),
+            current_approver=Subquery(first_pending.values('approver_id')[:1]),
+        )
+        approvals.adjust_pending_counts(pending)
+        rollups.adjust_many(buckets)
+        budgets.record_many(budget_changes)
+        search.index([expense.pk for expense in expenses])
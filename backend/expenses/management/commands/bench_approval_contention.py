@@ -0,0 +1,181 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Count, Q
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from expenses.approvals import expected_pointers, stored_pointers, count_by_approver, stored_counts, drifted_approval_counts
+from expenses.models import Expense, ExpenseViewer
+from expenses.rollups import compute_rollups, rebuild_rollups, stored_rollups
+from expenses.sample_data import seed_approval_chain
+from expenses.visibility import compute_viewers
+import os
+import queue
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires concurrent approve/reject calls from every approver of the same expenses at once, '
+        'then reports throughput and fails if any expense ended up in an inconsistent state'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--approvers', type=int, default=4, help='Approvers per expense, all acting at once')
+        parser.add_argument('--expenses', type=int, default=100)
+        parser.add_argument('--reject-rate', type=float, default=0.2, help='Share of calls that are rejections')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # Run against a throwaway test database so real data is never touched. SQLite's test
+        # database lives in memory, which threads can't share with real locking, so use a file.
+        tmp_dir = None
+        if connection.vendor == 'sqlite':
+            tmp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmp_dir, 'contention.sqlite3')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seeded = seed_approval_chain('contention', options['approvers'], options['expenses'])
+            rebuild_rollups()
+            calls = self.plan_calls(seeded, options['reject_rate'], random.Random(options['seed']))
+            started = time.perf_counter()
+            results = self.fire(calls, options['threads'])
+            elapsed = time.perf_counter() - started
+            problems = self.check_invariants(seeded, results)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            if tmp_dir:
+                os.rmdir(tmp_dir)
+
+        timings = [ms for _, _, ms in results]
+        by_status = {}
+        for _, code, _ in results:
+            by_status[code] = by_status.get(code, 0) + 1
+        self.stdout.write(
+            f'{len(results)} calls on {options["threads"]} threads in {elapsed:.2f}s: '
+            f'{len(results) / elapsed:.0f} calls/s, p50 {percentile(timings, 50):.1f} ms, p95 {percentile(timings, 95):.1f} ms'
+        )
+        self.stdout.write('HTTP statuses: ' + ', '.join(f'{code} x{count}' for code, count in sorted(by_status.items())))
+        if problems:
+            for problem in problems[:50]:
+                self.stdout.write(problem)
+            raise CommandError(f'{len(problems)} invariant violation(s) after concurrent approvals.')
+        self.stdout.write(self.style.SUCCESS('Successfully checked concurrent approvals: every expense is consistent'))
+
+    def plan_calls(self, seeded, reject_rate, rng):
+        """
+        [(approver, expense_id, action)], grouped by expense so the calls on one expense are in
+        flight together.
+        """
+        calls = []
+        for expense in seeded['expenses']:
+            group = [
+                (approver, expense.pk, 'reject' if rng.random() < reject_rate else 'approve')
+                for approver in seeded['approvers']
+            ]
+            rng.shuffle(group)
+            calls.extend(group)
+        return calls
+
+    def fire(self, calls, thread_count):
+        """
+        Runs every call over `thread_count` threads. Returns [(call, HTTP status, ms)].
+        """
+        pending = queue.Queue()
+        for call in calls:
+            pending.put(call)
+        results, results_lock = [], threading.Lock()
+
+        def worker():
+            client = APIClient()
+            try:
+                while True:
+                    try:
+                        call = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    approver, expense_id, action = call
+                    client.force_authenticate(approver)
+                    started = time.perf_counter()
+                    try:
+                        code = client.post(f'/api/expenses/claims/{expense_id}/{action}/', {}, format='json').status_code
+                    except Exception as e:
+                        code = type(e).__name__
+                    with results_lock:
+                        results.append((call, code, (time.perf_counter() - started) * 1000))
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def check_invariants(self, seeded, results):
+        problems = []
+        rejected = set(
+            Expense.objects.filter(pk__in=[e.pk for e in seeded['expenses']], status='REJECTED').values_list('pk', flat=True)
+        )
+        for (approver, expense_id, action), code, _ in results:
+            # Once someone rejected the expense, later calls get 409, or 403/404 when the rejection
+            # dropped their step (and with it their view of the expense) before the permission check
+            # ran. Anything else is a broken transition.
+            if code != 200 and not (code in (403, 404, 409) and expense_id in rejected):
+                problems.append(f'{action} of expense {expense_id} by {approver.username} returned {code}')
+        succeeded = sum(1 for _, code, _ in results if code == 200)
+
+        expenses = Expense.objects.filter(pk__in=[e.pk for e in seeded['expenses']]).annotate(
+            approved_steps=Count('approval_steps', filter=Q(approval_steps__status='APPROVED')),
+            rejected_steps=Count('approval_steps', filter=Q(approval_steps__status='REJECTED')),
+            pending_steps=Count('approval_steps', filter=Q(approval_steps__status='PENDING')),
+        )
+        acted = 0
+        for expense in expenses:
+            acted += expense.approved_steps + expense.rejected_steps
+            if expense.status == 'REJECTED' and expense.rejected_steps != 1:
+                problems.append(f'Expense {expense.pk} is rejected with {expense.rejected_steps} rejected steps')
+            elif expense.status == 'APPROVED' and (expense.rejected_steps or expense.pending_steps):
+                problems.append(
+                    f'Expense {expense.pk} is approved with {expense.rejected_steps} rejected and '
+                    f'{expense.pending_steps} pending steps'
+                )
+            elif expense.status == 'PENDING':
+                problems.append(f'Expense {expense.pk} is still pending after every approver acted')
+            if expense.current_step_id is not None and expense.status != 'PENDING':
+                problems.append(f'Expense {expense.pk} is {expense.status} but still points at a step')
+        if acted != succeeded:
+            problems.append(f'{succeeded} calls succeeded but {acted} steps were acted on')
+
+        # The derived state has to match a from-scratch rebuild, as rebuild_* --verify would check
+        expected = expected_pointers()
+        if expected != stored_pointers():
+            problems.append('Expense current_step/current_approver pointers drifted')
+        if count_by_approver(expected) != stored_counts():
+            problems.append('Pending approval counters drifted')
+        if drifted_approval_counts():
+            problems.append('Expense approval counts drifted')
+        if compute_rollups() != stored_rollups():
+            problems.append('Expense rollups drifted')
+        stored_viewers = {
+            (expense_id, viewer_id): (is_team_manager, is_pending_approver)
+            for expense_id, viewer_id, is_team_manager, is_pending_approver in ExpenseViewer.objects.values_list(
+                'expense_id', 'viewer_id', 'is_team_manager', 'is_pending_approver'
+            )
+        }
+        if compute_viewers() != stored_viewers:
+            problems.append('Expense viewers drifted')
+        return problems
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, teardown_databases, setup_test_environment, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+from expenses.models import ApprovalRule, Expense
+from expenses.rollups import rebuild_rollups
+from expenses.sample_data import seed_approval_chain
+import statistics
+import time
+
+# (label, ApprovalRule fields, which approvers act: 'chain' = all in step order, 'last' = only the last one)
+VARIANTS = [
+    ('no rule', None, 'chain'),
+    ('60% of approvers', {'percentage_required': 60}, 'chain'),
+    ('specific approver', {'specific_approver': 'last'}, 'last'),
+    ('hybrid 60% or specific', {'percentage_required': 60, 'specific_approver': 'last', 'hybrid': True}, 'last'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures the latency and query count of approve actions on expenses with 2, 10 and 50 approvers, '
+        'without ApprovalRules and with percentage, specific-approver and hybrid rules'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--approvers', type=int, nargs='+', default=[2, 10, 50])
+        parser.add_argument('--expenses', type=int, default=20, help='Expenses per flow size and variant')
+
+    def handle(self, *args, **options):
+        # Run against a throwaway test database so real data is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(
+                f'{"approvers":>10}  {"rule":<24}{"actions":>9}{"p50 ms":>9}{"p95 ms":>9}{"queries":>9}'
+            )
+            for approver_count in options['approvers']:
+                for label, rule, actors in VARIANTS:
+                    with transaction.atomic():
+                        row = self.run_variant(approver_count, options['expenses'], rule, actors)
+                        transaction.set_rollback(True)
+                    actions, timings, queries = row
+                    self.stdout.write(
+                        f'{approver_count:>10}  {label:<24}{actions:>9}{percentile(timings, 50):>9.1f}'
+                        f'{percentile(timings, 95):>9.1f}{max(queries):>9}'
+                    )
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        self.stdout.write(self.style.SUCCESS('Successfully benchmarked approval actions'))
+
+    def run_variant(self, approver_count, expense_count, rule, actors):
+        """
+        Approves every seeded expense until it completes. Returns (actions per expense, latency of
+        each action in ms, queries of each action).
+        """
+        seeded = seed_approval_chain(f'bench{approver_count}', approver_count, expense_count)
+        rebuild_rollups()
+        approvers = seeded['approvers']
+        if rule:
+            fields = dict(rule)
+            if fields.get('specific_approver') == 'last':
+                fields['specific_approver'] = approvers[-1]
+            ApprovalRule.objects.create(company=seeded['company'], name='bench', **fields)
+        acting = approvers if actors == 'chain' else approvers[-1:]
+
+        client = APIClient()
+        timings, queries, actions = [], [], 0
+        for expense in seeded['expenses']:
+            for approver in acting:
+                if not Expense.objects.filter(pk=expense.pk, status='PENDING').exists():
+                    break
+                client.force_authenticate(approver)
+                # The query log is capped, and a whole variant runs in one transaction
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = client.post(f'/api/expenses/claims/{expense.pk}/approve/', {}, format='json')
+                    timings.append((time.perf_counter() - started) * 1000)
+                if response.status_code != 200:
+                    raise CommandError(f'Approving expense {expense.pk} returned HTTP {response.status_code}')
+                queries.append(len(captured))
+                actions += 1
+        if Expense.objects.filter(pk__in=[e.pk for e in seeded['expenses']]).exclude(status='APPROVED').exists():
+            raise CommandError('Some expenses were not approved')
+        return actions // len(seeded['expenses']), timings, queries
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
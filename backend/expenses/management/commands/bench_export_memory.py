@@ -0,0 +1,139 @@
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from rest_framework_simplejwt.tokens import AccessToken
+from expenses.models import Expense
+from expenses.sample_data import seed_company
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+FORMATS = ('csv', 'xlsx')
+SEED_ROWS = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures peak web-worker RSS while streaming claims/export/ as CSV and XLSX for exports '
+        'of each size; growth should stay flat as the row count goes up'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100_000, 1_000_000])
+        parser.add_argument('--child', nargs=2, metavar=('FORMAT', 'ROWS'), help='Internal: measure one export')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(measure(options['child'][0], int(options['child'][1]))))
+            return
+
+        self.stdout.write(f'{"rows":>10}{"format":>8}{"size":>11}{"seconds":>9}{"RSS before":>13}{"peak":>10}{"growth":>10}')
+        for rows in options['rows']:
+            for file_format in FORMATS:
+                # A fresh process per export, so one measurement can't inflate the next
+                result = subprocess.run(
+                    [sys.executable, sys.argv[0], 'bench_export_memory', '--child', file_format, str(rows)],
+                    capture_output=True, text=True,
+                )
+                if result.returncode:
+                    raise CommandError(result.stderr)
+                row = json.loads(result.stdout.strip().splitlines()[-1])
+                if row['status'] != 200:
+                    raise CommandError(f'{file_format} export of {rows} rows returned HTTP {row["status"]}')
+                self.stdout.write(
+                    f'{rows:>10}{file_format:>8}{row["bytes"] / 1024 / 1024:>9.1f}MB{row["seconds"]:>9.1f}'
+                    f'{mb(row["rss_before"]):>13}{mb(row["peak"]):>10}{mb(row["peak"] - row["rss_before"]):>10}'
+                )
+        self.stdout.write(self.style.SUCCESS('Successfully measured export memory'))
+
+
+def mb(kilobytes):
+    return f'{kilobytes / 1024:.1f}MB'
+
+
+def measure(file_format, rows):
+    # On disk rather than SQLite's in-memory test database, so millions of seeded rows
+    # don't count towards the RSS being measured
+    with tempfile.TemporaryDirectory() as workdir:
+        if connection.vendor == 'sqlite':
+            connection.settings_dict['TEST']['NAME'] = os.path.join(workdir, 'export.sqlite3')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seeded = seed_company('export', 10, min(rows, SEED_ROWS))
+            grow_expenses(rows)
+            token = str(AccessToken.for_user(seeded['admin']))
+            handler = WSGIHandler()
+
+            # Warm up imports and code paths with an empty export before measuring
+            run(handler, token, file_format, 'date_from=2999-01-01')
+
+            rss_before = read_status('VmRSS')
+            reset_peak()
+            started = time.perf_counter()
+            status, size = run(handler, token, file_format)
+            return {
+                'status': status, 'bytes': size, 'seconds': time.perf_counter() - started,
+                'rss_before': rss_before, 'peak': peak_rss(),
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+
+def grow_expenses(total):
+    """
+    Copies the seeded expenses in SQL until there are `total` of them; building that many
+    model instances would cost minutes and more memory than the export being measured.
+    """
+    quote = connection.ops.quote_name
+    table = quote(Expense._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in Expense._meta.concrete_fields if not field.primary_key)
+    with connection.cursor() as cursor:
+        while (count := Expense.objects.count()) < total:
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) SELECT {columns} FROM {table} ORDER BY {quote("id")} LIMIT %s',
+                [total - count],
+            )
+
+
+def run(handler, token, file_format, query=''):
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': '/api/expenses/claims/export/',
+        'QUERY_STRING': f'file_format={file_format}&{query}',
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'HTTP_AUTHORIZATION': f'Bearer {token}',
+    }
+    response = handler(environ, lambda status, headers: None)
+    # Read it the way a WSGI server would, a chunk at a time, and throw it away
+    size = sum(len(chunk) for chunk in response)
+    response.close()
+    return response.status_code, size
+
+
+def read_status(field):
+    # Kilobytes, from /proc/self/status
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise CommandError('Peak RSS can only be measured on Linux')
+
+
+def reset_peak():
+    # Resets VmHWM to the current RSS (Linux 4.0+)
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def peak_rss():
+    return read_status('VmHWM')
@@ -0,0 +1,153 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from rest_framework.test import APIClient
+from users.models import Company, User
+from expenses.models import Expense, OCRRecord
+from expenses.sample_data import CATEGORIES
+from expenses.search import get_backend
+import datetime
+import decimal
+import os
+import random
+import statistics
+import tempfile
+import time
+
+ITEMS = [
+    'taxi', 'flight', 'train', 'parking', 'fuel', 'hotel', 'dinner', 'lunch', 'breakfast', 'coffee',
+    'laptop', 'monitor', 'keyboard', 'license', 'subscription', 'printer', 'paper', 'toner', 'conference',
+    'workshop', 'mileage', 'toll', 'rental', 'visa', 'courier', 'postage', 'headset', 'phone', 'internet', 'gift',
+]
+MERCHANTS = [
+    'Uber', 'Lyft', 'Delta', 'Lufthansa', 'Amtrak', 'Marriott', 'Hilton', 'Hyatt', 'Starbucks', 'Costa',
+    'Dell', 'Lenovo', 'Adobe', 'Atlassian', 'Staples', 'Shell', 'Chevron', 'Hertz', 'Avis', 'FedEx',
+    'Zoom', 'Slack', 'Amazon', 'Apple', 'Verizon', 'Vodafone', 'Accor', 'Ibis', 'Sixt', 'Pret',
+]
+CITIES = [
+    'Berlin', 'Paris', 'London', 'Madrid', 'Lisbon', 'Boston', 'Chicago', 'Denver', 'Austin', 'Seattle',
+    'Toronto', 'Mumbai', 'Pune', 'Delhi', 'Tokyo', 'Osaka', 'Sydney', 'Dublin', 'Zürich', 'München',
+]
+FIRST_NAMES = ['Aarav', 'Zoë', 'Mateo', 'Priya', 'Liam', 'Amélie', 'Noah', 'Ananya', 'Jonas', 'Sofia']
+LAST_NAMES = ['Sharma', 'Müller', 'García', 'Okafor', 'Smith', 'Dubois', 'Kowalski', 'Tanaka', 'Rossi', 'Patel']
+
+# (label, search, acting user); the comments give the share of expenses each one matches
+QUERIES = [
+    ('rare term', 'inv0012345', 'admin'),                   # one expense
+    ('merchant', 'marriott', 'admin'),                      # ~1/30
+    ('prefix', 'marr', 'admin'),                            # ~1/30
+    ('two terms', 'taxi berlin', 'admin'),                  # ~1/600
+    ('employee name', 'muller', 'admin'),                   # ~1/10, matched without the umlaut
+    ('receipt text', 'folio', 'admin'),                     # lodging receipts, ~1/20
+    ('common term', 'travel', 'admin'),                     # ~1/5
+    ('common term, own claims', 'travel', 'employee'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Seeds expenses with varied descriptions, employee names and receipt text, builds the '
+        'search index and times claims/search/ for rare, common, prefix and multi-word searches'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--employees', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20, help='Timed calls per search')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # A file rather than SQLite's in-memory test database, which millions of rows would outgrow
+        tmp_dir = None
+        if connection.vendor == 'sqlite':
+            tmp_dir = tempfile.mkdtemp()
+            connection.settings_dict['TEST']['NAME'] = os.path.join(tmp_dir, 'search.sqlite3')
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seeded = self.seed_users(options['employees'])
+            started = time.perf_counter()
+            self.seed_expenses(seeded['employees'], options['rows'], random.Random(options['seed']))
+            self.stdout.write(f'Seeded {options["rows"]} expenses in {time.perf_counter() - started:.1f}s')
+            started = time.perf_counter()
+            get_backend().rebuild()
+            self.stdout.write(f'Built the search index in {time.perf_counter() - started:.1f}s')
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            results = [self.time_search(seeded, *query, options['repeat']) for query in QUERIES]
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+            if tmp_dir:
+                os.rmdir(tmp_dir)
+
+        self.stdout.write(f'{"search":<26}{"query":<14}{"matches":>9}{"p50":>10}{"p95":>10}')
+        for (label, text, _), (matches, timings) in zip(QUERIES, results):
+            self.stdout.write(
+                f'{label:<26}{text:<14}{matches:>9}{percentile(timings, 50):>8.1f}ms{percentile(timings, 95):>8.1f}ms'
+            )
+        self.stdout.write(self.style.SUCCESS('Successfully measured search'))
+
+    def seed_users(self, employee_count):
+        company = Company.objects.create(name='search Inc.', country='United States', currency='USD')
+        employees = User.objects.bulk_create([
+            User(
+                username=f'search_employee{i}', role='EMPLOYEE', company=company,
+                first_name=FIRST_NAMES[i % len(FIRST_NAMES)], last_name=LAST_NAMES[i // len(FIRST_NAMES) % len(LAST_NAMES)],
+            )
+            for i in range(employee_count)
+        ])
+        return {
+            'admin': User.objects.create(username='search_admin', role='ADMIN', company=company),
+            'employee': employees[0],
+            'employees': employees,
+        }
+
+    def seed_expenses(self, employees, rows, rng):
+        today = timezone.now().date()
+        batch_size = 10_000
+        for start in range(0, rows, batch_size):
+            expenses, receipts = [], []
+            for i in range(start, min(start + batch_size, rows)):
+                category = rng.choice(CATEGORIES)
+                amount = decimal.Decimal(rng.randrange(100, 50_000)) / 100
+                expenses.append(Expense(
+                    employee=employees[i % len(employees)],
+                    amount=amount,
+                    currency='USD',
+                    converted_amount=amount,
+                    category=category,
+                    description=f'{rng.choice(ITEMS)} {rng.choice(MERCHANTS)} {rng.choice(CITIES)} inv{i:07d}',
+                    date=today - datetime.timedelta(days=i % 365),
+                ))
+            Expense.objects.bulk_create(expenses, batch_size=batch_size)
+            for expense in expenses:
+                if expense.category == 'Lodging' and rng.random() < 0.25:
+                    receipts.append(OCRRecord(
+                        expense=expense,
+                        raw_text=f'{rng.choice(MERCHANTS)} {rng.choice(CITIES)}\nGuest folio {rng.randrange(10 ** 6)}\n'
+                                 f'Total {expense.amount}',
+                        extracted_amount=expense.amount,
+                    ))
+            OCRRecord.objects.bulk_create(receipts, batch_size=batch_size)
+
+    def time_search(self, seeded, label, text, role, repeat):
+        client = APIClient()
+        client.force_authenticate(seeded[role])
+        url = '/api/expenses/claims/search/'
+        response = client.get(url, {'q': text})
+        if response.status_code != 200:
+            raise CommandError(f'Search for {text!r} returned HTTP {response.status_code}')
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url, {'q': text})
+            timings.append((time.perf_counter() - started) * 1000)
+        return response.data['count'], timings
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
@@ -0,0 +1,122 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from expenses.query_budget import query_budget, QueryBudgetExceeded
+from expenses import budgets, flows, search
+from expenses.models import Budget, Expense
+from expenses.sample_data import seed_company
+
+ROW_COUNTS = (10, 100, 1000)
+
+# (label, acting user, url, max queries). The budgets must not grow with the row count.
+ENDPOINT_BUDGETS = [
+    ('claims list (admin)', 'admin', '/api/expenses/claims/', 2),
+    ('claims list (manager)', 'manager', '/api/expenses/claims/', 2),
+    ('claims list (employee)', 'employee', '/api/expenses/claims/', 2),
+    ('claims list, filtered (admin)', 'admin', '/api/expenses/claims/?status=PENDING&amount_min=50&ordering=-amount', 2),
+    ('claim detail (admin)', 'admin', '/api/expenses/claims/{expense_id}/', 2),
+    ('claims stats (admin)', 'admin', '/api/expenses/claims/stats/', 4),
+    ('claims stats (manager)', 'manager', '/api/expenses/claims/stats/', 4),
+    ('claims search (admin)', 'admin', '/api/expenses/claims/search/?q=budget+expense', 4),
+    ('claims search (manager)', 'manager', '/api/expenses/claims/search/?q=budget+expense', 4),
+    ('approval queue (manager)', 'manager', '/api/expenses/claims/approval_queue/', 2),
+    ('approval queue (admin)', 'admin', '/api/expenses/claims/approval_queue/', 2),
+    ('pending count (manager)', 'manager', '/api/expenses/claims/pending_count/', 1),
+    ('users list (admin)', 'admin', '/api/users/manage/', 1),
+    ('approval flows list (admin)', 'admin', '/api/expenses/approval-flows/', 2),
+    ('budget report (admin)', 'admin', '/api/expenses/budgets/report/', 1),
+    ('budget report (manager)', 'manager', '/api/expenses/budgets/report/', 1),
+]
+
+# (label, acting user, action, max queries) for claims/bulk_action/ over every pending expense,
+# run in order after the read-only checks since each one changes the data. Like claim
+# submission below, they are measured once the company's approval flow is cached.
+BULK_ACTION_BUDGETS = [
+    ('bulk approve (manager)', 'manager', 'approve', 16),
+    ('bulk reject (admin)', 'admin', 'reject', 23),
+]
+
+# Submitting a claim, once the company's approval flow is cached (see expenses/flows.py), checked
+# against and counted towards the three seeded budgets, and added to the search index
+CREATE_CLAIM_BUDGET = 26
+
+
+class Command(BaseCommand):
+    help = 'Fails if any expenses, users or approval-flow endpoint exceeds its SQL query budget'
+
+    def handle(self, *args, **kwargs):
+        # Run against a throwaway test database so real data is never touched
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        failures = []
+        try:
+            for rows in ROW_COUNTS:
+                with transaction.atomic():
+                    failures += self.check_budgets(rows)
+                    transaction.set_rollback(True)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError('Query budgets exceeded:\n\n' + '\n\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('All endpoints are within their query budgets.'))
+
+    def check_budgets(self, rows):
+        seeded = seed_company('budget', employee_count=rows, expense_count=rows, flow_count=rows)
+        # A company-wide, a category and a team budget, which every claim below falls under
+        budgets.rebuild_usage(Budget.objects.bulk_create([
+            Budget(company=seeded['company'], name='Company', monthly_amount=10 ** 9),
+            Budget(company=seeded['company'], name='Travel', category='Travel', monthly_amount=10 ** 9, blocking=True),
+            Budget(company=seeded['company'], name='Team', manager=seeded['manager'], monthly_amount=10 ** 9),
+        ]))
+        search.get_backend().rebuild()
+        client = APIClient()
+        failures = []
+        for label, role, url, budget in ENDPOINT_BUDGETS:
+            client.force_authenticate(seeded[role])
+            try:
+                with query_budget(budget, f'{label} @ {rows} rows') as captured:
+                    response = client.get(url.format(expense_id=seeded['expense_id']))
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                continue
+            if response.status_code != 200:
+                failures.append(f'{label} @ {rows} rows returned HTTP {response.status_code}')
+                continue
+            self.stdout.write(f'{label} @ {rows} rows: {len(captured)}/{budget} queries')
+
+        flows.get_compiled_flow(seeded['company'].pk)
+        pending_ids = list(
+            Expense.objects.filter(employee__company=seeded['company'], status='PENDING').values_list('id', flat=True)
+        )
+        for label, role, action, budget in BULK_ACTION_BUDGETS:
+            client.force_authenticate(seeded[role])
+            try:
+                with query_budget(budget, f'{label} @ {rows} rows') as captured:
+                    response = client.post(
+                        '/api/expenses/claims/bulk_action/', {'action': action, 'ids': pending_ids}, format='json'
+                    )
+            except QueryBudgetExceeded as e:
+                failures.append(str(e))
+                continue
+            if response.status_code != 200 or any('error' in result for result in response.data['results']):
+                failures.append(f'{label} @ {rows} rows did not act on every expense')
+                continue
+            self.stdout.write(f'{label} @ {rows} rows: {len(captured)}/{budget} queries')
+
+        client.force_authenticate(seeded['employee'])
+        claim = {'amount': '12.50', 'currency': seeded['company'].currency, 'category': 'Travel',
+                 'description': 'Budget check', 'date': '2025-01-02'}
+        try:
+            with query_budget(CREATE_CLAIM_BUDGET, f'create claim (employee) @ {rows} rows') as captured:
+                response = client.post('/api/expenses/claims/', claim, format='json')
+        except QueryBudgetExceeded as e:
+            failures.append(str(e))
+        else:
+            if response.status_code != 201:
+                failures.append(f'create claim (employee) @ {rows} rows returned HTTP {response.status_code}')
+            else:
+                self.stdout.write(f'create claim (employee) @ {rows} rows: {len(captured)}/{CREATE_CLAIM_BUDGET} queries')
+        return failures
@@ -0,0 +1,127 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, teardown_databases, setup_test_environment, teardown_test_environment,
+)
+from rest_framework.test import APIClient
+from expenses import search
+from expenses.sample_data import seed_company
+import re
+
+# (label, acting user, method, url, payload) for the hot endpoint paths
+ENDPOINT_CALLS = [
+    ('claims list (admin)', 'admin', 'get', '/api/expenses/claims/', None),
+    ('claims list (manager)', 'manager', 'get', '/api/expenses/claims/', None),
+    ('claims list (employee)', 'employee', 'get', '/api/expenses/claims/', None),
+    ('claims list by status (admin)', 'admin', 'get', '/api/expenses/claims/', {'status': 'PENDING'}),
+    ('claims list by category (manager)', 'manager', 'get', '/api/expenses/claims/', {'category': 'Lodging'}),
+    ('claims list by currency (admin)', 'admin', 'get', '/api/expenses/claims/', {'currency': 'EUR'}),
+    ('claims list by employee (admin)', 'admin', 'get', '/api/expenses/claims/?employee={employee.pk}', None),
+    ('claims list by date range (admin)', 'admin', 'get', '/api/expenses/claims/', {
+        'date_from': '2025-01-01', 'date_to': '2025-01-31', 'ordering': 'date',
+    }),
+    ('claims list by amount range (admin)', 'admin', 'get', '/api/expenses/claims/', {
+        'amount_min': '400', 'amount_max': '450', 'ordering': '-amount',
+    }),
+    ('claims list by amount (employee)', 'employee', 'get', '/api/expenses/claims/', {'ordering': '-amount'}),
+    ('claim detail (employee)', 'employee', 'get', '/api/expenses/claims/{expense_id}/', None),
+    ('approval queue (manager)', 'manager', 'get', '/api/expenses/claims/approval_queue/', None),
+    ('pending count (manager)', 'manager', 'get', '/api/expenses/claims/pending_count/', None),
+    ('claims stats (admin)', 'admin', 'get', '/api/expenses/claims/stats/', None),
+    ('claims stats (employee)', 'employee', 'get', '/api/expenses/claims/stats/', None),
+    ('claims search (admin)', 'admin', 'get', '/api/expenses/claims/search/', {'q': 'plan0 expense 17'}),
+    ('claims search (manager)', 'manager', 'get', '/api/expenses/claims/search/', {'q': 'expense'}),
+    ('submit claim (employee)', 'employee', 'post', '/api/expenses/claims/', {
+        'amount': '12.50', 'currency': 'USD', 'category': 'Travel', 'description': 'Taxi', 'date': '2025-01-15',
+    }),
+    ('approve claim (manager)', 'manager', 'post', '/api/expenses/claims/{expense_id}/approve/', {}),
+    ('reject claim (manager)', 'manager', 'post', '/api/expenses/claims/{other_expense_id}/reject/', {}),
+]
+
+# Plan lines that read a whole table instead of seeking through an index
+FULL_SCAN_PATTERNS = {
+    'sqlite': re.compile(r'^SCAN (\w+)(?: LEFT-JOIN)?$', re.MULTILINE),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+}
+
+
+class Command(BaseCommand):
+    help = 'Fails if a main endpoint query falls back to a full table scan on a large seeded dataset'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expenses', type=int, default=20000, help='Expenses to seed per company')
+        parser.add_argument('--companies', type=int, default=3)
+        parser.add_argument(
+            '--min-rows', type=int, default=1000,
+            help='Ignore scans of tables smaller than this; planners rightly scan tiny lookup tables',
+        )
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every captured plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in EXPLAIN_PREFIXES:
+            raise CommandError(f'Query plan checks are not supported on {connection.vendor}.')
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            with transaction.atomic():
+                failures = self.check_plans(options)
+                transaction.set_rollback(True)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if failures:
+            raise CommandError('Full table scans found:\n\n' + '\n\n'.join(failures))
+        self.stdout.write(self.style.SUCCESS('No endpoint query falls back to a full table scan.'))
+
+    def check_plans(self, options):
+        companies = [
+            seed_company(f'plan{i}', employee_count=200, expense_count=options['expenses'])
+            for i in range(options['companies'])
+        ]
+        search.get_backend().rebuild()
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        large_tables = self.large_tables(options['min_rows'])
+
+        seeded = companies[0]
+        client = APIClient()
+        failures = []
+        for label, role, method, url, payload in ENDPOINT_CALLS:
+            client.force_authenticate(seeded[role])
+            with CaptureQueriesContext(connection) as captured:
+                response = getattr(client, method)(url.format(**seeded), payload)
+            if response.status_code >= 400:
+                failures.append(f'{label} returned HTTP {response.status_code}')
+                continue
+            for query in captured.captured_queries:
+                plan = self.explain(query['sql'])
+                if options['verbose_plans']:
+                    self.stdout.write(f'{label}: {query["sql"]}\n{plan}\n')
+                scanned = [table for table in FULL_SCAN_PATTERNS[connection.vendor].findall(plan) if table in large_tables]
+                if scanned:
+                    failures.append(f'{label} scans {", ".join(scanned)}:\n{query["sql"]}\n{plan}')
+        return failures
+
+    def large_tables(self, min_rows):
+        tables = set()
+        with connection.cursor() as cursor:
+            for table in connection.introspection.table_names(cursor):
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+                if cursor.fetchone()[0] >= min_rows:
+                    tables.add(table)
+        return tables
+
+    def explain(self, sql):
+        # Captured SQL has its parameters inlined, which is what EXPLAIN needs
+        if sql.split(None, 1)[0].upper() not in ('SELECT', 'UPDATE', 'DELETE'):
+            return ''
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN_PREFIXES[connection.vendor] + sql)
+            # SQLite puts the plan text in the last column, Postgres in the only one
+            return '\n'.join(row[-1] for row in cursor.fetchall())
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from users.models import Company, User
+from expenses.importer import ExpenseImporter, ImportFileError, read_rows
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-imports expenses into a company from CSV files (employee,amount,currency,category,description,date '
+        'columns) or JSON files (a list of objects with those keys). Invalid rows are skipped and reported.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--company', type=int, required=True, help='Company id')
+        parser.add_argument('--employee', help='Username used for rows without an employee')
+        parser.add_argument('--chunk-size', type=int, help='Rows per transaction (default: EXPENSE_IMPORT)')
+        parser.add_argument('--dry-run', action='store_true', help='Validate and convert without writing anything')
+
+    def handle(self, *args, **options):
+        company = Company.objects.filter(pk=options['company']).first()
+        if company is None:
+            raise CommandError(f'No company with id {options["company"]}.')
+        default_employee = None
+        if options['employee']:
+            default_employee = User.objects.filter(company=company, username=options['employee']).first()
+            if default_employee is None:
+                raise CommandError(f'No user "{options["employee"]}" in {company.name}.')
+
+        importer = ExpenseImporter(company, default_employee=default_employee, chunk_size=options['chunk_size'])
+        imported = failed = 0
+        for path in options['paths']:
+            started = time.perf_counter()
+            with open(path, 'rb') as f:
+                try:
+                    result = importer.run(read_rows(f, path), commit=not options['dry_run'])
+                except ImportFileError as e:
+                    raise CommandError(f'{path}: {e}')
+            for error in result['errors']:
+                self.stdout.write(f'{path} row {error["row"]}: {error["errors"]}')
+            if result['failed'] > len(result['errors']):
+                self.stdout.write(f'{path}: ... and {result["failed"] - len(result["errors"])} more invalid row(s)')
+            self.stdout.write(
+                f'{path}: {result["rows"]} rows, {result["imported"]} imported, {result["failed"]} invalid '
+                f'in {time.perf_counter() - started:.1f}s'
+            )
+            imported += result['imported']
+            failed += result['failed']
+
+        if options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Dry run finished: {failed} invalid row(s), nothing written.'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Successfully imported {imported} expense(s); {failed} row(s) skipped.'))
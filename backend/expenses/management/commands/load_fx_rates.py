@@ -0,0 +1,95 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from expenses.models import DailyFxRate
+import csv
+import datetime
+import decimal
+import json
+
+# Header of the CSV format
+COLUMNS = ('date', 'base', 'quote', 'rate')
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-loads daily FX rates. CSV files need date,base,quote,rate columns; '
+        'JSON files look like {"2025-01-02": {"EUR": {"USD": "1.08"}}}. Existing rates are overwritten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = 0
+        for path in options['paths']:
+            rows = self.read_json(path) if path.endswith('.json') else self.read_csv(path)
+            loaded = self.load(rows, options['batch_size'])
+            self.stdout.write(f'{path}: {loaded} rates')
+            total += loaded
+        self.stdout.write(self.style.SUCCESS(f'Successfully loaded {total} daily rates.'))
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        loaded = 0
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                loaded += self.upsert(batch)
+                batch = []
+        if batch:
+            loaded += self.upsert(batch)
+        return loaded
+
+    def upsert(self, batch):
+        DailyFxRate.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['base_currency', 'quote_currency', 'date'],
+            update_fields=['rate'],
+        )
+        return len(batch)
+
+    def read_csv(self, path):
+        with open(path, newline='') as f:
+            reader = csv.DictReader(f)
+            try:
+                missing = [column for column in COLUMNS if column not in (reader.fieldnames or [])]
+                if missing:
+                    raise CommandError(f'{path}: missing column(s) {", ".join(missing)}; expected {",".join(COLUMNS)}')
+                for row in reader:
+                    # A short line leaves its last columns as None
+                    if None in (row[column] for column in COLUMNS):
+                        raise CommandError(f'{path} (line {reader.line_num}): expected {len(COLUMNS)} columns')
+                    yield self.build(path, f'line {reader.line_num}', row['date'], row['base'], row['quote'], row['rate'])
+            except csv.Error as e:
+                raise CommandError(f'{path}: line {reader.line_num}: {e}')
+            except UnicodeDecodeError as e:
+                raise CommandError(f'{path}: {e}')
+
+    def read_json(self, path):
+        with open(path) as f:
+            try:
+                days = json.load(f)
+            except ValueError as e:
+                # JSONDecodeError carries the position; a file that isn't UTF-8 doesn't
+                raise CommandError(f'{path}: line {e.lineno}: {e.msg}' if isinstance(e, json.JSONDecodeError) else f'{path}: {e}')
+        try:
+            for date, tables in days.items():
+                for base, rates in tables.items():
+                    for quote, rate in rates.items():
+                        yield self.build(path, date, date, base, quote, rate)
+        except AttributeError:
+            raise CommandError(f'{path}: expected {{"date": {{"base": {{"quote": rate}}}}}}')
+
+    def build(self, path, where, date, base, quote, rate):
+        try:
+            return DailyFxRate(
+                date=datetime.date.fromisoformat(date.strip()),
+                base_currency=base.strip().upper(),
+                quote_currency=quote.strip().upper(),
+                rate=decimal.Decimal(str(rate).strip()),
+            )
+        except (ValueError, decimal.InvalidOperation, AttributeError) as e:
+            raise CommandError(f'{path} ({where}): invalid rate row: {e}')
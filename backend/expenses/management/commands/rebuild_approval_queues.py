@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.approvals import (
+    expected_pointers, stored_pointers, count_by_approver, stored_counts, drifted_approval_counts, rebuild_approval_queues,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Recomputes Expense.current_step/current_approver, Expense.approval_count and the pending '
+        'approval counters from ApprovalStep'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift instead of rebuilding')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            rebuild_approval_queues()
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt approval queues.'))
+            return
+
+        expected = expected_pointers()
+        stored = stored_pointers()
+        drifted = sorted(key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
+        for expense_id in drifted:
+            self.stdout.write(f'Expense {expense_id}: expected (step, approver) {expected.get(expense_id)}, stored {stored.get(expense_id)}')
+
+        expected_counts = count_by_approver(expected)
+        counts = stored_counts()
+        drifted_counts = sorted(key for key in expected_counts.keys() | counts.keys() if expected_counts.get(key) != counts.get(key))
+        for user_id in drifted_counts:
+            self.stdout.write(f'User {user_id}: expected {expected_counts.get(user_id, 0)} pending, stored {counts.get(user_id, 0)}')
+
+        approval_counts = drifted_approval_counts()
+        for expense_id, (expected_count, stored_count) in sorted(approval_counts.items()):
+            self.stdout.write(f'Expense {expense_id}: expected {expected_count} approvals, stored {stored_count}')
+
+        if drifted or drifted_counts or approval_counts:
+            raise CommandError(
+                f'{len(drifted)} expense pointer(s), {len(drifted_counts)} counter(s) and '
+                f'{len(approval_counts)} approval count(s) out of date; '
+                'run rebuild_approval_queues to fix.'
+            )
+        self.stdout.write(self.style.SUCCESS('Approval queues are consistent.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.budgets import compute_usage, stored_usage, rebuild_usage
+
+
+class Command(BaseCommand):
+    help = 'Recomputes every budget\'s monthly usage from the expenses, or verifies it with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift instead of rebuilding')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            rebuild_usage()
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt budget usage.'))
+            return
+
+        expected = compute_usage()
+        stored = stored_usage()
+        drifted = sorted(key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
+        for budget_id, month in drifted:
+            self.stdout.write(
+                f'Budget {budget_id} {month:%Y-%m}: expected (pending, approved) {expected.get((budget_id, month))}, '
+                f'stored {stored.get((budget_id, month))}'
+            )
+        if drifted:
+            raise CommandError(f'{len(drifted)} budget month(s) out of date; run rebuild_budget_usage to fix.')
+        self.stdout.write(self.style.SUCCESS('Budget usage is consistent.'))
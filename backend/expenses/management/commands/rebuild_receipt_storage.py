@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.models import Expense
+from expenses.storage import CONTENT_ADDRESSED, derivative_name, receipt_storage
+from django.conf import settings
+import os
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Moves receipts uploaded before content addressing to their content-hash names and writes any '
+        'missing thumbnail/preview derivatives, or reports what is left to do with --verify'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report legacy receipts and missing derivatives')
+        parser.add_argument(
+            '--delete-originals', action='store_true', help='Delete legacy files once no expense refers to them'
+        )
+
+    def handle(self, *args, **options):
+        storage = receipt_storage()
+        receipts = Expense.objects.exclude(receipt_image='').exclude(receipt_image__isnull=True)
+        legacy = [e for e in receipts.only('id', 'receipt_image') if not CONTENT_ADDRESSED.match(e.receipt_image.name)]
+        stored_names = set(receipts.values_list('receipt_image', flat=True)) - {e.receipt_image.name for e in legacy}
+        missing = sorted(
+            name for name in stored_names
+            if any(not storage.exists(derivative_name(name, kind)) for kind in settings.RECEIPT_STORAGE['DERIVATIVES'])
+        )
+
+        if options['verify']:
+            for expense in legacy:
+                self.stdout.write(f'expense {expense.pk}: {expense.receipt_image.name} is not content-addressed')
+            for name in missing:
+                self.stdout.write(f'{name}: missing derivatives')
+            if legacy or missing:
+                raise CommandError(
+                    f'{len(legacy)} legacy receipt(s), {len(missing)} receipt(s) without derivatives; '
+                    'run rebuild_receipt_storage to fix.'
+                )
+            self.stdout.write(self.style.SUCCESS('Receipt storage is up to date.'))
+            return
+
+        moved, originals = [], set()
+        for expense in legacy:
+            old_name = expense.receipt_image.name
+            if not storage.exists(old_name):
+                self.stderr.write(f'expense {expense.pk}: {old_name} is missing, skipped')
+                continue
+            with storage.open(old_name) as original:
+                expense.receipt_image.name = storage.save(os.path.basename(old_name), original)
+            expense.receipt_sha256 = os.path.splitext(os.path.basename(expense.receipt_image.name))[0]
+            moved.append(expense)
+            originals.add(old_name)
+        Expense.objects.bulk_update(moved, ['receipt_image', 'receipt_sha256'], batch_size=BATCH_SIZE)
+
+        for name in missing:
+            with storage.open(name) as stored:
+                storage.write_derivatives(name, stored)
+
+        deleted = 0
+        if options['delete_originals']:
+            still_used = set(Expense.objects.filter(receipt_image__in=originals).values_list('receipt_image', flat=True))
+            for name in originals - still_used:
+                storage.delete(name)
+                deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully moved {len(moved)} receipt(s), wrote derivatives for {len(missing)} '
+            f'and deleted {deleted} original(s).'
+        ))
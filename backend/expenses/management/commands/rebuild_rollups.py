@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.rollups import compute_rollups, stored_rollups, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-company expense rollups from scratch, or verifies them with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift instead of rebuilding')
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt expense rollups.'))
+            return
+
+        expected = compute_rollups()
+        stored = stored_rollups()
+        drifted = sorted(
+            (key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key)),
+            key=str,
+        )
+        for key in drifted:
+            self.stdout.write(f'{key}: expected {expected.get(key)}, stored {stored.get(key)}')
+        if drifted:
+            raise CommandError(f'{len(drifted)} rollup bucket(s) out of date; run rebuild_rollups to fix.')
+        self.stdout.write(self.style.SUCCESS('Expense rollups are consistent.'))
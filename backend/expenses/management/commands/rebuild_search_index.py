@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the expense search index from the expenses, or verifies it with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify', action='store_true', help='Report drift instead of rebuilding')
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not options['verify']:
+            backend.rebuild()
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt the search index.'))
+            return
+
+        drift = backend.drift()
+        if drift:
+            raise CommandError(f'{drift} search index entries missing, stale or orphaned; run rebuild_search_index to fix.')
+        self.stdout.write(self.style.SUCCESS('Search index is consistent.'))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from expenses.models import Expense
+from expenses.fx import convert_expenses
+import datetime
+
+
+class Command(BaseCommand):
+    help = 'Recomputes converted_amount from the stored daily FX rates of each expense date'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--company', type=int, help='Only expenses of this company id')
+        parser.add_argument('--date-from', type=datetime.date.fromisoformat, help='YYYY-MM-DD')
+        parser.add_argument('--date-to', type=datetime.date.fromisoformat, help='YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        expenses = Expense.objects.all()
+        if options['company']:
+            expenses = expenses.filter(employee__company_id=options['company'])
+        if options['date_from']:
+            expenses = expenses.filter(date__gte=options['date_from'])
+        if options['date_to']:
+            expenses = expenses.filter(date__lte=options['date_to'])
+
+        updated, missing = convert_expenses(expenses)
+        if missing:
+            self.stdout.write(self.style.WARNING(f'No stored rate for {len(missing)} expense(s): {missing[:20]}'))
+        self.stdout.write(self.style.SUCCESS(f'Successfully reconverted {updated} expense(s).'))
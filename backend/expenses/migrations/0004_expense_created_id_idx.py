@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:39
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0003_approvalflow_expense_approval_flow_history_and_more"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["-created_at", "-id"], name="expense_created_id_idx"),
+        ),
+    ]
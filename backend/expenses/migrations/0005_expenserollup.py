@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:42
+
+import decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+
+
+def backfill_rollups(apps, schema_editor):
+    # Same buckets as expenses.rollups.compute_rollups
+    Expense = apps.get_model("expenses", "Expense")
+    ExpenseRollup = apps.get_model("expenses", "ExpenseRollup")
+
+    rows = (
+        Expense.objects.filter(employee__company__isnull=False)
+        .annotate(month=TruncMonth("date"))
+        .values("employee__company_id", "month", "category", "status")
+        .annotate(count=Count("id"), total_amount=Sum("converted_amount"))
+        .order_by()
+    )
+    ExpenseRollup.objects.bulk_create(
+        [
+            ExpenseRollup(
+                company_id=row["employee__company_id"], month=row["month"], category=row["category"],
+                status=row["status"], count=row["count"],
+                # SQLite sums decimals as floats
+                total_amount=decimal.Decimal(row["total_amount"]).quantize(decimal.Decimal("0.01")),
+            )
+            for row in rows
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0004_expense_created_id_idx"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpenseRollup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField()),
+                ("category", models.CharField(max_length=100)),
+                ("status", models.CharField(choices=[("PENDING", "Pending"), ("APPROVED", "Approved"), ("REJECTED", "Rejected")], max_length=20)),
+                ("count", models.IntegerField(default=0)),
+                ("total_amount", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("company", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="expense_rollups", to="users.company")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("company", "month", "category", "status"), name="unique_expense_rollup_bucket")],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0005_expenserollup"),
+        ("users", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="approvalflow",
+            index=models.Index(fields=["company", "is_default"], name="flow_company_default_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="approvalstep",
+            index=models.Index(fields=["approver", "status"], name="step_approver_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="approvalstep",
+            index=models.Index(fields=["expense", "status", "step_number"], name="step_expense_status_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["employee", "status", "date"], name="expense_employee_status_idx"),
+        ),
+    ]
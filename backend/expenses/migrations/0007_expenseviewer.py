@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_viewers(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    ApprovalStep = apps.get_model("expenses", "ApprovalStep")
+    ExpenseViewer = apps.get_model("expenses", "ExpenseViewer")
+
+    viewers = {}
+    for expense_id, manager_id in Expense.objects.filter(employee__manager__isnull=False).values_list("id", "employee__manager_id"):
+        viewers[(expense_id, manager_id)] = [True, False]
+    for expense_id, approver_id in ApprovalStep.objects.filter(status="PENDING").values_list("expense_id", "approver_id"):
+        viewers.setdefault((expense_id, approver_id), [False, False])[1] = True
+
+    ExpenseViewer.objects.bulk_create(
+        [
+            ExpenseViewer(expense_id=expense_id, viewer_id=viewer_id, is_team_manager=team, is_pending_approver=pending)
+            for (expense_id, viewer_id), (team, pending) in viewers.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0006_hot_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExpenseViewer",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("is_team_manager", models.BooleanField(default=False)),
+                ("is_pending_approver", models.BooleanField(default=False)),
+                ("expense", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="viewers", to="expenses.expense")),
+                ("viewer", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="viewable_expenses", to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("viewer", "expense"), name="unique_expense_viewer")],
+            },
+        ),
+        migrations.RunPython(backfill_viewers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_current_steps(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    ApprovalStep = apps.get_model("expenses", "ApprovalStep")
+    PendingApprovalCount = apps.get_model("expenses", "PendingApprovalCount")
+
+    counts = {}
+    for expense in Expense.objects.filter(status="PENDING").only("id"):
+        step = ApprovalStep.objects.filter(expense_id=expense.id, status="PENDING").order_by("step_number", "id").first()
+        if step:
+            Expense.objects.filter(pk=expense.id).update(current_step=step, current_approver_id=step.approver_id)
+            counts[step.approver_id] = counts.get(step.approver_id, 0) + 1
+    PendingApprovalCount.objects.bulk_create(
+        [PendingApprovalCount(user_id=user_id, count=count) for user_id, count in counts.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0007_expenseviewer"),
+        ("users", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingApprovalCount",
+            fields=[
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name="pending_approval_count", serialize=False, to=settings.AUTH_USER_MODEL)),
+                ("count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="expense",
+            name="current_approver",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="current_approvals", to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name="expense",
+            name="current_step",
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name="+", to="expenses.approvalstep"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["current_approver", "-created_at", "-id"], name="expense_current_approver_idx"),
+        ),
+        migrations.RunPython(backfill_current_steps, migrations.RunPython.noop),
+    ]
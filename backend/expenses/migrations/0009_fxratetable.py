@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0008_current_approval_pointer"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FxRateTable",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("base_currency", models.CharField(max_length=10, unique=True)),
+                ("rates", models.JSONField(default=dict)),
+                ("fetched_at", models.DateTimeField()),
+            ],
+        ),
+    ]
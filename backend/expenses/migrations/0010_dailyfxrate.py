@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0009_fxratetable"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyFxRate",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("base_currency", models.CharField(max_length=10)),
+                ("quote_currency", models.CharField(max_length=10)),
+                ("rate", models.DecimalField(decimal_places=10, max_digits=20)),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("base_currency", "quote_currency", "date"), name="unique_daily_fx_rate")],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0010_dailyfxrate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="receipt_sha256",
+            field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+        ),
+    ]
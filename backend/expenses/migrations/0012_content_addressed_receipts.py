@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:10
+
+import expenses.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0011_expense_receipt_sha256"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="expense",
+            name="receipt_image",
+            field=models.ImageField(blank=True, null=True, storage=expenses.storage.receipt_storage, upload_to="receipts/"),
+        ),
+    ]
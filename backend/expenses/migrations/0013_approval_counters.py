@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    Expense = apps.get_model("expenses", "Expense")
+    ApprovalStep = apps.get_model("expenses", "ApprovalStep")
+
+    steps = ApprovalStep.objects.filter(expense=OuterRef("pk")).order_by().values("expense")
+    Expense.objects.update(
+        approver_count=Coalesce(Subquery(steps.annotate(n=Count("id")).values("n")), 0),
+        approval_count=Coalesce(Subquery(steps.annotate(n=Count("id", filter=Q(status="APPROVED"))).values("n")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0012_content_addressed_receipts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="approval_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="expense",
+            name="approver_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
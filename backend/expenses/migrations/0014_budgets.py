@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0013_approval_counters"),
+        ("users", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="expense",
+            name="over_budget",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name="Budget",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=255)),
+                ("category", models.CharField(blank=True, default="", max_length=100)),
+                ("monthly_amount", models.DecimalField(decimal_places=2, max_digits=16)),
+                ("blocking", models.BooleanField(default=False)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("company", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="budgets", to="users.company")),
+                ("manager", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="team_budgets", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BudgetUsage",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField()),
+                ("pending_amount", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("approved_amount", models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ("budget", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name="usage", to="expenses.budget")),
+            ],
+            options={
+                "constraints": [models.UniqueConstraint(fields=("budget", "month"), name="unique_budget_usage_month")],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# FTS5 table behind expenses.search.SqliteFtsBackend; rowid is the expense id
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE expenses_expense_fts USING fts5("
+    "description, category, employee, ocr_text, "
+    "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')"
+)
+
+POPULATE_INDEX = (
+    "INSERT INTO expenses_expense_fts (rowid, description, category, employee, ocr_text) "
+    "SELECT e.id, e.description, e.category, u.username || ' ' || u.first_name || ' ' || u.last_name, "
+    "COALESCE(o.raw_text, '') FROM expenses_expense e "
+    "JOIN users_user u ON u.id = e.employee_id "
+    "LEFT JOIN expenses_ocrrecord o ON o.expense_id = e.id"
+)
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(POPULATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE expenses_expense_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0014_budgets"),
+        ("users", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:38
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("expenses", "0015_expense_search_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["status", "-created_at", "-id"], name="expense_status_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["category", "-created_at", "-id"], name="expense_category_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["currency", "-created_at", "-id"], name="expense_currency_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["employee", "-created_at", "-id"], name="expense_employee_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["-date", "-id"], name="expense_date_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="expense",
+            index=models.Index(fields=["-converted_amount", "-id"], name="expense_amount_id_idx"),
+        ),
+    ]
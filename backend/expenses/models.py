@@ -1,5 +1,6 @@
 from django.db import models
 from users.models import User, Company
+from .storage import receipt_storage
 
 class Expense(models.Model):
     STATUS_CHOICES = [("PENDING","Pending"), ("APPROVED","Approved"), ("REJECTED","Rejected")]
@@ -11,10 +12,39 @@ class Expense(models.Model):
     category = models.CharField(max_length=100)
     description = models.TextField()
     date = models.DateField()
-    receipt_image = models.ImageField(upload_to="receipts/", null=True, blank=True)
+    # Stored under the SHA-256 of the file, with thumbnail and preview derivatives (see expenses.storage)
+    receipt_image = models.ImageField(upload_to="receipts/", storage=receipt_storage, null=True, blank=True)
+    # SHA-256 of the receipt bytes; links the expense to cached OCR results (see expenses.receipts)
+    receipt_sha256 = models.CharField(max_length=64, null=True, blank=True, db_index=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING")
     created_at = models.DateTimeField(auto_now_add=True)
     approval_flow_history = models.ForeignKey('ApprovalFlow', on_delete=models.SET_NULL, null=True, blank=True, related_name="expenses_history")
+    # Lowest-numbered pending step while the expense is PENDING, maintained by expenses.approvals
+    current_step = models.ForeignKey('ApprovalStep', on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    current_approver = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="current_approvals")
+    # Approval steps the expense was created with and how many have approved; ApprovalRules are
+    # evaluated against these (see expenses.rules)
+    approver_count = models.IntegerField(default=0)
+    approval_count = models.IntegerField(default=0)
+    # Submitted while it took one of its non-blocking budgets over the month's limit (see expenses.budgets)
+    over_budget = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            # Backs the (created_at, id) keyset used by ExpenseCursorPagination
+            models.Index(fields=['-created_at', '-id'], name='expense_created_id_idx'),
+            models.Index(fields=['employee', 'status', 'date'], name='expense_employee_status_idx'),
+            # Approval queue pages: WHERE current_approver = ? ORDER BY created_at, id
+            models.Index(fields=['current_approver', '-created_at', '-id'], name='expense_current_approver_idx'),
+            # Claims list filters (ExpenseViewSet.filter_expenses) on the default ordering
+            models.Index(fields=['status', '-created_at', '-id'], name='expense_status_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='expense_category_created_idx'),
+            models.Index(fields=['currency', '-created_at', '-id'], name='expense_currency_created_idx'),
+            models.Index(fields=['employee', '-created_at', '-id'], name='expense_employee_created_idx'),
+            # Date and amount ranges, and ?ordering= by date or amount (EXPENSE_ORDERINGS)
+            models.Index(fields=['-date', '-id'], name='expense_date_id_idx'),
+            models.Index(fields=['-converted_amount', '-id'], name='expense_amount_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.employee.username}"
@@ -32,6 +62,58 @@ class ApprovalStep(models.Model):
 
     class Meta:
         ordering = ['step_number']
+        indexes = [
+            # Approval queues: "what is pending for this approver"
+            models.Index(fields=['approver', 'status'], name='step_approver_status_idx'),
+            # "Next pending step" lookup in handle_approval_action
+            models.Index(fields=['expense', 'status', 'step_number'], name='step_expense_status_idx'),
+        ]
+
+class PendingApprovalCount(models.Model):
+    """
+    Number of expenses currently waiting on a user, for the approval queue badge.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name="pending_approval_count")
+    count = models.IntegerField(default=0)
+
+class FxRateTable(models.Model):
+    """
+    Last-known-good rate table per base currency, used when the FX provider is unreachable.
+    Rates are stored as decimal strings keyed by quote currency.
+    """
+    base_currency = models.CharField(max_length=10, unique=True)
+    rates = models.JSONField(default=dict)
+    fetched_at = models.DateTimeField()
+
+class DailyFxRate(models.Model):
+    """
+    Historical exchange rate for one currency pair on one day, loaded with `manage.py load_fx_rates`.
+    """
+    date = models.DateField()
+    base_currency = models.CharField(max_length=10)
+    quote_currency = models.CharField(max_length=10)
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base_currency', 'quote_currency', 'date'], name='unique_daily_fx_rate'),
+        ]
+
+class ExpenseViewer(models.Model):
+    """
+    Who besides the owner and company admins may see an expense: the employee's
+    manager and every approver with a pending step. Lets manager listings be one
+    indexed join instead of an OR across approval steps. Maintained by expenses.visibility.
+    """
+    expense = models.ForeignKey(Expense, on_delete=models.CASCADE, related_name="viewers")
+    viewer = models.ForeignKey(User, on_delete=models.CASCADE, related_name="viewable_expenses")
+    is_team_manager = models.BooleanField(default=False)
+    is_pending_approver = models.BooleanField(default=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['viewer', 'expense'], name='unique_expense_viewer'),
+        ]
 
 class ApprovalRule(models.Model):
     company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="approval_rules")
@@ -47,6 +129,54 @@ class OCRRecord(models.Model):
     extracted_date = models.DateField(null=True, blank=True)
     extracted_description = models.CharField(max_length=255, null=True, blank=True)
 
+class ExpenseRollup(models.Model):
+    """
+    Running count and converted_amount total per company, month, category and status.
+    Maintained incrementally by expenses.rollups; rebuild with `manage.py rebuild_rollups`.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="expense_rollups")
+    month = models.DateField()
+    category = models.CharField(max_length=100)
+    status = models.CharField(max_length=20, choices=Expense.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'month', 'category', 'status'], name='unique_expense_rollup_bucket'),
+        ]
+
+class Budget(models.Model):
+    """
+    A monthly limit on the converted_amount of a company's pending and approved expenses,
+    narrowed to one category and/or one manager's team when those are set.
+    """
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name="budgets")
+    name = models.CharField(max_length=255)
+    # Blank covers every category
+    category = models.CharField(max_length=100, blank=True, default="")
+    # Expenses of employees reporting to this manager; null covers the whole company
+    manager = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="team_budgets")
+    monthly_amount = models.DecimalField(max_digits=16, decimal_places=2)
+    # Refuse claims that would go over the limit instead of flagging them
+    blocking = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class BudgetUsage(models.Model):
+    """
+    Converted amount of a budget's pending and approved expenses in one month.
+    Maintained incrementally by expenses.budgets; rebuild with `manage.py rebuild_budget_usage`.
+    """
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name="usage")
+    month = models.DateField()
+    pending_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    approved_amount = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'month'], name='unique_budget_usage_month'),
+        ]
+
 # --- Add the following new models ---
 
 class ApprovalFlow(models.Model):
@@ -55,6 +185,11 @@ class ApprovalFlow(models.Model):
     is_default = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['company', 'is_default'], name='flow_company_default_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
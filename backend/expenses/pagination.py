@@ -0,0 +1,108 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+import decimal
+import json
+
+# ?ordering= values accepted by the claims list and the ORDER BY each stands for. The id breaks
+# ties and runs in the same direction, as ExpenseCursorPagination's keyset requires; amount sorts
+# by converted_amount, which is comparable across currencies. Each has an index on Expense.
+EXPENSE_ORDERINGS = {
+    '-created_at': ('-created_at', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-date': ('-date', '-id'),
+    'date': ('date', 'id'),
+    '-amount': ('-converted_amount', '-id'),
+    'amount': ('converted_amount', 'id'),
+}
+
+
+class ExpenseCursorPagination(CursorPagination):
+    """
+    Keyset pagination over (ordering field, id), newest first unless the view picks another of
+    EXPENSE_ORDERINGS. The cursor carries both values of the row it stopped at, so each page is
+    an index range scan from there however many rows share the same date or amount, and pages
+    stay stable while new claims are submitted.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        # The claims list picks one of EXPENSE_ORDERINGS from ?ordering= (see ExpenseViewSet.list)
+        return getattr(view, 'ordering', None) or self.ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+
+        # A previous-page cursor walks back from the first row of the page it was taken from
+        reverse = bool(self.cursor and self.cursor.reverse)
+        ordering = [flip(field) for field in self.ordering] if reverse else list(self.ordering)
+        queryset = queryset.order_by(*ordering)
+        if self.cursor:
+            queryset = queryset.filter(self.after(queryset.model, ordering, self.cursor.position))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def after(self, model, ordering, position):
+        """
+        Rows past `position` in `ordering`: (field, id) beyond (value, pk), as
+        field <= value AND (field < value OR id < pk) for descending order, so the database can
+        still seek on the field's index.
+        """
+        field = ordering[0].lstrip('-')
+        # Cursors come back from the client, so a tampered one is a 404 like any invalid cursor
+        try:
+            value, pk = json.loads(position)
+            value = model._meta.get_field(field).to_python(value)
+            pk = int(pk)
+        except (TypeError, ValueError, ValidationError, decimal.InvalidOperation):
+            raise NotFound(self.invalid_cursor_message)
+        if value is None:
+            raise NotFound(self.invalid_cursor_message)
+        op = 'lt' if ordering[0].startswith('-') else 'gt'
+        return Q(**{f'{field}__{op}e': value}) & (Q(**{f'{field}__{op}': value}) | Q(**{f'pk__{op}': pk}))
+
+    def position(self, expense):
+        value = getattr(expense, self.ordering[0].lstrip('-'))
+        return json.dumps([value.isoformat() if hasattr(value, 'isoformat') else str(value), expense.pk])
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=self.position(self.page[-1])))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=self.position(self.page[0])))
+
+
+def flip(field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+
+class ExpenseSearchPagination(PageNumberPagination):
+    """
+    Numbered pages of search results, which are ordered by relevance rather than by
+    (created_at, id) and so can't be keyset paginated.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
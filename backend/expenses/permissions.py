@@ -21,3 +21,10 @@ class IsManagerOrAdmin(permissions.BasePermission):
     """
     def has_permission(self, request, view):
         return request.user and (request.user.role == 'MANAGER' or request.user.role == 'ADMIN')
+
+class IsAdmin(permissions.BasePermission):
+    """
+    Allows access only to Admins.
+    """
+    def has_permission(self, request, view):
+        return request.user and request.user.role == 'ADMIN'
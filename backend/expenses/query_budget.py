@@ -0,0 +1,20 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@contextmanager
+def query_budget(limit, label='Block'):
+    """
+    Fails with QueryBudgetExceeded if the wrapped block runs more than `limit` SQL queries.
+    Usable from tests and from the check_query_budgets command.
+    """
+    with CaptureQueriesContext(connection) as captured:
+        yield captured
+    if len(captured) > limit:
+        statements = '\n'.join(query['sql'] for query in captured.captured_queries)
+        raise QueryBudgetExceeded(f"{label} ran {len(captured)} queries, budget is {limit}:\n{statements}")
@@ -0,0 +1,82 @@
+"""
+Attaches OCR results to expenses as OCRRecord rows. Expenses remember the SHA-256 of
+their receipt, so a receipt scanned before the claim was submitted is picked up from
+ocr.cache, and one whose scan is still running is filled in when the job finishes.
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from ocr import cache as ocr_cache
+from .models import Expense, OCRRecord
+from . import search
+
+MAX_AMOUNT = Decimal('9999999999.99')
+
+
+def receipt_digest(validated_data):
+    receipt = validated_data.get('receipt_image')
+    if not receipt:
+        return None
+    # Remembered on the file so ReceiptStorage can name it without hashing it again
+    receipt.sha256 = ocr_cache.file_digest(receipt)
+    return receipt.sha256
+
+
+def store_receipt(validated_data):
+    """
+    Writes an uploaded receipt and its derivatives to storage, ahead of the transaction that
+    saves its expense, and returns the stored name for the expense to record. Content-addressed
+    files left behind by a rolled-back save are reused by the next upload of the same receipt.
+    """
+    receipt = validated_data.get('receipt_image')
+    if not receipt:
+        return None
+    field = Expense._meta.get_field('receipt_image')
+    return field.storage.save(field.generate_filename(None, receipt.name), receipt, max_length=field.max_length)
+
+
+def record_fields(result):
+    parsed = result['parsed_data'] or {}
+    try:
+        amount = Decimal(parsed.get('amount') or '').quantize(Decimal('0.01'))
+    except InvalidOperation:
+        amount = None
+    if amount is not None and abs(amount) > MAX_AMOUNT:
+        amount = None
+    try:
+        extracted_date = date.fromisoformat(parsed.get('date') or '')
+    except ValueError:
+        extracted_date = None
+    return {
+        'raw_text': result['raw_text'],
+        'extracted_amount': amount,
+        'extracted_date': extracted_date,
+        'extracted_description': (parsed.get('description') or '')[:255] or None,
+    }
+
+
+def attach_cached_ocr(expense):
+    """
+    Attaches the cached OCR result for the expense's receipt, if it has been scanned.
+    """
+    OCRRecord.objects.filter(expense=expense).delete()
+    if not expense.receipt_sha256:
+        return None
+    result = ocr_cache.lookup(expense.receipt_sha256)
+    if result is None:
+        return None
+    return OCRRecord.objects.create(expense=expense, **record_fields(result))
+
+
+@transaction.atomic
+def attach_to_waiting_expenses(digest, result):
+    """
+    Called when a scan finishes: fills in expenses submitted with this receipt while it was running.
+    """
+    fields = record_fields(result)
+    waiting = list(Expense.objects.filter(receipt_sha256=digest, ocr_data__isnull=True).values_list('pk', flat=True))
+    OCRRecord.objects.bulk_create(
+        [OCRRecord(expense_id=pk, **fields) for pk in waiting], ignore_conflicts=True
+    )
+    # Their receipt text is searchable from now on
+    search.index(waiting)
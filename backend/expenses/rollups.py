@@ -0,0 +1,119 @@
+from django.db import transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from .models import Expense, ExpenseRollup
+import decimal
+
+CENTS = decimal.Decimal('0.01')
+
+
+def snapshot(expense):
+    """
+    Captures the rollup bucket and amount an expense currently counts towards.
+    Take one before mutating an expense and hand it to record_changed afterwards.
+    """
+    company_id = expense.employee.company_id
+    if company_id is None:
+        return None
+    bucket = {
+        'company_id': company_id,
+        'month': expense.date.replace(day=1),
+        'category': expense.category,
+        'status': expense.status,
+    }
+    return bucket, expense.converted_amount
+
+
+def adjust(bucket, count, amount):
+    rollup, created = ExpenseRollup.objects.get_or_create(
+        **bucket, defaults={'count': count, 'total_amount': amount}
+    )
+    if not created:
+        ExpenseRollup.objects.filter(pk=rollup.pk).update(
+            count=F('count') + count, total_amount=F('total_amount') + amount
+        )
+
+
+def adjust_many(deltas):
+    """
+    Applies {(company_id, month, category, status): (count, amount)} in a fixed number of queries.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta != (0, 0)}
+    if not deltas:
+        return
+    ExpenseRollup.objects.bulk_create(
+        [
+            ExpenseRollup(company_id=company_id, month=month, category=category, status=status, count=0, total_amount=0)
+            for company_id, month, category, status in deltas
+        ],
+        ignore_conflicts=True,
+    )
+    buckets = Q()
+    for company_id, month, category, status in deltas:
+        buckets |= Q(company_id=company_id, month=month, category=category, status=status)
+    by_pk = {
+        pk: deltas[tuple(key)]
+        for pk, *key in ExpenseRollup.objects.filter(buckets).values_list('pk', 'company_id', 'month', 'category', 'status')
+    }
+    ExpenseRollup.objects.filter(pk__in=by_pk).update(
+        count=F('count') + Case(*[When(pk=pk, then=Value(count)) for pk, (count, _) in by_pk.items()]),
+        total_amount=F('total_amount') + Case(
+            *[When(pk=pk, then=Value(amount)) for pk, (_, amount) in by_pk.items()],
+            output_field=DecimalField(max_digits=16, decimal_places=2),
+        ),
+    )
+
+
+def record_created(expense):
+    current = snapshot(expense)
+    if current:
+        adjust(current[0], 1, current[1])
+
+
+def record_deleted(expense):
+    current = snapshot(expense)
+    if current:
+        adjust(current[0], -1, -current[1])
+
+
+def record_changed(before, expense):
+    after = snapshot(expense)
+    if before == after:
+        return
+    if before:
+        adjust(before[0], -1, -before[1])
+    if after:
+        adjust(after[0], 1, after[1])
+
+
+def compute_rollups():
+    """
+    Recomputes every bucket from the Expense table, keyed like ExpenseRollup rows.
+    """
+    rows = (
+        Expense.objects.filter(employee__company__isnull=False)
+        .annotate(month=TruncMonth('date'))
+        .values('employee__company_id', 'month', 'category', 'status')
+        .annotate(count=Count('id'), total_amount=Sum('converted_amount'))
+        .order_by()
+    )
+    # SQLite sums decimals as floats, which drift in the last digits over large buckets
+    return {
+        (row['employee__company_id'], row['month'], row['category'], row['status']):
+            (row['count'], row['total_amount'].quantize(CENTS))
+        for row in rows
+    }
+
+
+def stored_rollups():
+    rows = ExpenseRollup.objects.exclude(count=0).values_list('company_id', 'month', 'category', 'status', 'count', 'total_amount')
+    return {tuple(row[:4]): (row[4], row[5]) for row in rows}
+
+
+@transaction.atomic
+def rebuild_rollups():
+    ExpenseRollup.objects.all().delete()
+    ExpenseRollup.objects.bulk_create([
+        ExpenseRollup(company_id=company_id, month=month, category=category, status=status, count=count, total_amount=total)
+        for (company_id, month, category, status), (count, total) in compute_rollups().items()
+    ])
@@ -0,0 +1,31 @@
+"""
+Evaluates a company's ApprovalRules when an approver approves, against counters kept on the
+expense (approver_count, approval_count) instead of its ApprovalStep rows, so the check costs
+the same however many approvers a flow has. A met rule approves the expense outright.
+
+- percentage_required: that share of the expense's approvers has approved
+- specific_approver: that user has just approved
+- hybrid: either of the two; rules that aren't hybrid use percentage_required when it is
+  set, else specific_approver
+
+Rules are compiled along with the company's flow, see expenses.flows.
+"""
+
+
+def rule_met(rule, approval_count, approver_count, approver_id):
+    percentage_required, specific_approver_id, hybrid = rule
+    by_percentage = (
+        percentage_required is not None and approver_count > 0
+        and approval_count * 100 >= percentage_required * approver_count
+    )
+    by_approver = specific_approver_id is not None and approver_id == specific_approver_id
+    if hybrid:
+        return by_percentage or by_approver
+    return by_percentage if percentage_required is not None else by_approver
+
+
+def any_rule_met(rules, approval_count, approver_count, approver_id):
+    """
+    True when `approver_id`'s approval, already counted in `approval_count`, meets one of `rules`.
+    """
+    return any(rule_met(rule, approval_count, approver_count, approver_id) for rule in rules)
@@ -0,0 +1,132 @@
+from django.utils import timezone
+from users.models import Company, User
+from .models import Expense, ApprovalStep, ApprovalFlow, ApprovalFlowStep, ExpenseViewer, PendingApprovalCount
+import datetime
+import decimal
+
+CATEGORIES = ['Travel', 'Food & Dining', 'Software', 'Office Supplies', 'Lodging']
+STATUSES = ['PENDING', 'APPROVED', 'REJECTED']
+
+
+def seed_company(prefix, employee_count, expense_count, flow_count=1, currency='USD'):
+    """
+    Bulk-inserts a company with an admin, one approving manager, employees, expenses
+    spread over the last year and a Manager -> Admin approval chain for each expense.
+    Used by the performance check commands; never call this against real data.
+    """
+    company = Company.objects.create(name=f'{prefix} Inc.', country='United States', currency=currency)
+    admin = User.objects.create(username=f'{prefix}_admin', role='ADMIN', company=company)
+    manager = User.objects.create(
+        username=f'{prefix}_manager', role='MANAGER', company=company, is_manager_approver=True
+    )
+    employees = User.objects.bulk_create([
+        User(username=f'{prefix}_employee{i}', role='EMPLOYEE', company=company, manager=manager)
+        for i in range(employee_count)
+    ])
+
+    today = timezone.now().date()
+    expenses = Expense.objects.bulk_create([
+        Expense(
+            employee=employees[i % employee_count],
+            amount=decimal.Decimal(10 + i % 490),
+            currency=currency,
+            converted_amount=decimal.Decimal(10 + i % 490),
+            category=CATEGORIES[i % len(CATEGORIES)],
+            description=f'{prefix} expense {i}',
+            date=today - datetime.timedelta(days=i % 365),
+            status=STATUSES[i % len(STATUSES)],
+            # Approved claims went through both steps
+            approver_count=2,
+            approval_count=2 if STATUSES[i % len(STATUSES)] == 'APPROVED' else 0,
+        )
+        for i in range(expense_count)
+    ], batch_size=1000)
+
+    steps = []
+    for expense in expenses:
+        # Approved claims went through both steps; pending and rejected ones stopped at the manager
+        manager_status = 'PENDING' if expense.status == 'PENDING' else expense.status
+        admin_status = 'APPROVED' if expense.status == 'APPROVED' else 'PENDING'
+        steps.append(ApprovalStep(expense=expense, approver=manager, step_number=1, status=manager_status))
+        if expense.status != 'REJECTED':
+            steps.append(ApprovalStep(expense=expense, approver=admin, step_number=2, status=admin_status))
+    ApprovalStep.objects.bulk_create(steps, batch_size=1000)
+
+    # Pending expenses are all waiting on their manager step
+    pending = [expense for expense in expenses if expense.status == 'PENDING']
+    first_steps = {step.expense_id: step for step in steps if step.step_number == 1}
+    for expense in pending:
+        expense.current_step = first_steps[expense.id]
+        expense.current_approver = manager
+    Expense.objects.bulk_update(pending, ['current_step', 'current_approver'], batch_size=1000)
+    PendingApprovalCount.objects.create(user=manager, count=len(pending))
+
+    # The manager sees every expense of their team; the admin only those waiting on them
+    ExpenseViewer.objects.bulk_create(
+        [
+            ExpenseViewer(expense_id=step.expense_id, viewer_id=step.approver_id,
+                          is_team_manager=(step.approver_id == manager.id), is_pending_approver=(step.status == 'PENDING'))
+            for step in steps
+            if step.approver_id == manager.id or step.status == 'PENDING'
+        ],
+        batch_size=1000,
+    )
+
+    flows = ApprovalFlow.objects.bulk_create([
+        ApprovalFlow(company=company, name=f'{prefix} flow {i}', is_default=(i == 0)) for i in range(flow_count)
+    ])
+    ApprovalFlowStep.objects.bulk_create(
+        [ApprovalFlowStep(approval_flow=flow, step_number=1, approver_role='MANAGER') for flow in flows]
+        + [ApprovalFlowStep(approval_flow=flow, step_number=2, approver_role='ADMIN') for flow in flows]
+    )
+
+    return {
+        'company': company,
+        'admin': admin,
+        'manager': manager,
+        'employee': employees[0],
+        # Both start out pending at the manager step
+        'expense_id': expenses[0].id,
+        'other_expense_id': expenses[3].id,
+    }
+
+
+def seed_approval_chain(prefix, approver_count, expense_count):
+    """
+    Bulk-inserts a company whose pending expenses each wait on a chain of `approver_count`
+    managers, step 1 first. Used by bench_approval_rules; never call this against real data.
+    """
+    company = Company.objects.create(name=f'{prefix} Inc.', country='United States', currency='USD')
+    employee = User.objects.create(username=f'{prefix}_employee', role='EMPLOYEE', company=company)
+    approvers = User.objects.bulk_create([
+        User(username=f'{prefix}_approver{i}', role='MANAGER', company=company, is_manager_approver=True)
+        for i in range(approver_count)
+    ])
+
+    today = timezone.now().date()
+    expenses = Expense.objects.bulk_create([
+        Expense(
+            employee=employee, amount=decimal.Decimal('100'), currency='USD', converted_amount=decimal.Decimal('100'),
+            category=CATEGORIES[i % len(CATEGORIES)], description=f'{prefix} expense {i}', date=today,
+            approver_count=approver_count,
+        )
+        for i in range(expense_count)
+    ])
+    steps = ApprovalStep.objects.bulk_create(
+        [
+            ApprovalStep(expense=expense, approver=approver, step_number=number)
+            for expense in expenses
+            for number, approver in enumerate(approvers, start=1)
+        ],
+        batch_size=1000,
+    )
+    for expense, first_step in zip(expenses, steps[::approver_count]):
+        expense.current_step = first_step
+        expense.current_approver = approvers[0]
+    Expense.objects.bulk_update(expenses, ['current_step', 'current_approver'], batch_size=1000)
+    PendingApprovalCount.objects.create(user=approvers[0], count=len(expenses))
+    ExpenseViewer.objects.bulk_create(
+        [ExpenseViewer(expense_id=step.expense_id, viewer_id=step.approver_id, is_pending_approver=True) for step in steps],
+        batch_size=1000,
+    )
+    return {'company': company, 'approvers': approvers, 'expenses': expenses}
@@ -0,0 +1,240 @@
+"""
+Full-text search over expenses (claims/search/): their description, category, employee's
+username and name, and OCR text. The backend named in EXPENSE_SEARCH['BACKEND'] keeps its
+index in step through index()/remove(), which are called inside the writing transaction
+wherever that text changes, and answers search() with the matching expenses, best first.
+
+SqliteFtsBackend keeps an FTS5 table (created by migration 0015 on SQLite) keyed by expense id
+and ranks with BM25. BasicSearchBackend runs unindexed icontains filters and is only meant for
+databases without a native backend yet.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from users.models import User
+from .models import Expense, OCRRecord
+import re
+import threading
+
+# Keeps the number of IN placeholders per statement well under SQLite's limit
+BATCH_SIZE = 500
+
+
+def terms(query):
+    """
+    The words of a search, lower-cased, at most EXPENSE_SEARCH['MAX_TERMS'] of them.
+    """
+    return re.findall(r'\w+', query.lower())[:settings.EXPENSE_SEARCH['MAX_TERMS']]
+
+
+def batches(ids):
+    ids = list(ids)
+    for start in range(0, len(ids), BATCH_SIZE):
+        yield ids[start:start + BATCH_SIZE]
+
+
+class SearchBackend:
+    def index(self, expense_ids):
+        """
+        (Re)indexes the current text of these expenses.
+        """
+        raise NotImplementedError
+
+    def index_employees(self, user_ids):
+        """
+        Reindexes every expense of these employees, after their names changed.
+        """
+        raise NotImplementedError
+
+    def remove(self, expense_ids):
+        raise NotImplementedError
+
+    def search(self, expenses, query):
+        """
+        The expenses of the `expenses` queryset matching every word of `query`, best match first,
+        as something Django's Paginator can count and slice: a queryset or RankedExpenses.
+        """
+        raise NotImplementedError
+
+    def rebuild(self):
+        raise NotImplementedError
+
+    def drift(self):
+        """
+        How many index entries are missing, stale or left over from deleted expenses.
+        """
+        raise NotImplementedError
+
+
+class BasicSearchBackend(SearchBackend):
+    def index(self, expense_ids):
+        pass
+
+    def index_employees(self, user_ids):
+        pass
+
+    def remove(self, expense_ids):
+        pass
+
+    def search(self, expenses, query):
+        words = terms(query)
+        if not words:
+            return expenses.none()
+        for word in words:
+            expenses = expenses.filter(
+                Q(description__icontains=word) | Q(category__icontains=word)
+                | Q(employee__username__icontains=word) | Q(employee__first_name__icontains=word)
+                | Q(employee__last_name__icontains=word) | Q(ocr_data__raw_text__icontains=word)
+            )
+        return expenses.order_by('-created_at', '-id')
+
+    def rebuild(self):
+        pass
+
+    def drift(self):
+        return 0
+
+
+class SqliteFtsBackend(SearchBackend):
+    TABLE = 'expenses_expense_fts'
+    COLUMNS = 'description, category, employee, ocr_text'
+    # BM25 weight of each column: a hit in the description counts most, one in OCR text least
+    WEIGHTS = '4.0, 2.0, 2.0, 1.0'
+
+    def documents(self):
+        # The indexed text of each expense, in the order of COLUMNS
+        return (
+            f"SELECT e.id, e.description, e.category, u.username || ' ' || u.first_name || ' ' || u.last_name, "
+            f"COALESCE(o.raw_text, '') FROM {Expense._meta.db_table} e "
+            f"JOIN {User._meta.db_table} u ON u.id = e.employee_id "
+            f"LEFT JOIN {OCRRecord._meta.db_table} o ON o.expense_id = e.id"
+        )
+
+    def index(self, expense_ids):
+        with connection.cursor() as cursor:
+            for batch in batches(expense_ids):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(f'DELETE FROM {self.TABLE} WHERE rowid IN ({placeholders})', batch)
+                cursor.execute(
+                    f'INSERT INTO {self.TABLE} (rowid, {self.COLUMNS}) {self.documents()} WHERE e.id IN ({placeholders})',
+                    batch,
+                )
+
+    def index_employees(self, user_ids):
+        with connection.cursor() as cursor:
+            for batch in batches(user_ids):
+                placeholders = ', '.join(['%s'] * len(batch))
+                cursor.execute(
+                    f'DELETE FROM {self.TABLE} WHERE rowid IN '
+                    f'(SELECT id FROM {Expense._meta.db_table} WHERE employee_id IN ({placeholders}))',
+                    batch,
+                )
+                cursor.execute(
+                    f'INSERT INTO {self.TABLE} (rowid, {self.COLUMNS}) {self.documents()} '
+                    f'WHERE e.employee_id IN ({placeholders})',
+                    batch,
+                )
+
+    def remove(self, expense_ids):
+        with connection.cursor() as cursor:
+            for batch in batches(expense_ids):
+                cursor.execute(f'DELETE FROM {self.TABLE} WHERE rowid IN ({", ".join(["%s"] * len(batch))})', batch)
+
+    def search(self, expenses, query):
+        words = terms(query)
+        if not words:
+            return expenses.none()
+        # Every word, each also matching as a prefix ("hot" finds "hotel"); quoting keeps FTS5
+        # syntax in the input from being interpreted
+        match = ' '.join(f'"{word}"*' for word in words)
+        # The index drives the query and each match is checked against `expenses` by primary
+        # key. bm25() has to be read off that same scan: in a subquery per expense it would
+        # recount the whole index every time.
+        visible_sql, visible_params = (
+            expenses.filter(pk=RawSQL(f'{self.TABLE}.rowid', [])).order_by().values('pk').query.sql_with_params()
+        )
+        matches = f'FROM {self.TABLE} WHERE {self.TABLE} MATCH %s AND EXISTS ({visible_sql})'
+        return RankedExpenses(
+            expenses,
+            # BM25 scores are negative, lower is better
+            f'SELECT rowid {matches} ORDER BY bm25({self.TABLE}, {self.WEIGHTS}), rowid DESC LIMIT %s OFFSET %s',
+            f'SELECT COUNT(*) {matches}',
+            [match, *visible_params],
+        )
+
+    @transaction.atomic
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.TABLE}')
+            cursor.execute(f'INSERT INTO {self.TABLE} (rowid, {self.COLUMNS}) {self.documents()}')
+
+    def drift(self):
+        indexed = f'SELECT rowid, {self.COLUMNS} FROM {self.TABLE}'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT (SELECT COUNT(*) FROM ({indexed} EXCEPT {self.documents()})) '
+                f'+ (SELECT COUNT(*) FROM ({self.documents()} EXCEPT {indexed}))'
+            )
+            return cursor.fetchone()[0]
+
+
+class RankedExpenses:
+    """
+    Search results ranked in SQL, which Django's Paginator counts and slices like a queryset.
+    Slicing runs `page_sql` for the ids on that page only and loads just those expenses,
+    through `expenses` so its select_related()/prefetch_related() apply.
+    """
+    ordered = True
+
+    def __init__(self, expenses, page_sql, count_sql, params):
+        self.expenses = expenses
+        self.page_sql = page_sql
+        self.count_sql = count_sql
+        self.params = params
+
+    def count(self):
+        with connection.cursor() as cursor:
+            cursor.execute(self.count_sql, self.params)
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, page):
+        if not isinstance(page, slice) or page.step or page.start is None or page.stop is None:
+            raise TypeError('Search results can only be sliced as [start:stop].')
+        with connection.cursor() as cursor:
+            cursor.execute(self.page_sql, [*self.params, page.stop - page.start, page.start])
+            ids = [row[0] for row in cursor.fetchall()]
+        by_id = self.expenses.in_bulk(ids)
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(settings.EXPENSE_SEARCH['BACKEND'])()
+        return _backend
+
+
+def index(expense_ids):
+    get_backend().index(expense_ids)
+
+
+def index_employees(user_ids):
+    get_backend().index_employees(user_ids)
+
+
+def remove(expense_ids):
+    get_backend().remove(expense_ids)
+
+
+def search(expenses, query):
+    return get_backend().search(expenses, query)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Expense, ApprovalStep, ApprovalFlow, ApprovalFlowStep
+from .models import Expense, ApprovalStep, ApprovalFlow, ApprovalFlowStep, Budget, OCRRecord
+from .pagination import EXPENSE_ORDERINGS
+from .storage import derivative_name
 from users.serializers import UserSerializer
 
 class ApprovalStepSerializer(serializers.ModelSerializer):
@@ -10,22 +12,87 @@ class ApprovalStepSerializer(serializers.ModelSerializer):
         model = ApprovalStep
         fields = ['id', 'approver', 'step_number', 'status', 'comments', 'acted_at']
 
+class OCRRecordSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OCRRecord
+        fields = ['raw_text', 'extracted_amount', 'extracted_date', 'extracted_description']
+
 class ExpenseSerializer(serializers.ModelSerializer):
     employee = UserSerializer(read_only=True)
     approval_steps = ApprovalStepSerializer(many=True, read_only=True)
+    ocr_data = OCRRecordSerializer(read_only=True, default=None)
+    # Small JPEGs for lists and previews, so clients only fetch receipt_image when they need the original
+    receipt_thumbnail = serializers.SerializerMethodField()
+    receipt_preview = serializers.SerializerMethodField()
 
     class Meta:
         model = Expense
         fields = [
             'id', 'employee', 'amount', 'currency', 'converted_amount', 'category',
-            'description', 'date', 'receipt_image', 'status', 'created_at', 'approval_steps'
+            'description', 'date', 'receipt_image', 'receipt_thumbnail', 'receipt_preview', 'status',
+            'created_at', 'approval_steps', 'ocr_data', 'over_budget'
         ]
-        read_only_fields = ['status', 'employee', 'converted_amount']
+        read_only_fields = ['status', 'employee', 'converted_amount', 'over_budget']
+
+    def get_receipt_thumbnail(self, expense):
+        return self.derivative_url(expense, 'thumbnail')
+
+    def get_receipt_preview(self, expense):
+        return self.derivative_url(expense, 'preview')
+
+    def derivative_url(self, expense, kind):
+        if not expense.receipt_image:
+            return None
+        # Receipts stored before content addressing have no derivatives; fall back to the original
+        name = derivative_name(expense.receipt_image.name, kind)
+        url = expense.receipt_image.storage.url(name) if name else expense.receipt_image.url
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+class ExpenseImportRowSerializer(serializers.ModelSerializer):
+    # Username or id of a user of the importing company; blank means the importing user
+    employee = serializers.CharField(required=False, allow_blank=True)
+
+    class Meta:
+        model = Expense
+        fields = ['employee', 'amount', 'currency', 'category', 'description', 'date']
 
 class ApprovalActionSerializer(serializers.Serializer):
     action = serializers.ChoiceField(choices=["approve", "reject"])
     comments = serializers.CharField(required=False, allow_blank=True)
 
+class BulkApprovalActionSerializer(ApprovalActionSerializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
+class ExpenseFilterQuerySerializer(serializers.Serializer):
+    # Filters shared by the claims list, stats and export (see ExpenseViewSet.filter_expenses).
+    # Amounts are in the company currency, i.e. compared against converted_amount.
+    status = serializers.ChoiceField(choices=Expense.STATUS_CHOICES, required=False)
+    category = serializers.CharField(max_length=100, required=False)
+    currency = serializers.CharField(max_length=10, required=False)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    amount_min = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    amount_max = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    employee = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'date_from' in data and 'date_to' in data and data['date_from'] > data['date_to']:
+            raise serializers.ValidationError({'date_to': 'Must not be before date_from.'})
+        if 'amount_min' in data and 'amount_max' in data and data['amount_min'] > data['amount_max']:
+            raise serializers.ValidationError({'amount_max': 'Must not be below amount_min.'})
+        return data
+
+class ExpenseListQuerySerializer(ExpenseFilterQuerySerializer):
+    ordering = serializers.ChoiceField(choices=list(EXPENSE_ORDERINGS), default='-created_at')
+
+class ExpenseExportQuerySerializer(ExpenseFilterQuerySerializer):
+    # Not `format`, which DRF reserves for picking a renderer
+    file_format = serializers.ChoiceField(choices=['csv', 'xlsx'], default='csv')
+
+class ExpenseSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=200)
+
 # --- Add the following new serializers ---
 
 
@@ -56,3 +123,19 @@ class ApprovalFlowSerializer(serializers.ModelSerializer):
         for step_data in steps_data:
             ApprovalFlowStep.objects.create(approval_flow=approval_flow, **step_data)
         return approval_flow
+
+class BudgetSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Budget
+        fields = ['id', 'name', 'category', 'manager', 'monthly_amount', 'blocking', 'company', 'created_at']
+        read_only_fields = ['company']
+        extra_kwargs = {'monthly_amount': {'min_value': 0}}
+
+    def validate_manager(self, manager):
+        request = self.context.get("request")
+        if manager and manager.company_id != request.user.company_id:
+            raise serializers.ValidationError('The manager must belong to your company.')
+        return manager
+
+class BudgetReportQuerySerializer(serializers.Serializer):
+    month = serializers.DateField(input_formats=['%Y-%m'], required=False)
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from users.models import User
+from .models import ApprovalFlow, ApprovalFlowStep, ApprovalRule
+from . import flows
+
+
+def invalidate_flows(**kwargs):
+    # Now for this transaction, and again once it commits so no request caches what it saw before
+    flows.invalidate(**kwargs)
+    transaction.on_commit(lambda: flows.invalidate(**kwargs))
+
+
+@receiver([post_save, post_delete], sender=ApprovalFlow)
+def approval_flow_changed(sender, instance, **kwargs):
+    invalidate_flows(company_id=instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=ApprovalRule)
+def approval_rule_changed(sender, instance, **kwargs):
+    invalidate_flows(company_id=instance.company_id)
+
+
+@receiver([post_save, post_delete], sender=ApprovalFlowStep)
+def approval_flow_step_changed(sender, instance, **kwargs):
+    # The step's flow may already be gone when it is deleted along with it
+    invalidate_flows()
+
+
+@receiver([post_save, post_delete], sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Also catches users who moved company or stopped being an admin or approver
+    invalidate_flows(company_id=instance.company_id, user_id=instance.pk)
@@ -0,0 +1,92 @@
+"""
+Content-addressed storage for receipt images. A receipt is stored once under the SHA-256 of
+its bytes (receipts/ab/abcd....jpg), so re-uploading the same file reuses the stored copy.
+Next to the original we write JPEG derivatives, generated once when the file is first
+stored, so list views can show a small preview instead of the full-size photo.
+"""
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from ocr.documents import TooManyPixels, check_pixels
+from PIL import Image, ImageOps
+import hashlib
+import io
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+CONTENT_ADDRESSED = re.compile(r'^receipts/[0-9a-f]{2}/[0-9a-f]{64}\.[A-Za-z0-9]+$')
+
+
+def content_digest(content):
+    # Reuse the digest when the caller already hashed the upload (see expenses.receipts)
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def derivative_name(name, kind):
+    """
+    Storage name of a derivative ('thumbnail' or 'preview') of a stored receipt, or None
+    for receipts stored before content addressing, which have none.
+    """
+    if not name or not CONTENT_ADDRESSED.match(name):
+        return None
+    return f'{os.path.splitext(name)[0]}.{kind}.jpg'
+
+
+class ReceiptStorage(FileSystemStorage):
+    def __init__(self, **kwargs):
+        # Identical names mean identical content, so there is never a reason to pick another name
+        super().__init__(allow_overwrite=True, **kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        digest = content_digest(content)
+        extension = os.path.splitext(name)[1].lower() or '.bin'
+        name = f'receipts/{digest[:2]}/{digest}{extension}'
+        if not self.exists(name):
+            name = super().save(name, content, max_length)
+        self.write_derivatives(name, content)
+        return name
+
+    def write_derivatives(self, name, content):
+        sizes = settings.RECEIPT_STORAGE['DERIVATIVES']
+        missing = {kind: size for kind, size in sizes.items() if not self.exists(derivative_name(name, kind))}
+        if not missing:
+            return
+        try:
+            content.seek(0)
+            image = Image.open(content)
+            # Same decompression-bomb limit as OCR uploads, checked from the header before decoding
+            check_pixels(*image.size, settings.OCR_UPLOADS['MAX_PIXELS'])
+            # JPEGs can decode at a fraction of full size when that is still larger than we need
+            largest = max(missing.values())
+            image.draft('RGB', (largest, largest))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+            # Largest first, each derivative shrunk from the previous one
+            for kind, size in sorted(missing.items(), key=lambda item: -item[1]):
+                image.thumbnail((size, size), Image.Resampling.LANCZOS)
+                buffer = io.BytesIO()
+                image.save(buffer, 'JPEG', quality=settings.RECEIPT_STORAGE['JPEG_QUALITY'], optimize=True)
+                super().save(derivative_name(name, kind), ContentFile(buffer.getvalue()))
+        except (TooManyPixels, Image.DecompressionBombError) as e:
+            logger.warning('Not generating derivatives for receipt %s: %s', name, e)
+        except Exception:
+            # The original is stored either way; rebuild_receipt_storage can retry later
+            logger.exception('Could not generate derivatives for receipt %s', name)
+        finally:
+            content.seek(0)
+
+
+def receipt_storage():
+    return ReceiptStorage()
@@ -0,0 +1,27 @@
+from django.db import connection, transaction
+from django.test import TestCase
+from expenses.management.commands.check_query_budgets import ROW_COUNTS, Command as CheckQueryBudgets
+from expenses.management.commands.check_query_plans import EXPLAIN_PREFIXES, Command as CheckQueryPlans
+import io
+import unittest
+
+
+class QueryBudgetTests(TestCase):
+    # Runs manage.py check_query_budgets' checks on the test database
+
+    def test_query_budgets(self):
+        command = CheckQueryBudgets(stdout=io.StringIO())
+        for rows in ROW_COUNTS:
+            with self.subTest(rows=rows), transaction.atomic():
+                self.assertEqual(command.check_budgets(rows), [])
+                transaction.set_rollback(True)
+
+
+@unittest.skipUnless(connection.vendor in EXPLAIN_PREFIXES, 'Query plan checks need SQLite or PostgreSQL')
+class QueryPlanTests(TestCase):
+    # Runs manage.py check_query_plans' EXPLAIN checks on a smaller seeded dataset
+
+    def test_no_full_table_scans(self):
+        command = CheckQueryPlans(stdout=io.StringIO())
+        options = {'expenses': 2000, 'companies': 2, 'min_rows': 1000, 'verbose_plans': False}
+        self.assertEqual(command.check_plans(options), [])
@@ -1,10 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ExpenseViewSet, ApprovalFlowViewSet
+from .views import ExpenseViewSet, ApprovalFlowViewSet, BudgetViewSet
 
 router = DefaultRouter()
 router.register('claims', ExpenseViewSet, basename='expense')
 router.register('approval-flows', ApprovalFlowViewSet, basename='approval-flow')
+router.register('budgets', BudgetViewSet, basename='budget')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -1,97 +1,142 @@
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
+from django.db.models import Prefetch, Count, OuterRef, Subquery, Sum
+from django.db.models.functions import TruncMonth
+from django.conf import settings
 from django.utils import timezone
-from .models import Expense, ApprovalStep, User, ApprovalFlow
-from .serializers import ExpenseSerializer, ApprovalActionSerializer, ApprovalFlowSerializer
-from .permissions import IsOwnerOrApprover, IsManagerOrAdmin
-import requests
+from .models import Expense, ApprovalStep, ApprovalFlow, Budget, BudgetUsage, ExpenseRollup, ExpenseViewer, PendingApprovalCount
+from .serializers import (
+    ExpenseSerializer, ApprovalActionSerializer, BulkApprovalActionSerializer, ApprovalFlowSerializer, ExpenseFilterQuerySerializer,
+    ExpenseListQuerySerializer, ExpenseExportQuerySerializer, ExpenseSearchQuerySerializer, BudgetSerializer, BudgetReportQuerySerializer,
+)
+from .permissions import IsOwnerOrApprover, IsManagerOrAdmin, IsAdmin
+from .importer import ExpenseImporter, ImportFileError, read_rows
+from .pagination import EXPENSE_ORDERINGS, ExpenseCursorPagination, ExpenseSearchPagination
+from . import approvals, budgets, exports, flows, fx, receipts, rollups, search, visibility
 import decimal
 
+def format_amount(value):
+    # SQLite hands back SUM() of decimals unquantized, e.g. 52.5
+    return f"{value or decimal.Decimal('0'):.2f}"
+
 class ExpenseViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ExpenseCursorPagination
 
     def get_queryset(self):
+        return self.with_serializer_relations(self.get_visible_expenses())
+
+    def get_visible_expenses(self):
         user = self.request.user
         if user.role == 'ADMIN':
             return Expense.objects.filter(employee__company=user.company)
         if user.role == 'MANAGER':
-            # Return expenses for their team members and expenses pending their approval
-            team_member_ids = user.team_members.values_list('id', flat=True)
-            team_expenses = Expense.objects.filter(employee_id__in=team_member_ids)
-            pending_approval = Expense.objects.filter(approval_steps__approver=user, approval_steps__status='PENDING')
-            return (team_expenses | pending_approval).distinct()
+            # Expenses of their team members and expenses pending their approval, kept in ExpenseViewer
+            return Expense.objects.filter(viewers__viewer=user)
         # Employee
         return Expense.objects.filter(employee=user)
 
+    @staticmethod
+    def with_serializer_relations(queryset):
+        # Load everything ExpenseSerializer touches up front so a page costs a fixed number of queries
+        return queryset.select_related('employee__company', 'employee__manager', 'ocr_data').prefetch_related(
+            Prefetch(
+                'approval_steps',
+                queryset=ApprovalStep.objects.select_related('approver__company', 'approver__manager'),
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        """
+        The visible expenses, narrowed in SQL by the ExpenseListQuerySerializer filters and
+        sorted by ?ordering= (newest first by default).
+        """
+        params = ExpenseListQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        # Read by ExpenseCursorPagination
+        self.ordering = EXPENSE_ORDERINGS[filters.pop('ordering')]
+        page = self.paginate_queryset(self.filter_expenses(self.get_queryset(), filters))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     def perform_create(self, serializer):
         user = self.request.user
         company = user.company
         amount = serializer.validated_data.get('amount')
         currency = serializer.validated_data.get('currency')
         
-        converted_amount = amount
-        if currency != company.currency:
-            try:
-                # NOTE: Using a free API key. In production, use a paid, reliable service.
-                response = requests.get(f'https://api.exchangerate-api.com/v4/latest/{currency}')
-                response.raise_for_status()
-                rates = response.json().get('rates', {})
-                conversion_rate = rates.get(company.currency)
-                if conversion_rate:
-                    converted_amount = amount * decimal.Decimal(conversion_rate)
-                else:
-                    # Handle case where conversion rate is not available
-                    pass
-            except requests.RequestException as e:
-                # Handle API errors gracefully
-                print(f"Could not fetch conversion rate: {e}")
-
-        expense = serializer.save(employee=user, converted_amount=converted_amount)
-        self.create_approval_flow(expense)
-
-    def create_approval_flow(self, expense):
-        employee = expense.employee
-        company = employee.company
-        
-        # Find the default approval flow for the company
-        default_flow = ApprovalFlow.objects.filter(company=company, is_default=True).first()
-
-        if not default_flow:
-            # Fallback to simple Manager -> Admin flow if no default is set
-            step = 1
-            manager_is_approver = False
-            if employee.manager and employee.manager.is_manager_approver:
-                ApprovalStep.objects.create(expense=expense, approver=employee.manager, step_number=step)
-                step += 1
-                manager_is_approver = True
-
-            admin = User.objects.filter(company=company, role='ADMIN').first()
-            if admin:
-                if not (manager_is_approver and employee.manager == admin):
-                    ApprovalStep.objects.create(expense=expense, approver=admin, step_number=step)
-            return
-
-        expense.approval_flow_history = default_flow
-        expense.save()
-
-        for flow_step in default_flow.steps.all():
-            approver = None
-            if flow_step.approver_role == 'MANAGER':
-                if employee.manager and employee.manager.is_manager_approver:
-                    approver = employee.manager
-            elif flow_step.approver_role == 'ADMIN':
-                approver = User.objects.filter(company=company, role='ADMIN').first()
-            
-            if approver:
-                # Prevent creating duplicate approval steps for the same person
-                if not ApprovalStep.objects.filter(expense=expense, approver=approver).exists():
-                    ApprovalStep.objects.create(
-                        expense=expense,
-                        approver=approver,
-                        step_number=flow_step.step_number
-                    )
+        # Stored daily rate for the expense date if loaded, else the cached live rate table. The
+        # lookup may call the rate provider, and hashing the receipt and writing it with its
+        # resized derivatives is file and image work, so all of it runs before the transaction
+        # below takes the database write lock.
+        converted_amount = fx.convert(amount, currency, company.currency, on=serializer.validated_data.get('date'))
+        receipt_sha256 = receipts.receipt_digest(serializer.validated_data)
+        stored = {'receipt_image': receipts.store_receipt(serializer.validated_data)} if receipt_sha256 else {}
+        # The company's default flow, admin and approving managers, cached per process
+        flow = flows.get_compiled_flow(company.pk)
+        plan = flow.plan(user.manager_id)
+
+        with transaction.atomic():
+            # Read from one counter row per budget; raises if a blocking budget would be exceeded
+            company_budgets = budgets.for_companies([company.pk])
+            over_budget = budgets.check(
+                company, company_budgets.get(company.pk, []), serializer.validated_data['category'], user.manager_id,
+                serializer.validated_data['date'], converted_amount,
+            )
+            expense = serializer.save(
+                employee=user, converted_amount=converted_amount, receipt_sha256=receipt_sha256,
+                approval_flow_history_id=flow.flow_id, approver_count=len(plan), over_budget=over_budget, **stored,
+            )
+            if receipt_sha256:
+                # A receipt already scanned through the OCR endpoint is attached without running OCR again
+                receipts.attach_cached_ocr(expense)
+            self.create_approval_flow(expense, plan)
+            rollups.record_created(expense)
+            budgets.record_created(expense, company_budgets)
+            search.index([expense.pk])
+
+    def perform_update(self, serializer):
+        new_receipt = 'receipt_image' in serializer.validated_data
+        # Hashed and stored before the write transaction, like on create
+        receipt_sha256 = receipts.receipt_digest(serializer.validated_data) if new_receipt else None
+        stored = {'receipt_image': receipts.store_receipt(serializer.validated_data)} if receipt_sha256 else {}
+        with transaction.atomic():
+            before = rollups.snapshot(serializer.instance)
+            budget_before = budgets.snapshot(serializer.instance)
+            if new_receipt:
+                expense = serializer.save(receipt_sha256=receipt_sha256, **stored)
+                receipts.attach_cached_ocr(expense)
+            else:
+                expense = serializer.save()
+            rollups.record_changed(before, expense)
+            budgets.record_changed(budget_before, expense)
+            search.index([expense.pk])
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        rollups.record_deleted(instance)
+        budgets.record_deleted(instance)
+        search.remove([instance.pk])
+        approvals.set_current_step(instance, None)
+        instance.delete()
+
+    def create_approval_flow(self, expense, plan):
+        """
+        Creates the expense's approval steps from a plan of its company's compiled flow, all
+        pending, and points the expense at the first one.
+        """
+        steps = ApprovalStep.objects.bulk_create([
+            ApprovalStep(expense=expense, approver_id=approver_id, step_number=step_number)
+            for approver_id, step_number in plan
+        ])
+        approvals.set_current_step(expense, min(steps, key=lambda step: step.step_number, default=None))
+        ExpenseViewer.objects.bulk_create(
+            visibility.new_viewers(expense.pk, expense.employee.manager_id, {approver_id for approver_id, _ in plan})
+        )
 
     @action(detail=True, methods=['post'], permission_classes=[IsOwnerOrApprover])
     def approve(self, request, pk=None):
@@ -108,49 +153,171 @@ class ExpenseViewSet(viewsets.ModelViewSet):
         if new_status not in ['APPROVED', 'REJECTED']:
             return Response({'error': 'Invalid status provided.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        expense.status = new_status
-        expense.save()
+        with transaction.atomic():
+            # Waits for any approval in flight on this expense, see approvals.act
+            expense = Expense.objects.select_for_update().get(pk=expense.pk)
+            before = rollups.snapshot(expense)
+            budget_before = budgets.snapshot(expense)
+            expense.status = new_status
+            expense.save()
+            approvals.advance(expense)
+            rollups.record_changed(before, expense)
+            budgets.record_changed(budget_before, expense)
         
         # Optional: Add a comment or log this override action
         return Response(ExpenseSerializer(expense).data)
 
     def handle_approval_action(self, request, pk, new_status):
         expense = self.get_object()
-        user = request.user
-        
-        try:
-            approval_step = ApprovalStep.objects.get(expense=expense, approver=user, status='PENDING')
-        except ApprovalStep.DoesNotExist:
+        # Same locked transition as bulk_action, so concurrent calls on one expense serialize
+        statuses = approvals.act(
+            request.user, Expense.objects.filter(pk=expense.pk), new_status, request.data.get('comments', '')
+        )
+        if not statuses:
+            if Expense.objects.filter(pk=expense.pk).exclude(status='PENDING').exists():
+                return Response({'error': 'This expense has already been decided.'}, status=status.HTTP_409_CONFLICT)
             return Response({'error': 'No pending approval for you on this expense.'}, status=status.HTTP_403_FORBIDDEN)
 
-        approval_step.status = new_status
-        approval_step.comments = request.data.get('comments', '')
-        approval_step.acted_at = timezone.now()
-        approval_step.save()
+        # The approval steps prefetched by get_object are stale after the transition
+        expense = self.with_serializer_relations(Expense.objects.all()).get(pk=expense.pk)
+        return Response(ExpenseSerializer(expense).data)
 
-        if new_status == 'REJECTED':
-            expense.status = 'REJECTED'
-            expense.save()
-            # Optional: Invalidate subsequent approval steps
-            ApprovalStep.objects.filter(expense=expense, step_number__gt=approval_step.step_number).delete()
-        else: # Approved
-            # Check if this was the final approval
-            next_step = ApprovalStep.objects.filter(expense=expense, status='PENDING').order_by('step_number').first()
-            if not next_step:
-                expense.status = 'APPROVED'
-                expense.save()
+    @action(detail=False, methods=['post'], url_path='import', permission_classes=[IsAdmin])
+    def import_expenses(self, request):
+        """
+        Creates expenses in bulk from an uploaded CSV/JSON `file` or a JSON list of rows.
+        Invalid rows are skipped and reported; ?dry_run=1 only validates and converts.
+        """
+        upload = request.FILES.get('file')
+        rows = request.data if isinstance(request.data, list) else request.data.get('rows')
+        if not upload and not isinstance(rows, list):
+            return Response({'error': 'Upload a CSV or JSON file, or send a list of rows.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        return Response(ExpenseSerializer(expense).data)
+        importer = ExpenseImporter(request.user.company, default_employee=request.user)
+        try:
+            if upload:
+                rows = read_rows(upload.file, upload.name)
+            result = importer.run(
+                rows, max_rows=settings.EXPENSE_IMPORT['MAX_ROWS'], commit=request.query_params.get('dry_run') not in ('1', 'true')
+            )
+        except ImportFileError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_201_CREATED if result['imported'] else status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsManagerOrAdmin])
+    def bulk_action(self, request):
+        """
+        Approves or rejects many expenses at once: {"action": "approve", "ids": [...], "comments": ""}.
+        Answers with the resulting status, or an error, for each id.
+        """
+        params = BulkApprovalActionSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        ids = list(dict.fromkeys(params.validated_data['ids']))
+        new_status = 'APPROVED' if params.validated_data['action'] == 'approve' else 'REJECTED'
+
+        statuses = approvals.act(
+            request.user, self.get_visible_expenses().filter(pk__in=ids), new_status,
+            params.validated_data.get('comments', ''),
+        )
+        return Response({'results': [
+            {'id': expense_id, 'status': statuses[expense_id]} if expense_id in statuses
+            else {'id': expense_id, 'error': 'No pending approval for you on this expense.'}
+            for expense_id in ids
+        ]})
 
     @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
     def approval_queue(self, request):
-        user = request.user
-        pending_expenses = Expense.objects.filter(
-            approval_steps__approver=user,
-            approval_steps__status='PENDING'
-        ).distinct()
-        serializer = self.get_serializer(pending_expenses, many=True)
-        return Response(serializer.data)
+        # Expenses whose current step is waiting on this user, via the maintained pointer
+        pending_expenses = self.with_serializer_relations(Expense.objects.filter(current_approver=request.user))
+        page = self.paginate_queryset(pending_expenses)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsManagerOrAdmin])
+    def pending_count(self, request):
+        counter = PendingApprovalCount.objects.filter(user=request.user).first()
+        return Response({'count': counter.count if counter else 0})
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Count and converted_amount totals by status, category and month, computed in SQL.
+        An unfiltered admin request is answered from ExpenseRollup without touching Expense.
+        """
+        params = ExpenseFilterQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = params.validated_data
+
+        if request.user.role == 'ADMIN' and not filters:
+            rows = ExpenseRollup.objects.filter(company=request.user.company, count__gt=0)
+            return Response(self.summarize(rows, count=Sum('count'), total_amount=Sum('total_amount')))
+
+        expenses = self.filter_expenses(self.get_visible_expenses(), filters).annotate(month=TruncMonth('date'))
+        return Response(self.summarize(expenses, count=Count('id'), total_amount=Sum('converted_amount')))
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams the visible expenses, newest first, as a CSV (default) or ?file_format=xlsx
+        attachment. Takes the same filters as the claims list and stats.
+        """
+        params = ExpenseExportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        filters = dict(params.validated_data)
+        file_format = filters.pop('file_format')
+        expenses = self.filter_expenses(self.get_visible_expenses(), filters).order_by('-created_at', '-id')
+        return exports.export_response(expenses, file_format)
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search of the visible expenses' description, category, employee name and
+        receipt OCR text for every word of ?q=, best match first, paginated by ?page=.
+        """
+        params = ExpenseSearchQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        results = search.search(self.with_serializer_relations(self.get_visible_expenses()), params.validated_data['q'])
+        paginator = ExpenseSearchPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
+
+    # Lookup applied for each ExpenseFilterQuerySerializer field
+    FILTER_LOOKUPS = {
+        'status': 'status',
+        'category': 'category',
+        'currency': 'currency',
+        'date_from': 'date__gte',
+        'date_to': 'date__lte',
+        'amount_min': 'converted_amount__gte',
+        'amount_max': 'converted_amount__lte',
+        'employee': 'employee_id',
+    }
+
+    @classmethod
+    def filter_expenses(cls, expenses, filters):
+        return expenses.filter(**{cls.FILTER_LOOKUPS[name]: value for name, value in filters.items()})
+
+    @staticmethod
+    def summarize(queryset, **aggregates):
+        def buckets(key):
+            rows = queryset.values(key).annotate(**aggregates).order_by(key)
+            return [
+                {key: row[key], 'count': row['count'], 'total_amount': format_amount(row['total_amount'])}
+                for row in rows
+            ]
+
+        totals = queryset.aggregate(**aggregates)
+        by_month = buckets('month')
+        for row in by_month:
+            row['month'] = row['month'].strftime('%Y-%m')
+
+        return {
+            'count': totals['count'] or 0,
+            'total_amount': format_amount(totals['total_amount']),
+            'by_status': buckets('status'),
+            'by_category': buckets('category'),
+            'by_month': by_month,
+        }
 
 class ApprovalFlowViewSet(viewsets.ModelViewSet):
     serializer_class = ApprovalFlowSerializer
@@ -159,8 +326,71 @@ class ApprovalFlowViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         user = self.request.user
         if user.role == 'ADMIN':
-            return ApprovalFlow.objects.filter(company=user.company)
+            return ApprovalFlow.objects.filter(company=user.company).prefetch_related('steps')
         return ApprovalFlow.objects.none()
 
     def perform_create(self, serializer):
         serializer.save(company=self.request.user.company)
+
+class BudgetViewSet(viewsets.ModelViewSet):
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated, IsManagerOrAdmin]
+
+    def get_permissions(self):
+        # Managers may look at their team's budgets; only admins set them
+        if self.action not in ('list', 'retrieve', 'report'):
+            return [permissions.IsAuthenticated(), IsAdmin()]
+        return super().get_permissions()
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.role == 'ADMIN':
+            return Budget.objects.filter(company=user.company)
+        return Budget.objects.filter(manager=user)
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        budget = serializer.save(company=self.request.user.company)
+        budgets.rebuild_usage([budget])
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        # The category or team may have changed, so the usage is recounted
+        budget = serializer.save()
+        budgets.rebuild_usage([budget])
+
+    @action(detail=False, methods=['get'])
+    def report(self, request):
+        """
+        Consumption of each visible budget in ?month=YYYY-MM (default: this month), read from
+        the usage counters in one query.
+        """
+        params = BudgetReportQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        month = params.validated_data.get('month', timezone.localdate()).replace(day=1)
+
+        usage = BudgetUsage.objects.filter(budget=OuterRef('pk'), month=month)
+        rows = self.get_queryset().annotate(
+            pending_amount=Subquery(usage.values('pending_amount')[:1]),
+            approved_amount=Subquery(usage.values('approved_amount')[:1]),
+        ).order_by('pk')
+        report = []
+        for budget in rows:
+            pending = budget.pending_amount or decimal.Decimal('0')
+            approved = budget.approved_amount or decimal.Decimal('0')
+            consumed = pending + approved
+            report.append({
+                'id': budget.pk,
+                'name': budget.name,
+                'category': budget.category,
+                'manager': budget.manager_id,
+                'blocking': budget.blocking,
+                'monthly_amount': format_amount(budget.monthly_amount),
+                'pending_amount': format_amount(pending),
+                'approved_amount': format_amount(approved),
+                'consumed_amount': format_amount(consumed),
+                'remaining_amount': format_amount(budget.monthly_amount - consumed),
+                'percent_used': float(round(consumed * 100 / budget.monthly_amount, 1)) if budget.monthly_amount else None,
+                'over_budget': consumed > budget.monthly_amount,
+            })
+        return Response({'month': month.strftime('%Y-%m'), 'currency': request.user.company.currency, 'budgets': report})
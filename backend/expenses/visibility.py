@@ -0,0 +1,154 @@
+from django.db import transaction
+from .models import Expense, ApprovalStep, ExpenseViewer
+
+
+def wanted_viewers(manager_id, pending_approver_ids):
+    wanted = {}
+    if manager_id:
+        wanted[manager_id] = (True, manager_id in pending_approver_ids)
+    for approver_id in pending_approver_ids:
+        wanted.setdefault(approver_id, (False, True))
+    return wanted
+
+
+def new_viewers(expense_id, manager_id, pending_approver_ids):
+    """
+    Viewer rows of an expense that has just been created with these pending approvers.
+    """
+    return [
+        ExpenseViewer(expense_id=expense_id, viewer_id=viewer_id,
+                      is_team_manager=is_team_manager, is_pending_approver=is_pending_approver)
+        for viewer_id, (is_team_manager, is_pending_approver) in wanted_viewers(manager_id, pending_approver_ids).items()
+    ]
+
+
+def sync_expense(expense):
+    """
+    Recomputes the viewer rows of one expense from its employee's manager and pending steps.
+    Call after approval steps are created, acted on or removed.
+    """
+    pending = set(
+        ApprovalStep.objects.filter(expense=expense, status='PENDING').values_list('approver_id', flat=True)
+    )
+    wanted = wanted_viewers(expense.employee.manager_id, pending)
+    existing = {
+        row.viewer_id: row for row in ExpenseViewer.objects.filter(expense=expense)
+    }
+
+    stale = [viewer_id for viewer_id in existing if viewer_id not in wanted]
+    if stale:
+        ExpenseViewer.objects.filter(expense=expense, viewer_id__in=stale).delete()
+
+    missing = []
+    for viewer_id, (is_team_manager, is_pending_approver) in wanted.items():
+        row = existing.get(viewer_id)
+        if row is None:
+            missing.append(ExpenseViewer(
+                expense=expense, viewer_id=viewer_id,
+                is_team_manager=is_team_manager, is_pending_approver=is_pending_approver,
+            ))
+        elif (row.is_team_manager, row.is_pending_approver) != (is_team_manager, is_pending_approver):
+            row.is_team_manager = is_team_manager
+            row.is_pending_approver = is_pending_approver
+            row.save(update_fields=['is_team_manager', 'is_pending_approver'])
+    if missing:
+        ExpenseViewer.objects.bulk_create(missing)
+
+
+def sync_expenses(expense_ids):
+    """
+    sync_expense for many expenses at once, in a fixed number of queries.
+    """
+    managers = dict(Expense.objects.filter(pk__in=expense_ids).values_list('id', 'employee__manager_id'))
+    pending = {}
+    steps = ApprovalStep.objects.filter(expense_id__in=expense_ids, status='PENDING').values_list('expense_id', 'approver_id')
+    for expense_id, approver_id in steps:
+        pending.setdefault(expense_id, set()).add(approver_id)
+    wanted = {}
+    for expense_id, manager_id in managers.items():
+        for viewer_id, flags in wanted_viewers(manager_id, pending.get(expense_id, set())).items():
+            wanted[(expense_id, viewer_id)] = flags
+    existing = {
+        (expense_id, viewer_id): (pk, (is_team_manager, is_pending_approver))
+        for pk, expense_id, viewer_id, is_team_manager, is_pending_approver in ExpenseViewer.objects.filter(
+            expense_id__in=expense_ids
+        ).values_list('pk', 'expense_id', 'viewer_id', 'is_team_manager', 'is_pending_approver')
+    }
+
+    stale = [pk for key, (pk, _) in existing.items() if key not in wanted]
+    if stale:
+        ExpenseViewer.objects.filter(pk__in=stale).delete()
+    # Rows needing new flags, grouped so each combination is one UPDATE
+    changed = {}
+    for key, (pk, flags) in existing.items():
+        if key in wanted and wanted[key] != flags:
+            changed.setdefault(wanted[key], []).append(pk)
+    for (is_team_manager, is_pending_approver), pks in changed.items():
+        ExpenseViewer.objects.filter(pk__in=pks).update(
+            is_team_manager=is_team_manager, is_pending_approver=is_pending_approver
+        )
+    missing = [
+        ExpenseViewer(expense_id=expense_id, viewer_id=viewer_id,
+                      is_team_manager=is_team_manager, is_pending_approver=is_pending_approver)
+        for (expense_id, viewer_id), (is_team_manager, is_pending_approver) in wanted.items()
+        if (expense_id, viewer_id) not in existing
+    ]
+    if missing:
+        ExpenseViewer.objects.bulk_create(missing, batch_size=1000)
+
+
+def sync_team_manager(employee, previous_manager_id):
+    """
+    Moves team visibility of an employee's expenses from their previous manager to the current one.
+    """
+    if previous_manager_id == employee.manager_id:
+        return
+    if previous_manager_id:
+        rows = ExpenseViewer.objects.filter(expense__employee=employee, viewer_id=previous_manager_id)
+        rows.filter(is_pending_approver=False).delete()
+        rows.update(is_team_manager=False)
+    if employee.manager_id:
+        expense_ids = Expense.objects.filter(employee=employee).values_list('id', flat=True)
+        ExpenseViewer.objects.bulk_create(
+            [ExpenseViewer(expense_id=expense_id, viewer_id=employee.manager_id) for expense_id in expense_ids],
+            ignore_conflicts=True,
+            batch_size=1000,
+        )
+        ExpenseViewer.objects.filter(
+            expense__employee=employee, viewer_id=employee.manager_id
+        ).update(is_team_manager=True)
+
+
+def compute_viewers():
+    """
+    Every (expense, viewer) pair with its (is_team_manager, is_pending_approver) flags, from scratch.
+    """
+    managers = {}
+    team_rows = Expense.objects.filter(employee__manager__isnull=False).values_list('id', 'employee__manager_id')
+    for expense_id, manager_id in team_rows.iterator(chunk_size=2000):
+        managers[expense_id] = manager_id
+    pending = {}
+    step_rows = ApprovalStep.objects.filter(status='PENDING').values_list('expense_id', 'approver_id')
+    for expense_id, approver_id in step_rows.iterator(chunk_size=2000):
+        pending.setdefault(expense_id, set()).add(approver_id)
+
+    viewers = {}
+    for expense_id in managers.keys() | pending.keys():
+        for viewer_id, flags in wanted_viewers(managers.get(expense_id), pending.get(expense_id, set())).items():
+            viewers[(expense_id, viewer_id)] = flags
+    return viewers
+
+
+@transaction.atomic
+def rebuild_viewers():
+    ExpenseViewer.objects.all().delete()
+    ExpenseViewer.objects.bulk_create(
+        [
+            ExpenseViewer(
+                expense_id=expense_id, viewer_id=viewer_id,
+                is_team_manager=is_team_manager, is_pending_approver=is_pending_approver,
+            )
+            for (expense_id, viewer_id), (is_team_manager, is_pending_approver) in compute_viewers().items()
+        ],
+        batch_size=1000,
+    )
@@ -0,0 +1,87 @@
+"""
+OCR results keyed by the SHA-256 of the uploaded image bytes, so a receipt that has been
+scanned once never goes through Tesseract again. Two tiers: a per-process LRU in memory
+and the OCRResult table shared by every worker.
+"""
+from collections import OrderedDict
+from django.conf import settings
+from .models import OCRResult
+import hashlib
+import threading
+
+
+def image_digest(image_bytes):
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def page_digest(document_digest, page):
+    return hashlib.sha256(f'{document_digest}:{page}'.encode()).hexdigest()
+
+
+def file_digest(uploaded_file):
+    """
+    Hashes an uploaded file chunk by chunk and rewinds it for whoever saves it next.
+    """
+    digest = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+class MemoryLRU:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_memory_cache():
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = MemoryLRU(settings.OCR_CACHE['MEMORY_ENTRIES'])
+        return _memory
+
+
+def lookup(digest):
+    """
+    Returns the cached {'raw_text', 'parsed_data'} for an image digest, or None.
+    """
+    memory = get_memory_cache()
+    result = memory.get(digest)
+    if result is not None:
+        return result
+    record = OCRResult.objects.filter(pk=digest).values('raw_text', 'parsed_data').first()
+    if record is not None:
+        memory.put(digest, record)
+    return record
+
+
+def store(digest, result):
+    result = {'raw_text': result['raw_text'], 'parsed_data': result['parsed_data']}
+    OCRResult.objects.update_or_create(image_sha256=digest, defaults=result)
+    get_memory_cache().put(digest, result)
+    return result
@@ -0,0 +1,90 @@
+"""
+Splits uploads into pages for OCR: PDFs are rendered page by page with pdfium, multi-frame
+TIFFs are read frame by frame, and any other image is a single page. Django-free like
+engine.py, since pages are rendered inside the pool's worker processes.
+
+A source is either the upload's bytes or the path of a spooled upload; paths are read
+from disk lazily instead of being loaded into memory.
+"""
+from PIL import Image, ImageSequence
+import io
+import pypdfium2 as pdfium
+
+# PDF points per inch
+POINTS_PER_INCH = 72
+
+
+class DocumentError(Exception):
+    pass
+
+
+class TooManyPixels(DocumentError):
+    pass
+
+
+def open_image(source):
+    return Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def is_pdf(source):
+    if isinstance(source, bytes):
+        head = source[:1024]
+    else:
+        with open(source, 'rb') as f:
+            head = f.read(1024)
+    # The header may be preceded by a little junk; readers look in the first kilobyte
+    return b'%PDF-' in head
+
+
+def page_count(source, max_pixels=None, dpi=None):
+    """
+    Number of pages in an upload, or 1 for a single image. Only headers are read. Raises
+    TooManyPixels when a page (a PDF page rendered at `dpi`) would decode to more than
+    `max_pixels`, and DocumentError when the upload can't be read.
+    """
+    try:
+        if is_pdf(source):
+            pdf = pdfium.PdfDocument(source)
+            try:
+                if max_pixels:
+                    for index in range(len(pdf)):
+                        width, height = pdf.get_page_size(index)
+                        check_pixels(width * dpi / POINTS_PER_INCH, height * dpi / POINTS_PER_INCH, max_pixels)
+                return len(pdf)
+            finally:
+                pdf.close()
+
+        image = open_image(source)
+        # TIFF pages can each have their own size; other formats share one canvas
+        frames = ImageSequence.Iterator(image) if image.format == 'TIFF' else [image]
+        for frame in frames:
+            if max_pixels:
+                check_pixels(*frame.size, max_pixels)
+        return getattr(image, 'n_frames', 1)
+    except DocumentError:
+        raise
+    except Image.DecompressionBombError as e:
+        raise TooManyPixels(str(e)) from None
+    except Exception:
+        raise DocumentError('Not a readable image or PDF.') from None
+
+
+def check_pixels(width, height, max_pixels):
+    if width * height > max_pixels:
+        raise TooManyPixels(f'Pages may have at most {max_pixels} pixels, this one has {int(width * height)}.')
+
+
+def load_page(source, index, dpi):
+    """
+    Returns page `index` (0-based) as a PIL image; PDF pages are rendered at `dpi`.
+    """
+    if is_pdf(source):
+        pdf = pdfium.PdfDocument(source)
+        try:
+            page = pdf[index]
+            return page.render(scale=dpi / POINTS_PER_INCH, grayscale=True).to_pil()
+        finally:
+            pdf.close()
+    image = open_image(source)
+    image.seek(index)
+    return image
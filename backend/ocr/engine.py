@@ -0,0 +1,36 @@
+"""
+OCR work that runs inside the job pool's worker processes.
+Kept free of Django imports so spawned workers start without settings or app loading.
+"""
+import pytesseract
+from .parsing import parse_ocr_text
+from .documents import load_page, open_image
+from .preprocessing import DEFAULTS, preprocess
+
+
+class OCRError(Exception):
+    pass
+
+
+def run_ocr(source, preprocessing=None, page=None):
+    """
+    OCRs an image, or with `page` one page of a PDF or multi-frame image. `source` is the
+    upload's bytes or the path of a spooled upload (see documents.py).
+    """
+    try:
+        if page is None:
+            image = open_image(source)
+        else:
+            config = {**DEFAULTS, **(preprocessing or {})}
+            image = load_page(source, page, config['TARGET_DPI'])
+            # Document pages already have a usable resolution; shrinking them to receipt width would lose text
+            preprocessing = {**config, 'STAGES': [name for name in config['STAGES'] if name != 'downscale']}
+        image = preprocess(image, preprocessing)
+        text = pytesseract.image_to_string(image)
+    except Exception as e:
+        # Some PIL/pytesseract exceptions can't be pickled back to the parent and would break the pool
+        raise OCRError(f'{type(e).__name__}: {e}') from None
+    return {
+        'raw_text': text,
+        'parsed_data': parse_ocr_text(text),
+    }
@@ -0,0 +1,194 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from expenses import receipts
+from . import cache
+from .engine import run_ocr
+from .models import OCRJob
+from .uploads import discard
+import collections
+import functools
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class OCRJobPool:
+    """
+    Runs OCR jobs in a bounded process pool sized to the machine's cores.
+    At most `max_pending` jobs per web worker may be queued or running; beyond that
+    submit() raises QueueFull so the view can shed load instead of piling up work.
+    """
+    def __init__(self, max_workers, max_pending):
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: forking a threaded web worker can deadlock the child
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor
+
+    def submit(self, job, fn, *args, timeout=None, cleanup=None):
+        """
+        Raises QueueFull when no slot is free, after waiting up to `timeout` seconds if given.
+        `cleanup` is a file to delete once the job is over.
+        """
+        acquired = self._slots.acquire(timeout=timeout) if timeout else self._slots.acquire(blocking=False)
+        if not acquired:
+            raise QueueFull()
+        try:
+            future = self.executor().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(functools.partial(self._finish, job.pk, job.image_sha256, cleanup))
+        return future
+
+    def _finish(self, job_id, digest, cleanup, future):
+        self._slots.release()
+        if cleanup:
+            discard(cleanup)
+        close_old_connections()
+        try:
+            result = future.result()
+        except BrokenProcessPool as e:
+            # A worker died (e.g. OOM-killed); start a fresh pool for the next job
+            with self._lock:
+                self._executor = None
+            logger.error('OCR pool broke while running job %s', job_id)
+            OCRJob.objects.filter(pk=job_id).update(status='FAILED', error=str(e), finished_at=timezone.now())
+        except Exception as e:
+            logger.exception('OCR job %s failed', job_id)
+            OCRJob.objects.filter(pk=job_id).update(status='FAILED', error=str(e), finished_at=timezone.now())
+        else:
+            OCRJob.objects.filter(pk=job_id).update(
+                status='DONE', raw_text=result['raw_text'], parsed_data=result['parsed_data'], finished_at=timezone.now()
+            )
+            if digest:
+                cache.store(digest, result)
+                receipts.attach_to_waiting_expenses(digest, result)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            config = settings.OCR_JOBS
+            max_workers = config['MAX_WORKERS'] or os.cpu_count()
+            _pool = OCRJobPool(max_workers, config['MAX_PENDING'] or max_workers * 4)
+        return _pool
+
+
+def submit_scan(source, user=None, page=None, digest=None, timeout=None, owns_source=False):
+    """
+    Records a job for an image (or one page of a document) and returns (job, future).
+    `source` is the image's bytes or a spooled upload path; pass `digest` for a path. With
+    `owns_source` the path is deleted as soon as the scan no longer needs it.
+    A cache hit comes back as an already DONE job with no future. Raises QueueFull when saturated.
+    """
+    user = user if user and user.is_authenticated else None
+    digest = digest or cache.image_digest(source)
+    if page is not None:
+        digest = cache.page_digest(digest, page)
+    result = cache.lookup(digest)
+    if result is not None:
+        if owns_source:
+            discard(source)
+        job = OCRJob.objects.create(
+            user=user, image_sha256=digest, status='DONE', finished_at=timezone.now(), **result
+        )
+        return job, None
+
+    job = OCRJob.objects.create(user=user, image_sha256=digest)
+    try:
+        future = get_pool().submit(
+            job, run_ocr, source, settings.OCR_PREPROCESSING, page,
+            timeout=timeout, cleanup=source if owns_source else None,
+        )
+    except QueueFull:
+        job.delete()
+        if owns_source:
+            discard(source)
+        raise
+    return job, future
+
+
+def enqueue_scan(source, user=None, digest=None, owns_source=False):
+    """
+    Records a QUEUED job and hands the image to the pool. Raises QueueFull when saturated.
+    An image that has been scanned before comes back as an already DONE job from the cache.
+    """
+    job, _ = submit_scan(source, user, digest=digest, owns_source=owns_source)
+    return job
+
+
+def scan_batch(items, user=None):
+    """
+    OCRs many images or document pages, yielding one result dict per item as each finishes.
+    `items` are dicts with the upload's `source`, its `digest`, the 0-based `page` (None for a
+    plain image) and any keys to echo back. Only as many items as the pool has free slots
+    are in flight at once; failures are reported on the item instead of raised.
+    """
+    waiting = collections.deque(items)
+    running = {}
+    wait_seconds = settings.OCR_JOBS['BATCH_WAIT_SECONDS']
+    while waiting or running:
+        while waiting:
+            item = waiting[0]
+            try:
+                # With nothing of ours in flight, wait for other requests to free a slot
+                job, future = submit_scan(
+                    item['source'], user, item['page'], item['digest'], timeout=None if running else wait_seconds
+                )
+            except QueueFull:
+                if running:
+                    break
+                waiting.popleft()
+                yield batch_result(item, status='FAILED', error='The receipt scanner is busy, please retry shortly.')
+                continue
+            waiting.popleft()
+            if future is None:
+                yield batch_result(item, job.pk, 'DONE', {'raw_text': job.raw_text, 'parsed_data': job.parsed_data})
+            else:
+                running[future] = (item, job.pk)
+
+        if running:
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                item, job_id = running.pop(future)
+                try:
+                    yield batch_result(item, job_id, 'DONE', future.result())
+                except Exception as e:
+                    yield batch_result(item, job_id, 'FAILED', error=str(e))
+
+
+def batch_result(item, job_id=None, status='DONE', result=None, error=None):
+    echoed = {key: value for key, value in item.items() if key not in ('source', 'digest', 'page')}
+    return {
+        **echoed,
+        'page': item['page'] + 1 if item['page'] is not None else None,
+        'job_id': job_id,
+        'status': status,
+        'raw_text': result['raw_text'] if result else None,
+        'parsed_data': result['parsed_data'] if result else None,
+        'error': error,
+    }
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from ocr.parsing import parse_ocr_text
+from ocr.preprocessing import DEFAULTS, preprocess
+from ocr.synthetic import make_receipt
+import io
+import random
+import statistics
+import time
+import pytesseract
+
+FIELDS = ('amount', 'date', 'description')
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks OCR latency and field accuracy on synthetic receipt photos, with and without each preprocessing stage'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=20, help='Number of synthetic receipts')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--width', type=int, default=3024, help='Photo width in pixels')
+        parser.add_argument('--height', type=int, default=4032, help='Photo height in pixels')
+
+    def handle(self, *args, **options):
+        try:
+            pytesseract.get_tesseract_version()
+        except Exception as e:
+            raise CommandError(f'Tesseract is not available: {e}')
+
+        rng = random.Random(options['seed'])
+        size = (options['width'], options['height'])
+        # Every other photo is stored sideways with an EXIF orientation tag, as phones do
+        corpus = [make_receipt(rng, size=size, sideways=i % 2 == 1) for i in range(options['count'])]
+
+        config = {**DEFAULTS, **settings.OCR_PREPROCESSING}
+        stages = config['STAGES']
+        variants = [('configured', stages), ('none', [])]
+        variants += [(f'without {name}', [s for s in stages if s != name]) for name in stages]
+
+        self.stdout.write(f'{len(corpus)} receipts at {size[0]}x{size[1]}')
+        self.stdout.write(f'{"variant":<24}{"p50 ms":>10}{"p95 ms":>10}' + ''.join(f'{field:>13}' for field in FIELDS))
+        for label, variant_stages in variants:
+            timings, correct = self.run_variant(corpus, {**config, 'STAGES': variant_stages})
+            accuracy = ''.join(f'{correct[field] / len(corpus):>13.0%}' for field in FIELDS)
+            self.stdout.write(f'{label:<24}{percentile(timings, 50):>10.0f}{percentile(timings, 95):>10.0f}{accuracy}')
+
+        self.stdout.write(self.style.SUCCESS('Successfully benchmarked OCR preprocessing'))
+
+    def run_variant(self, corpus, config):
+        timings = []
+        correct = dict.fromkeys(FIELDS, 0)
+        for image_bytes, expected in corpus:
+            started = time.perf_counter()
+            image = preprocess(Image.open(io.BytesIO(image_bytes)), config)
+            text = pytesseract.image_to_string(image)
+            timings.append((time.perf_counter() - started) * 1000)
+
+            parsed = parse_ocr_text(text)
+            for field in FIELDS:
+                if str(parsed.get(field) or '').strip() == expected[field]:
+                    correct[field] += 1
+        return timings, correct
+
+
+def percentile(values, pct):
+    if len(values) < 2:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
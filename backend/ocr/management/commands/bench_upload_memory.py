@@ -0,0 +1,157 @@
+from django.core.handlers.wsgi import WSGIHandler, WSGIRequest
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases, setup_test_environment, teardown_test_environment
+from PIL import Image
+from rest_framework_simplejwt.tokens import AccessToken
+from ocr import cache
+from users.models import Company, User
+import hashlib
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+
+BOUNDARY = 'ocr-memory-benchmark'
+MODES = ('spooled', 'buffered')
+
+
+class Command(BaseCommand):
+    help = (
+        'Measures peak web-worker RSS while receiving a receipt upload of each size, through the '
+        'scan-receipt endpoint (spooled) and with the upload read into memory as before (buffered)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 10, 50], help='Upload sizes in MB')
+        parser.add_argument('--child', nargs=3, metavar=('MODE', 'BODY', 'DIGEST'), help='Internal: measure one request')
+
+    def handle(self, *args, **options):
+        if options['child']:
+            self.stdout.write(json.dumps(measure(*options['child'])))
+            return
+
+        self.stdout.write(f'{"upload":>8}{"mode":>10}{"status":>8}{"RSS before":>13}{"peak":>10}{"growth":>10}')
+        with tempfile.TemporaryDirectory() as workdir:
+            for size in options['sizes']:
+                body_path, digest = write_request_body(workdir, size * 1024 * 1024)
+                for mode in MODES:
+                    # A fresh process per request, so one measurement can't inflate the next
+                    result = subprocess.run(
+                        [sys.executable, sys.argv[0], 'bench_upload_memory', '--child', mode, body_path, digest],
+                        capture_output=True, text=True,
+                    )
+                    if result.returncode:
+                        raise CommandError(result.stderr)
+                    row = json.loads(result.stdout.strip().splitlines()[-1])
+                    self.stdout.write(
+                        f'{size:>6}MB{mode:>10}{row["status"]:>8}{mb(row["rss_before"]):>13}'
+                        f'{mb(row["peak"]):>10}{mb(row["peak"] - row["rss_before"]):>10}'
+                    )
+                os.remove(body_path)
+        self.stdout.write(self.style.SUCCESS('Successfully measured upload memory'))
+
+
+def mb(kilobytes):
+    return f'{kilobytes / 1024:.1f}MB'
+
+
+def write_request_body(workdir, size):
+    """
+    A multipart body holding a noise JPEG padded to exactly `size` bytes, written straight to
+    disk. Returns (path, SHA-256 of the JPEG).
+    """
+    # Noise barely compresses, so roughly 2.5 bytes per pixel at this quality
+    side = int((size / 2.5) ** 0.5)
+    image = Image.frombytes('L', (side, side), os.urandom(side * side)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95)
+    jpeg = buffer.getvalue()[:size]
+    padding = size - len(jpeg)
+
+    path = os.path.join(workdir, f'{size}.body')
+    with open(path, 'wb') as body:
+        body.write(
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="receipt.jpg"\r\n'
+            f'Content-Type: image/jpeg\r\n\r\n'.encode()
+        )
+        body.write(jpeg)
+        body.write(b'\0' * padding)
+        body.write(f'\r\n--{BOUNDARY}--\r\n'.encode())
+    digest = hashlib.sha256(jpeg)
+    digest.update(b'\0' * padding)
+    return path, digest.hexdigest()
+
+
+def measure(mode, body_path, digest):
+    setup_test_environment()
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        company = Company.objects.create(name='Benchmark', country='US', currency='USD')
+        user = User.objects.create_user(username='bench', password='x', company=company, role='EMPLOYEE')
+        token = str(AccessToken.for_user(user))
+        handler = WSGIHandler()
+
+        # Warm up imports and code paths with a tiny upload before measuring
+        small, small_digest = write_request_body(os.path.dirname(body_path), 1024)
+        # Seed the OCR cache so neither request waits on Tesseract; only the upload path is measured
+        for seeded in (digest, small_digest):
+            cache.store(seeded, {'raw_text': '', 'parsed_data': {}})
+        run(mode, handler, small, token)
+        os.remove(small)
+
+        rss_before = read_status('VmRSS')
+        reset_peak()
+        status = run(mode, handler, body_path, token)
+        return {'status': status, 'rss_before': rss_before, 'peak': peak_rss()}
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        teardown_test_environment()
+
+
+def run(mode, handler, body_path, token):
+    with open(body_path, 'rb') as body:
+        environ = {
+            'REQUEST_METHOD': 'POST',
+            'PATH_INFO': '/api/ocr/scan-receipt/',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': body,
+            'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+            'CONTENT_LENGTH': str(os.path.getsize(body_path)),
+            'HTTP_AUTHORIZATION': f'Bearer {token}',
+        }
+        if mode == 'spooled':
+            response = handler(environ, lambda status, headers: None)
+            response.close()
+            return response.status_code
+
+        # What the endpoint used to do: Django's default upload handling, the whole file read
+        # into memory, then pickled to hand it to the pool
+        request = WSGIRequest(environ)
+        image_bytes = request.FILES['image'].read()
+        pickle.dumps(image_bytes)
+        request.close()
+        return 200
+
+
+def read_status(field):
+    # Kilobytes, from /proc/self/status
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith(field + ':'):
+                return int(line.split()[1])
+    raise CommandError('Peak RSS can only be measured on Linux')
+
+
+def reset_peak():
+    # Resets VmHWM to the current RSS (Linux 4.0+)
+    with open('/proc/self/clear_refs', 'w') as clear_refs:
+        clear_refs.write('5')
+
+
+def peak_rss():
+    return read_status('VmHWM')
@@ -0,0 +1,78 @@
+from django.core.management.base import BaseCommand, CommandError
+from ocr import parsing, parsing_reference
+from ocr.synthetic import ocr_text
+import json
+import pathlib
+import random
+import time
+
+GOLDEN_CASES = pathlib.Path(__file__).resolve().parents[2] / 'golden' / 'parser_cases.json'
+FIELDS = ('amount', 'date', 'description')
+
+
+class Command(BaseCommand):
+    help = (
+        'Checks that ocr.parsing matches the golden corpus and the original parser field for field, '
+        'and compares their throughput on a large batch of synthetic OCR text'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=50000, help='Synthetic texts in the benchmark batch')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--rounds', type=int, default=3, help='Best of this many timed runs per parser')
+
+    def handle(self, *args, **options):
+        golden = json.loads(GOLDEN_CASES.read_text())
+        failures = golden_failures(golden)
+        self.stdout.write(f'Golden corpus: {len(golden) - len(failures)}/{len(golden)} cases match')
+
+        rng = random.Random(options['seed'])
+        texts = [ocr_text(rng) for _ in range(options['count'])]
+        mismatches = reference_mismatches(texts)
+        self.stdout.write(f'Synthetic batch: {len(texts) - len(mismatches)}/{len(texts)} texts match the original parser')
+        failures += [f'{text!r}: differs from the original parser' for text in mismatches[:20]]
+
+        if failures:
+            raise CommandError('Parser output changed:\n' + '\n'.join(failures))
+
+        baseline = self.throughput(parsing_reference.parse_ocr_text, texts, options['rounds'])
+        current = self.throughput(parsing.parse_ocr_text, texts, options['rounds'])
+        self.stdout.write(f'{"original":<10}{baseline:>12,.0f} texts/s')
+        self.stdout.write(f'{"current":<10}{current:>12,.0f} texts/s  ({current / baseline:.1f}x)')
+        self.stdout.write(self.style.SUCCESS('Successfully checked the receipt parser'))
+
+    def throughput(self, parse, texts, rounds):
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for text in texts:
+                parse(text)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return len(texts) / best
+
+
+def golden_failures(golden):
+    """
+    A line for each golden case whose fields ocr.parsing gets wrong.
+    """
+    failures = []
+    for case in golden:
+        got = fields(parsing.parse_ocr_text(case['text']))
+        if got != case['expected']:
+            failures.append(f'{case["text"]!r}: expected {case["expected"]}, got {got}')
+    return failures
+
+
+def reference_mismatches(texts):
+    """
+    The texts ocr.parsing reads differently from the original parser.
+    """
+    return [
+        text for text in texts
+        if fields(parsing.parse_ocr_text(text)) != fields(parsing_reference.parse_ocr_text(text))
+    ]
+
+
+def fields(parsed):
+    return {field: parsed[field] for field in FIELDS}
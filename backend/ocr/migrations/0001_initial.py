@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:51
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OCRJob",
+            fields=[
+                ("id", models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ("status", models.CharField(choices=[("QUEUED", "Queued"), ("DONE", "Done"), ("FAILED", "Failed")], default="QUEUED", max_length=10)),
+                ("raw_text", models.TextField(blank=True, null=True)),
+                ("parsed_data", models.JSONField(blank=True, null=True)),
+                ("error", models.TextField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("finished_at", models.DateTimeField(blank=True, null=True)),
+                ("user", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name="ocr_jobs", to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("ocr", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OCRResult",
+            fields=[
+                ("image_sha256", models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ("raw_text", models.TextField()),
+                ("parsed_data", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="ocrjob",
+            name="image_sha256",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
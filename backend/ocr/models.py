@@ -0,0 +1,26 @@
+from django.db import models
+from users.models import User
+import uuid
+
+class OCRJob(models.Model):
+    STATUS_CHOICES = [("QUEUED", "Queued"), ("DONE", "Done"), ("FAILED", "Failed")]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name="ocr_jobs")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="QUEUED")
+    image_sha256 = models.CharField(max_length=64, null=True, blank=True)
+    raw_text = models.TextField(null=True, blank=True)
+    parsed_data = models.JSONField(null=True, blank=True)
+    error = models.TextField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+
+class OCRResult(models.Model):
+    """
+    OCR output for an image, keyed by the SHA-256 of its bytes. Persistent tier of ocr.cache.
+    """
+    image_sha256 = models.CharField(max_length=64, primary_key=True)
+    raw_text = models.TextField()
+    parsed_data = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
@@ -0,0 +1,143 @@
+"""
+Extracts amount, date and description (merchant) from OCR text.
+
+Every line is looked at once: each line is lowercased and tokenised for amounts a single
+time, and amount and description candidates are collected as we go. Dates are searched
+for shape by shape, stopping at the first that parses. All patterns are compiled at
+import. The choice between candidates follows the original multi-pass parser exactly
+(see parsing_reference.py), and each field also gets a confidence that reflects which
+rule produced it.
+"""
+import re
+from datetime import datetime
+
+# Integers (e.g. 5000) and decimals (e.g. 50.00 or 50,00)
+AMOUNT = re.compile(r'\d+(?:[\.,]\d{1,2})?')
+# Amount labels other than "total", used when no total line has a number
+AMOUNT_LABELS = re.compile(r'amount|balance|due')
+# Lines containing any of these look like headers or labels, not a merchant name
+NOT_MERCHANT = re.compile(
+    r'receipt|invoice|claim|expense|date|time|total|amount|tax|vat|subtotal|cash|card|change|phone'
+)
+REMARKS_PREFIXES = ('remarks', 'description', 'memo', 'for')
+REMARKS_SEPARATOR = re.compile(r'[:\-]')
+
+# Date shapes in order of preference. As in the original parser only the first match of
+# each shape is considered, and a later shape is only searched for if the earlier ones fail.
+DATE_SHAPES = (
+    ('numeric', re.compile(r'(\d{1,2})([/\-])(\d{1,2})([/\-])(\d{2,4})')),  # 01/25/2023, 25-01-23
+    ('iso', re.compile(r'(\d{4})([/\-])(\d{1,2})([/\-])(\d{1,2})')),  # 2023-01-25
+    ('named', re.compile(r'\d{1,2}\s(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s\d{2,4}', re.IGNORECASE)),  # 25 Jan 2023
+)
+
+CONFIDENCE = {
+    'amount': {'total': 0.9, 'label': 0.7, 'largest': 0.4},
+    'date': {'iso': 0.9, 'named': 0.85, 'numeric': 0.75},
+    'description': {'remarks': 0.8, 'merchant': 0.6, 'first_line': 0.3},
+}
+
+
+def parse_ocr_text(text):
+    """
+    Returns {'amount', 'date', 'description', 'confidence'}; confidence maps each field to
+    a score between 0 and 1, 0 when the field was not found.
+    """
+    total = labelled = remarks = merchant = first_line = None
+    numbers = []
+
+    for line in text.split('\n'):
+        stripped = line.strip()
+        if not stripped:
+            continue
+        lower = stripped.lower()
+
+        # --- Amount candidates: the bottom-most "total" or labelled line wins ---
+        line_numbers = AMOUNT.findall(line)
+        if line_numbers:
+            numbers += line_numbers
+            if 'total' in lower:
+                total = line_numbers[0]
+            elif AMOUNT_LABELS.search(lower):
+                labelled = line_numbers[0]
+
+        # --- Description candidates: the top-most of each kind wins ---
+        if first_line is None:
+            first_line = stripped
+        if merchant is None and not NOT_MERCHANT.search(lower):
+            merchant = stripped
+        if remarks is None and lower.startswith(REMARKS_PREFIXES):
+            # "Description: ..." / "Memo - ..."
+            parts = REMARKS_SEPARATOR.split(line, maxsplit=1)
+            if len(parts) > 1 and parts[1].strip():
+                remarks = parts[1].strip()
+            # "For travel purpose"
+            elif lower.startswith('for '):
+                parts = line.split(maxsplit=1)
+                if len(parts) > 1:
+                    remarks = parts[1].strip().capitalize()
+
+    amount, amount_rule = None, None
+    if total is not None:
+        amount, amount_rule = total.replace(',', '.'), 'total'
+    elif labelled is not None:
+        amount, amount_rule = labelled.replace(',', '.'), 'label'
+    elif numbers:
+        amount, amount_rule = f"{max(float(n.replace(',', '.')) for n in numbers):.2f}", 'largest'
+
+    description, description_rule = None, None
+    for rule, candidate in (('remarks', remarks), ('merchant', merchant), ('first_line', first_line)):
+        if candidate is not None:
+            description, description_rule = candidate, rule
+            break
+
+    date, date_shape = parse_date(text)
+
+    return {
+        'amount': amount,
+        'date': date,
+        'description': description,
+        'confidence': {
+            'amount': CONFIDENCE['amount'].get(amount_rule, 0),
+            'date': CONFIDENCE['date'].get(date_shape, 0),
+            'description': CONFIDENCE['description'].get(description_rule, 0),
+        },
+    }
+
+
+def parse_date(text):
+    """
+    Returns (ISO date, shape). Numeric shapes are converted directly instead of through
+    strptime, accepting exactly what the original '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y',
+    '%m-%d-%y' and '%Y-%m-%d' formats accept.
+    """
+    for shape, pattern in DATE_SHAPES:
+        match = pattern.search(text)
+        if not match:
+            continue
+        if shape == 'named':
+            try:
+                return datetime.strptime(match.group(0), '%d %b %Y').strftime('%Y-%m-%d'), shape
+            except ValueError:
+                continue
+
+        first, separator, middle, second_separator, last = match.groups()
+        if separator != second_separator:
+            continue
+        if shape == 'numeric':
+            # month/day/year; a two-digit year pivots like strptime's %y
+            if len(last) == 4:
+                year = int(last)
+            elif len(last) == 2:
+                year = int(last) + (2000 if int(last) <= 68 else 1900)
+            else:
+                continue
+            month, day = int(first), int(middle)
+        else:
+            if separator != '-':
+                continue
+            year, month, day = int(first), int(middle), int(last)
+        try:
+            return datetime(year, month, day).strftime('%Y-%m-%d'), shape
+        except ValueError:
+            continue
+    return None, None
@@ -0,0 +1,7 @@
+from rest_framework import serializers
+from .models import OCRJob
+
+class OCRJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OCRJob
+        fields = ['id', 'status', 'raw_text', 'parsed_data', 'error', 'created_at', 'finished_at']
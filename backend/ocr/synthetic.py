@@ -0,0 +1,117 @@
+"""
+Synthetic receipt photos with known field values, for OCR benchmarks.
+"""
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+import datetime
+import io
+
+MERCHANTS = [
+    'Blue Bottle Coffee', 'Harbor Grill', 'Metro Office Depot', 'Sunrise Bakery',
+    'Northside Pharmacy', 'Golden Dragon', 'City Parking Garage', 'Green Leaf Market',
+]
+ITEMS = ['Sandwich', 'Coffee', 'Notebook', 'Pens', 'Salad', 'Water', 'Printer Paper', 'Muffin', 'Parking']
+ORIENTATION = 0x0112
+
+
+def render_receipt(rng):
+    """
+    Returns (upright receipt image, expected parse_ocr_text fields).
+    """
+    merchant = rng.choice(MERCHANTS)
+    date = datetime.date(2025, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+    items = [(rng.choice(ITEMS), rng.randrange(100, 5000) / 100) for _ in range(rng.randrange(2, 7))]
+    subtotal = round(sum(price for _, price in items), 2)
+    tax = round(subtotal * 0.08, 2)
+    total = round(subtotal + tax, 2)
+
+    lines = [merchant, f'{rng.randrange(10, 999)} Main Street', date.strftime('%m/%d/%Y'), '']
+    lines += [f'{name:<20}{price:>8.2f}' for name, price in items]
+    lines += ['', f'{"Subtotal":<20}{subtotal:>8.2f}', f'{"Tax":<20}{tax:>8.2f}', f'{"TOTAL":<20}{total:>8.2f}']
+
+    font = ImageFont.load_default(size=32)
+    line_height = 44
+    image = Image.new('RGB', (760, 80 + line_height * len(lines)), (250, 248, 240))
+    draw = ImageDraw.Draw(image)
+    for i, line in enumerate(lines):
+        draw.text((40, 40 + i * line_height), line, fill=(20, 20, 20), font=font)
+
+    expected = {'amount': f'{total:.2f}', 'date': date.isoformat(), 'description': merchant}
+    return image, expected
+
+
+def photograph(receipt, rng, size=(3024, 4032)):
+    """
+    Places the receipt on a darker, unevenly lit table at phone-camera resolution.
+    """
+    width, height = size
+    photo = Image.new('RGB', size, (rng.randrange(70, 110), rng.randrange(55, 85), rng.randrange(40, 70)))
+    # Lighting falls off towards the bottom of the frame
+    shade = Image.linear_gradient('L').resize(size).point(lambda v: int(v * 0.35))
+    photo.paste((0, 0, 0), mask=shade)
+
+    scale = width * rng.uniform(0.55, 0.75) / receipt.width
+    receipt = receipt.resize((int(receipt.width * scale), int(receipt.height * scale)), Image.Resampling.BICUBIC)
+    left = rng.randrange(0, max(width - receipt.width, 1))
+    top = rng.randrange(0, max(height - receipt.height, 1))
+    photo.paste(receipt, (left, top))
+    return photo.filter(ImageFilter.GaussianBlur(1.2))
+
+
+def make_receipt(rng, size=(3024, 4032), sideways=False, quality=90):
+    """
+    Returns (JPEG bytes, expected fields). A sideways photo is stored rotated with an EXIF
+    orientation tag, as phones do.
+    """
+    receipt, expected = render_receipt(rng)
+    photo = photograph(receipt, rng, size)
+    exif = Image.Exif()
+    if sideways:
+        photo = photo.transpose(Image.Transpose.ROTATE_90)
+        exif[ORIENTATION] = 6
+    buffer = io.BytesIO()
+    photo.save(buffer, 'JPEG', quality=quality, exif=exif)
+    return buffer.getvalue(), expected
+
+
+def ocr_text(rng):
+    """
+    Receipt-like OCR output with the usual noise: stray blank lines and spaces, misread
+    characters, varying date formats and amount labels, optional remarks lines. For
+    exercising the text parser, so there is no expected value; compare parsers instead.
+    """
+    date = datetime.date(2020, 1, 1) + datetime.timedelta(days=rng.randrange(2500))
+    date_text = rng.choice([
+        date.strftime('%m/%d/%Y'), date.strftime('%m-%d-%y'), date.strftime('%Y-%m-%d'),
+        date.strftime('%d %b %Y'), date.strftime('%d %b\n%Y'), date.strftime('%d/%m/%Y'),
+        date.strftime('%Y/%m/%d'), date.strftime('%Y-%m-%d') + '23', '',
+    ])
+    separator = rng.choice(['.', '.', ','])
+
+    def price():
+        value = rng.randrange(1, 100000) / 100
+        return rng.choice([f'{value:.2f}'.replace('.', separator), str(int(value))])
+
+    lines = [rng.choice(MERCHANTS + ['RECEIPT', 'Tax Invoice', '']), f'{rng.randrange(1, 999)} Main Street']
+    if rng.random() < 0.3:
+        lines.append(f'Phone: 555-{rng.randrange(1000, 9999)}')
+    lines.append(rng.choice([f'Date: {date_text}', date_text, f'{date_text} {rng.randrange(24)}:{rng.randrange(60):02d}']))
+    lines += [f'{rng.choice(ITEMS)}  {price()}' for _ in range(rng.randrange(0, 12))]
+    lines += rng.sample([
+        f'Subtotal {price()}', f'Tax {price()}', f'TOTAL {price()}', f'Total Due {price()}', 'TOTAL',
+        f'Amount Due {price()}', f'Balance {price()}', f'Cash {price()}', f'Change {price()}',
+    ], rng.randrange(0, 5))
+    lines += rng.sample([
+        'Description: Client lunch', 'Memo - team offsite', 'for travel purpose', 'For:', 'Format A4',
+        'remarks', 'Thank you!',
+    ], rng.randrange(0, 3))
+
+    noisy = []
+    for line in lines:
+        if rng.random() < 0.05:
+            line = line.replace('0', 'O').replace('1', 'l')
+        if rng.random() < 0.1:
+            line = ' ' * rng.randrange(1, 4) + line
+        noisy.append(line)
+        if rng.random() < 0.15:
+            noisy.append(rng.choice(['', ' ', '\r']))
+    return '\n'.join(noisy)
@@ -0,0 +1,16 @@
+from django.test import SimpleTestCase
+from ocr.management.commands.check_parser import GOLDEN_CASES, golden_failures, reference_mismatches
+from ocr.synthetic import ocr_text
+import json
+import random
+
+
+class ParserTests(SimpleTestCase):
+    # The correctness half of manage.py check_parser, without the benchmark
+
+    def test_golden_corpus(self):
+        self.assertEqual(golden_failures(json.loads(GOLDEN_CASES.read_text())), [])
+
+    def test_matches_original_parser(self):
+        rng = random.Random(0)
+        self.assertEqual(reference_mismatches([ocr_text(rng) for _ in range(5000)]), [])
@@ -0,0 +1,111 @@
+"""
+Upload handling for the OCR endpoints. Files are streamed to disk in OCR_UPLOADS['SPOOL_DIR']
+chunk by chunk and hashed on the way, so a request never holds a whole upload in memory;
+the pool's workers open them by path. Oversized requests are refused from Content-Length
+before the body is read, and an oversized file as soon as it crosses the limit.
+"""
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler
+from rest_framework.exceptions import APIException
+from rest_framework.parsers import MultiPartParser
+import hashlib
+import os
+import tempfile
+
+
+class UploadTooLarge(APIException):
+    status_code = 413
+    default_detail = 'The upload is too large.'
+    default_code = 'upload_too_large'
+
+
+def spool_dir():
+    path = settings.OCR_UPLOADS['SPOOL_DIR'] or os.path.join(tempfile.gettempdir(), 'ocr-spool')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class SpooledUpload(UploadedFile):
+    """
+    An uploaded file on disk with its SHA-256. Deleted when the request ends unless keep() was called.
+    """
+    def __init__(self, file, name, content_type, size, charset, content_type_extra, sha256):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+        self.kept = False
+
+    @property
+    def path(self):
+        return self.file.name
+
+    def keep(self):
+        # Whoever keeps the file is responsible for deleting it
+        self.kept = True
+        return self.path
+
+    def close(self):
+        self.file.close()
+        if not self.kept:
+            discard(self.path)
+
+
+class SpoolingUploadHandler(FileUploadHandler):
+    def __init__(self, request=None, max_bytes=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes
+        self.spooled = []
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = tempfile.NamedTemporaryFile(dir=spool_dir(), prefix='upload-', delete=False)
+        self.spooled.append(self.file.name)
+        self.sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.max_bytes and start + len(raw_data) > self.max_bytes:
+            raise UploadTooLarge(f'Each file may be at most {self.max_bytes} bytes.')
+        self.file.write(raw_data)
+        self.sha256.update(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return SpooledUpload(
+            self.file, self.file_name, self.content_type, file_size, self.charset,
+            self.content_type_extra, self.sha256.hexdigest(),
+        )
+
+    def discard_all(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+        for path in self.spooled:
+            discard(path)
+
+
+class SpoolingMultiPartParser(MultiPartParser):
+    """
+    Multipart parser for the OCR endpoints: every file, however small, goes through SpoolingUploadHandler.
+    """
+    def parse(self, stream, media_type=None, parser_context=None):
+        limits = settings.OCR_UPLOADS
+        request = parser_context['request']
+        content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        if content_length > limits['MAX_REQUEST_BYTES']:
+            raise UploadTooLarge(f'A request may be at most {limits["MAX_REQUEST_BYTES"]} bytes.')
+
+        handler = SpoolingUploadHandler(request, limits['MAX_FILE_BYTES'])
+        request.upload_handlers = [handler]
+        try:
+            return super().parse(stream, media_type, parser_context)
+        except Exception:
+            # Django only closes files it finished parsing, and not on every error
+            handler.discard_all()
+            raise
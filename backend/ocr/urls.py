@@ -1,9 +1,8 @@
 from django.urls import path
-from .views import OCRView
+from .views import OCRView, OCRBatchView, OCRJobView
 
 urlpatterns = [
     path('scan-receipt/', OCRView.as_view(), name='scan_receipt'),
+    path('scan-receipt/batch/', OCRBatchView.as_view(), name='scan_receipt_batch'),
+    path('scan-receipt/<uuid:job_id>/', OCRJobView.as_view(), name='scan_receipt_job'),
 ]
-
-
-
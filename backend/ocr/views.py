@@ -1,141 +1,109 @@
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import FormParser
 from rest_framework.response import Response
-from rest_framework import status
-import pytesseract
-from PIL import Image
-import io
-import re
-from datetime import datetime
+from rest_framework import permissions, status
+from . import documents
+from .jobs import batch_result, enqueue_scan, scan_batch, QueueFull
+from .models import OCRJob
+from .preprocessing import DEFAULTS
+from .serializers import OCRJobSerializer
+from .uploads import SpoolingMultiPartParser
+import json
 
-def parse_ocr_text(text):
+def count_pages(upload):
     """
-    Parses raw text from OCR to find key information like amount, date, and description.
-    This implementation is improved to be more robust.
+    Pages in a spooled upload, refusing decompression bombs from the headers alone.
     """
-    lines = text.split('\n')
-    data = {
-        'amount': None,
-        'date': None,
-        'description': None
-    }
+    dpi = {**DEFAULTS, **settings.OCR_PREPROCESSING}['TARGET_DPI']
+    return documents.page_count(upload.path, settings.OCR_UPLOADS['MAX_PIXELS'], dpi)
 
-    # --- Amount Extraction ---
-    # Updated pattern to find integers (e.g., 5000) and decimals (e.g., 50.00)
-    amount_pattern = re.compile(r'(\d+(?:[\.,]\d{1,2})?)')
-    
-    # Pass 1: Prioritize finding "total" from the bottom up.
-    for line in reversed(lines):
-        if 'total' in line.lower():
-            match = amount_pattern.search(line)
-            if match:
-                data['amount'] = match.group(1).replace(',', '.')
-                break  # Found the total, we are done.
+class OCRView(APIView):
+    parser_classes = (SpoolingMultiPartParser, FormParser)
+    permission_classes = [permissions.IsAuthenticated]
 
-    # Pass 2: If no total was found, search for other keywords from the bottom up.
-    if not data['amount']:
-        other_keywords = ['amount', 'balance', 'due']
-        for line in reversed(lines):
-            if any(keyword in line.lower() for keyword in other_keywords):
-                match = amount_pattern.search(line)
-                if match:
-                    data['amount'] = match.group(1).replace(',', '.')
-                    break # Found a good candidate, stop searching
+    def post(self, request, *args, **kwargs):
+        if 'image' not in request.data:
+            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-    # If no keyword-based amount was found, use the largest candidate found as a fallback.
-    if not data['amount']:
-        amount_candidates = []
-        for line in lines:
-            matches = amount_pattern.findall(line)
-            for m in matches:
-                try:
-                    amount_candidates.append(float(m.replace(',', '.')))
-                except ValueError:
-                    continue
-        if amount_candidates:
-            data['amount'] = f"{max(amount_candidates):.2f}"
+        image_file = request.data['image']
+        try:
+            count_pages(image_file)
+        except documents.TooManyPixels as e:
+            return Response({'error': str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except documents.DocumentError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-    # --- Description Extraction ---
-    # Keywords to ignore when looking for a default description (merchant name)
-    ignore_keywords = [
-        'receipt', 'invoice', 'claim', 'expense', 'date', 'time', 'total', 
-        'amount', 'tax', 'vat', 'subtotal', 'cash', 'card', 'change', 'phone'
-    ]
+        try:
+            # The job takes over the spooled file and deletes it when done
+            job = enqueue_scan(image_file.keep(), user=request.user, digest=image_file.sha256, owns_source=True)
+        except QueueFull:
+            return Response(
+                {'error': 'The receipt scanner is busy, please retry shortly.'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'},
+            )
 
-    # Default to the first non-empty line that doesn't seem like a header/label
-    for line in lines:
-        line_lower = line.strip().lower()
-        if line_lower and not any(keyword in line_lower for keyword in ignore_keywords):
-            data['description'] = line.strip()
-            break
-    
-    # Look for specific remarks/description fields to override the default
-    remarks_keywords = ['remarks', 'description', 'memo', 'for']
-    for line in lines:
-        line_lower = line.lower().strip()
-        # Check if a keyword is at the start of the line
-        if any(line_lower.startswith(keyword) for keyword in remarks_keywords):
-            # Handle cases with a separator like "Description: ..."
-            parts = re.split(r'[:\-]', line, maxsplit=1)
-            if len(parts) > 1 and parts[1].strip():
-                data['description'] = parts[1].strip()
-                break
-            # Handle cases like "For travel purpose" where there's no colon
-            elif line_lower.startswith("for "):
-                parts = line.split(maxsplit=1)
-                if len(parts) > 1:
-                    data['description'] = parts[1].strip().capitalize()
-                    break
+        data = {
+            'job_id': job.id,
+            'status': job.status,
+            'status_url': request.build_absolute_uri(reverse('scan_receipt_job', args=[job.id])),
+        }
+        if job.status == 'DONE':
+            # Cache hit: the result is already here, no need to poll
+            data.update(raw_text=job.raw_text, parsed_data=job.parsed_data)
+            return Response(data, status=status.HTTP_200_OK)
+        return Response(data, status=status.HTTP_202_ACCEPTED)
 
-    # If no description was found at all, fall back to the very first line as a last resort.
-    if not data['description']:
-        for line in lines:
-            if line.strip():
-                data['description'] = line.strip()
-                break
+class OCRBatchView(APIView):
+    """
+    Scans a stack of receipts: every `images` file, with PDFs and multi-page images split
+    into pages. Streams one NDJSON line per page as it finishes, in completion order.
+    """
+    parser_classes = (SpoolingMultiPartParser, FormParser)
+    permission_classes = [permissions.IsAuthenticated]
 
-    # --- Date Extraction (existing logic) ---
-    date_patterns = [
-        r'(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})', # 01/25/2023, 25-01-23
-        r'(\d{4}[/\-]\d{1,2}[/\-]\d{1,2})', # 2023-01-25
-        r'(\d{1,2}\s(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)\s\d{2,4})' # 25 Jan 2023
-    ]
-    
-    date_formats = ['%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y', '%m-%d-%y', '%Y-%m-%d', '%d %b %Y']
+    def post(self, request, *args, **kwargs):
+        uploads = request.FILES.getlist('images')
+        if not uploads:
+            return Response({'error': 'No images provided'}, status=status.HTTP_400_BAD_REQUEST)
 
-    for pattern in date_patterns:
-        date_match = re.search(pattern, text, re.IGNORECASE)
-        if date_match:
-            date_str = date_match.group(1)
-            for fmt in date_formats:
-                try:
-                    data['date'] = datetime.strptime(date_str, fmt).strftime('%Y-%m-%d')
-                    break # Stop after first successful parse
-                except ValueError:
-                    continue
-            if data['date']:
-                break
+        unreadable, items = [], []
+        # Uploads stay spooled on disk until the response has been streamed
+        for index, upload in enumerate(uploads):
+            echoed = {'index': index, 'file': upload.name}
+            try:
+                pages = count_pages(upload)
+            except documents.DocumentError as e:
+                unreadable.append(batch_result({**echoed, 'page': None}, status='FAILED', error=str(e)))
+                continue
+            # A plain image is scanned whole so its result is shared with single scans and expense receipts
+            page_numbers = range(pages) if pages > 1 or documents.is_pdf(upload.path) else [None]
+            items += [{**echoed, 'source': upload.path, 'digest': upload.sha256, 'page': page} for page in page_numbers]
 
-    return data
+        max_pages = settings.OCR_JOBS['BATCH_MAX_PAGES']
+        if len(items) > max_pages:
+            return Response(
+                {'error': f'A batch can have at most {max_pages} pages, this one has {len(items)}.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-class OCRView(APIView):
-    parser_classes = (MultiPartParser, FormParser)
+        def lines():
+            for result in unreadable:
+                yield json.dumps(result, cls=DjangoJSONEncoder) + '\n'
+            for result in scan_batch(items, user=request.user):
+                yield json.dumps(result, cls=DjangoJSONEncoder) + '\n'
 
-    def post(self, request, *args, **kwargs):
-        if 'image' not in request.data:
-            return Response({'error': 'No image provided'}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
 
-        image_file = request.data['image']
-        
-        try:
-            image = Image.open(io.BytesIO(image_file.read()))
-            text = pytesseract.image_to_string(image)
-            
-            parsed_data = parse_ocr_text(text)
-            
-            return Response({
-                'raw_text': text,
-                'parsed_data': parsed_data
-            }, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+class OCRJobView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, job_id, *args, **kwargs):
+        # Only the user who submitted a job can see it
+        job = get_object_or_404(OCRJob, pk=job_id, user=request.user)
+        return Response(OCRJobSerializer(job).data)
@@ -2,6 +2,11 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from users.models import Company, User
 from expenses.models import Expense
+from expenses.rollups import rebuild_rollups
+from expenses.visibility import rebuild_viewers
+from expenses.approvals import rebuild_approval_queues
+from expenses.budgets import rebuild_usage
+from expenses.search import get_backend
 import decimal
 
 class Command(BaseCommand):
@@ -109,4 +114,10 @@ class Command(BaseCommand):
             status='REJECTED'
         )
 
+        rebuild_rollups()
+        rebuild_viewers()
+        rebuild_approval_queues()
+        rebuild_usage()
+        get_backend().rebuild()
+
         self.stdout.write(self.style.SUCCESS('Successfully seeded database.'))
@@ -1,9 +1,12 @@
+from django.db import transaction
 from rest_framework import generics, permissions, viewsets
 from rest_framework.response import Response
 from rest_framework_simplejwt.views import TokenObtainPairView
 from .serializers import RegisterSerializer, UserSerializer, UserCreateSerializer
 from .models import User
 from .permissions import IsAdminOrReadOnly
+from expenses import budgets, deletion, search
+from expenses.visibility import sync_team_manager
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -32,7 +35,7 @@ class UserViewSet(viewsets.ModelViewSet):
     def get_queryset(self):  
         user = self.request.user
         if user.is_staff or user.role == 'ADMIN': 
-            return User.objects.filter(company=user.company)
+            return User.objects.filter(company=user.company).select_related('company', 'manager')
         return User.objects.none() 
 
     def get_serializer_class(self): 
@@ -40,9 +43,21 @@ class UserViewSet(viewsets.ModelViewSet):
             return UserCreateSerializer 
         return UserSerializer
 
+    @transaction.atomic
     def perform_update(self, serializer): 
+        previous_manager_id = serializer.instance.manager_id
+        previous_names = (serializer.instance.username, serializer.instance.first_name, serializer.instance.last_name)
         user = serializer.save()
+        sync_team_manager(user, previous_manager_id)
+        budgets.sync_team_manager(user, previous_manager_id)
+        if (user.username, user.first_name, user.last_name) != previous_names:
+            # Their expenses are searchable by employee name
+            search.index_employees([user.pk])
         password = self.request.data.get('password') 
         if password:
             user.set_password(password) 
-            user.save() 
+            user.save()
+
+    def perform_destroy(self, instance):
+        # Keeps the counters about their expenses, and the queues they were in, consistent
+        deletion.delete_user(instance) 
@@ -1,10 +1,19 @@
-  import React, { useContext } from 'react';
+  import React, { useContext, useEffect, useState } from 'react';
   import { NavLink } from 'react-router-dom';
   import { FaTachometerAlt, FaFileInvoiceDollar, FaTasks, FaUsersCog } from 'react-icons/fa';
   import AuthContext from '../context/AuthContext';
+  import api from '../services/api';
 
   const Sidebar = () => {
     const { user } = useContext(AuthContext);
+    const [pendingCount, setPendingCount] = useState(0);
+
+    useEffect(() => {
+      if (user?.role !== 'MANAGER' && user?.role !== 'ADMIN') return;
+      api.get('/expenses/claims/pending_count/')
+        .then(res => setPendingCount(res.data.count))
+        .catch(err => console.error(err));
+    }, [user]);
 
     const commonLinks = [
       { name: 'Dashboard', to: '/dashboard', icon: FaTachometerAlt },
@@ -15,7 +24,7 @@
         { name: 'My Expenses', to: '/my-expenses', icon: FaFileInvoiceDollar },
       ],
       MANAGER: [
-        { name: 'Approval Queue', to: '/approvals', icon: FaTasks },
+        { name: 'Approval Queue', to: '/approvals', icon: FaTasks, badge: pendingCount },
       ],
       ADMIN: [
         { name: 'User Management', to: '/users', icon: FaUsersCog },
@@ -44,6 +53,11 @@
                   >
                     <link.icon className="w-5 h-5" />
                     <span className="ml-4 font-medium">{link.name}</span>
+                    {link.badge > 0 && (
+                      <span className="ml-auto px-2 py-0.5 text-xs font-semibold rounded-full bg-red-500 text-white">
+                        {link.badge}
+                      </span>
+                    )}
                   </NavLink>
                 </li>
               ))}
@@ -4,26 +4,24 @@ import { BarChart, Bar, XAxis, YAxis, CartesianGrid, Tooltip, Legend, Responsive
 import ApprovalPanel from '../../components/ApprovalPanel';
 
 const AdminDashboard = () => {
-  const [stats, setStats] = useState({ totalExpenses: 0, pending: 0, approved: 0 });
-  const [expenses, setExpenses] = useState([]);
+  const [stats, setStats] = useState({ totalExpenses: 0, pending: 0, approved: 0, rejected: 0 });
 
   useEffect(() => {
-    api.get('/expenses/claims/').then(res => {
-      const data = res.data;
-      setExpenses(data);
-      const newStats = {
-        totalExpenses: data.length,
-        pending: data.filter(e => e.status === 'PENDING').length,
-        approved: data.filter(e => e.status === 'APPROVED').length,
-      };
-      setStats(newStats);
+    api.get('/expenses/claims/stats/').then(res => {
+      const countFor = (status) => res.data.by_status.find(b => b.status === status)?.count || 0;
+      setStats({
+        totalExpenses: res.data.count,
+        pending: countFor('PENDING'),
+        approved: countFor('APPROVED'),
+        rejected: countFor('REJECTED'),
+      });
     }).catch(err => console.error(err));
   }, []);
 
   const chartData = [
     { name: 'Pending', count: stats.pending, fill: '#FBBF24' },
     { name: 'Approved', count: stats.approved, fill: '#10B981' },
-    { name: 'Rejected', count: expenses.filter(e => e.status === 'REJECTED').length, fill: '#EF4444' },
+    { name: 'Rejected', count: stats.rejected, fill: '#EF4444' },
   ];
 
   return (
@@ -5,17 +5,30 @@ import ExpenseList from '../../components/employee/ExpenseList';
 
 const EmployeeDashboard = () => {
   const [expenses, setExpenses] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [isFormOpen, setIsFormOpen] = useState(false);
 
   const fetchExpenses = useCallback(async () => {
     try {
       const response = await api.get('/expenses/claims/');
-      setExpenses(response.data);
+      setExpenses(response.data.results);
+      setNextPage(response.data.next);
     } catch (error) {
       console.error("Failed to fetch expenses", error);
     }
   }, []);
 
+  // The list comes a page at a time; `next` is the cursor URL of the following page
+  const loadMore = async () => {
+    try {
+      const response = await api.get(nextPage);
+      setExpenses((current) => [...current, ...response.data.results]);
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Failed to fetch expenses", error);
+    }
+  };
+
   useEffect(() => {
     fetchExpenses();
   }, [fetchExpenses]);
@@ -47,6 +60,13 @@ const EmployeeDashboard = () => {
       )}
 
       <ExpenseList expenses={expenses} />
+      {nextPage && (
+        <div className="flex justify-center mt-4">
+          <button onClick={loadMore} className="px-4 py-2 bg-gray-200 text-gray-800 rounded-md hover:bg-gray-300">
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   );
 };
@@ -6,6 +6,7 @@ import AuthContext from '../../context/AuthContext';
 
 const ManagerDashboard = () => {
   const [queue, setQueue] = useState([]);
+  const [nextPage, setNextPage] = useState(null);
   const [selectedExpense, setSelectedExpense] = useState(null);
   const [action, setAction] = useState(null); // 'approve' or 'reject'
   const [comments, setComments] = useState('');
@@ -14,13 +15,26 @@ const ManagerDashboard = () => {
     const fetchQueue = useCallback(async () => {
       try {
         const response = await api.get('/expenses/claims/approval_queue/');
-        setQueue(response.data);
+        setQueue(response.data.results);
+        setNextPage(response.data.next);
       } catch (error) {
         console.error("Failed to fetch approval queue", error);
         toast.error("Could not load approval queue.");
       }
     }, []);
 
+    // The queue comes a page at a time; `next` is the cursor URL of the following page
+    const loadMore = async () => {
+      try {
+        const response = await api.get(nextPage);
+        setQueue((current) => [...current, ...response.data.results]);
+        setNextPage(response.data.next);
+      } catch (error) {
+        console.error("Failed to fetch approval queue", error);
+        toast.error("Could not load approval queue.");
+      }
+    };
+
   useEffect(() => {
     fetchQueue();
   }, [fetchQueue]);
@@ -93,6 +107,13 @@ const ManagerDashboard = () => {
         </table>
         {queue.length === 0 && <p className="text-center text-gray-500 p-4">Approval queue is empty.</p>}
       </div>
+      {nextPage && (
+        <div className="flex justify-center mt-4">
+          <button onClick={loadMore} className="px-4 py-2 bg-gray-200 text-gray-800 rounded-md hover:bg-gray-300">
+            Load more
+          </button>
+        </div>
+      )}
 
       {/* Modal */}
       {selectedExpense && (